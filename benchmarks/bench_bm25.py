@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+BM25 benchmark: build time, on-disk size, mmap load time and query latency at scale.
+
+The corpus is synthesized from random word windows of the case files, so it can
+be made much larger than data/cases (100k+ chunks) while keeping a realistic
+vocabulary and proper-noun distribution.
+
+Usage: python benchmarks/bench_bm25.py [--chunks 100000] [--words 150] [--repeat 200]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add src directory to Python path
+src_path = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_path))
+
+from services.bm25_index import BM25Index
+from utils.config import Config
+
+QUERIES = [
+    "Irene Adler", "Baskerville", "the hound on the moor", "Professor Moriarty",
+    "speckled band", "Reichenbach falls", "Mycroft Holmes Diogenes Club",
+    "blue carbuncle goose", "red-headed league", "Lestrade Scotland Yard"
+]
+
+
+def synthetic_chunks(cases_dir, count, words_per_chunk, seed=13):
+    words = []
+    for filename in sorted(os.listdir(cases_dir)):
+        if filename.endswith('.txt'):
+            with open(os.path.join(cases_dir, filename), "r", encoding="utf-8") as file:
+                words.extend(file.read().split())
+    rng = random.Random(seed)
+    for i in range(count):
+        start = rng.randrange(0, len(words) - words_per_chunk)
+        yield f"chunk_{i}", " ".join(words[start:start + words_per_chunk])
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cases-dir", default=Config.CASES_DIR)
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--words", type=int, default=150)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"BM25 over {args.chunks} synthetic chunks of {args.words} words")
+    print("=" * 50)
+
+    start = time.perf_counter()
+    index = BM25Index.build(synthetic_chunks(args.cases_dir, args.chunks, args.words))
+    print(f"build:  {time.perf_counter() - start:8.2f}s  ({len(index.vocabulary)} terms, "
+          f"{len(index.postings_docs)} postings)")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "bm25")
+        index.save(path)
+        print(f"size:   {directory_size(path) / 1e6:8.2f} MB on disk")
+
+        start = time.perf_counter()
+        loaded = BM25Index.load(path)
+        print(f"load:   {(time.perf_counter() - start) * 1000:8.2f} ms (mmap)")
+
+        latencies = []
+        for i in range(args.repeat):
+            query = QUERIES[i % len(QUERIES)]
+            start = time.perf_counter()
+            loaded.search(query, k=20)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies = np.asarray(latencies)
+        print(f"query:  p50 {np.percentile(latencies, 50):6.2f} ms  "
+              f"p95 {np.percentile(latencies, 95):6.2f} ms  max {latencies.max():6.2f} ms")
+
+        print("\nTop hits:")
+        for query in QUERIES[:3]:
+            print(f"  {query!r}: {loaded.search(query, k=3)}")
+
+
+if __name__ == "__main__":
+    main()
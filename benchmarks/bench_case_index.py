@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Case index benchmark: Chroma vs the quantized memory-mapped index.
+
+A synthetic corpus (clustered unit vectors, texts drawn from the case files) is
+written to a Chroma collection and converted to int8 and float16 quantized
+indexes. Each backend is then opened in a fresh process, which reports its load
+time (open plus first query, since Chroma loads HNSW lazily), top-k latency and
+resident memory split into private (anonymous) and file-backed pages; the latter
+are shared between workers mapping the same file. Recall@k is measured against
+an exact float32 search.
+
+Usage: python benchmarks/bench_case_index.py [--chunks 20000] [--dim 384] [--queries 200] [--k 5]
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add src directory to Python path
+src_path = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_path))
+
+from services.embedding_provider import normalize
+from services.quantized_index import QuantizedCaseIndex, build_quantized_index
+from utils.config import Config
+
+
+def synthetic_corpus(cases_dir, count, dim, words_per_chunk=150, seed=13):
+    """(ids, vectors, metadatas) with vectors clustered like real topical chunks."""
+    words = []
+    for filename in sorted(os.listdir(cases_dir)):
+        if filename.endswith('.txt'):
+            with open(os.path.join(cases_dir, filename), "r", encoding="utf-8") as file:
+                words.extend(file.read().split())
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    centers = np_rng.standard_normal((max(1, count // 50), dim)).astype(np.float32)
+    vectors = normalize(centers[np_rng.integers(len(centers), size=count)]
+                        + 0.6 * np_rng.standard_normal((count, dim)).astype(np.float32))
+    metadatas = []
+    for i in range(count):
+        start = rng.randrange(0, max(1, len(words) - words_per_chunk))
+        metadatas.append({"filename": f"case_{i % 60}.txt", "chunk_index": i,
+                          "text": " ".join(words[start:start + words_per_chunk])})
+    return [f"chunk_{i}" for i in range(count)], vectors, metadatas
+
+
+def rss():
+    """(anonymous, file-backed) resident MB of this process."""
+    fields = {}
+    with open("/proc/self/status", "r") as file:
+        for line in file:
+            name, _, value = line.partition(":")
+            if name in ("RssAnon", "RssFile"):
+                fields[name] = int(value.split()[0]) / 1024
+    return fields.get("RssAnon", 0.0), fields.get("RssFile", 0.0)
+
+
+def serve(backend, path, queries_path, k):
+    """Child process: open one backend, query it and print a JSON report."""
+    queries = np.load(queries_path)
+    anon_before, file_before = rss()
+    start = time.perf_counter()
+    if backend == "chroma":
+        import chromadb
+
+        collection = chromadb.PersistentClient(path=path).get_collection("case_data")
+    else:
+        collection = QuantizedCaseIndex(path)
+    collection.query(query_embeddings=[queries[0].tolist()], n_results=k, include=["distances"])
+    load_ms = (time.perf_counter() - start) * 1000
+
+    latencies, ids = [], []
+    for query in queries:
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k,
+                                  include=["metadatas", "distances"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append(result["ids"][0])
+    anon_after, file_after = rss()
+    print(json.dumps({
+        'load_ms': load_ms, 'latencies': latencies, 'ids': ids,
+        'rss_anon_mb': anon_after - anon_before, 'rss_file_mb': file_after - file_before
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cases-dir", default=Config.CASES_DIR)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--backends", default="chroma,int8,float16")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    parser.add_argument("--queries-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.path, args.queries_path, args.k)
+        return
+
+    backends = args.backends.split(",")
+    print(f"Case index over {args.chunks} synthetic chunks, dim {args.dim}, top-{args.k}")
+    print("=" * 78)
+
+    ids, vectors, metadatas = synthetic_corpus(args.cases_dir, args.chunks, args.dim)
+    rng = np.random.default_rng(7)
+    queries = normalize(vectors[rng.integers(len(vectors), size=args.queries)]
+                        + 0.8 * rng.standard_normal((args.queries, args.dim)).astype(np.float32))
+    exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.k]
+    exact = [{ids[row] for row in rows} for rows in exact]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        import chromadb
+
+        chroma_path = os.path.join(tmp_dir, "chroma")
+        collection = chromadb.PersistentClient(path=chroma_path).get_or_create_collection("case_data")
+        for start in range(0, len(ids), 5000):
+            collection.add(ids=ids[start:start + 5000], embeddings=vectors[start:start + 5000].tolist(),
+                           metadatas=metadatas[start:start + 5000])
+        paths = {"chroma": chroma_path}
+        sizes = {"chroma": sum(f.stat().st_size for f in Path(chroma_path).rglob("*") if f.is_file())}
+        for dtype in ("int8", "float16"):
+            if dtype in backends:
+                paths[dtype] = os.path.join(tmp_dir, f"case_index_{dtype}.bin")
+                build_quantized_index(collection, paths[dtype], dtype)
+                sizes[dtype] = os.path.getsize(paths[dtype])
+        del collection
+
+        queries_path = os.path.join(tmp_dir, "queries.npy")
+        np.save(queries_path, queries)
+        print(f"{'backend':<9}{'disk MB':>9}{'load ms':>9}{'p50 ms':>8}{'p95 ms':>8}"
+              f"{'private MB':>12}{'shared MB':>11}{'recall':>8}")
+        for backend in backends:
+            result = subprocess.run(
+                [sys.executable, __file__, "--serve", backend, "--path", paths[backend],
+                 "--queries-path", queries_path, "--k", str(args.k)],
+                capture_output=True, text=True
+            )
+            if result.returncode != 0:
+                print(f"{backend:<9} failed:\n{result.stderr[-2000:]}")
+                continue
+            report = json.loads(result.stdout.strip().splitlines()[-1])
+            latencies = np.asarray(report['latencies'])
+            recall = np.mean([len(expected & set(found)) / args.k
+                              for expected, found in zip(exact, report['ids'])])
+            print(f"{backend:<9}{sizes[backend] / 1e6:9.1f}{report['load_ms']:9.1f}"
+                  f"{np.percentile(latencies, 50):8.2f}{np.percentile(latencies, 95):8.2f}"
+                  f"{report['rss_anon_mb']:12.1f}{report['rss_file_mb']:11.1f}{recall:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Chunking benchmark: compares the old paragraph split with the structure-aware chunker.
+
+For each strategy it reports the number of chunks (i.e. embeddings paid for),
+their size, and retrieval hit rate@k on sampled sentences: a query is a
+sentence from the corpus with every fourth word dropped, and it is a hit if
+one of the top-k chunks covers that sentence's position in the same file.
+
+Usage: python benchmarks/bench_chunking.py [--files houn.txt,scan.txt] [--queries 200] [--k 5]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add src directory to Python path
+src_path = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_path))
+
+from services.chunking import Chunker
+from services.embedding_provider import create_embedding_provider
+from utils.config import Config
+
+SENTENCE = re.compile(r"[A-Z][^.!?]{60,300}[.!?]")
+
+
+def paragraph_chunks(text):
+    """The original text.split("\\n\\n") chunking, with offsets."""
+    chunks, offset = [], 0
+    for piece in text.split("\n\n"):
+        if piece.strip():
+            chunks.append((offset, offset + len(piece), piece))
+        offset += len(piece) + 2
+    return chunks
+
+
+def structured_chunks(chunker):
+    def chunk(text):
+        return [(c.start, c.end, c.text) for c in chunker.iter_chunks(text)]
+    return chunk
+
+
+def sample_queries(texts, count, seed=7):
+    rng = random.Random(seed)
+    candidates = [
+        (filename, match.start(), match.group(0))
+        for filename, text in texts.items()
+        for match in SENTENCE.finditer(text)
+    ]
+    queries = []
+    for filename, position, sentence in rng.sample(candidates, min(count, len(candidates))):
+        words = " ".join(sentence.split()).split(" ")
+        queries.append((filename, position, " ".join(w for i, w in enumerate(words) if i % 4 != 3)))
+    return queries
+
+
+def evaluate(name, chunk_fn, texts, queries, provider, k):
+    spans, chunk_texts = [], []
+    for filename, text in texts.items():
+        for start, end, chunk in chunk_fn(text):
+            spans.append((filename, start, end))
+            chunk_texts.append(chunk)
+
+    start_time = time.perf_counter()
+    chunk_vectors = provider.embed(chunk_texts)
+    embed_seconds = time.perf_counter() - start_time
+
+    query_vectors = provider.embed([query for _, _, query in queries])
+    top = np.argsort(-(query_vectors @ chunk_vectors.T), axis=1)[:, :k]
+
+    hits = 0
+    for (filename, position, _), row in zip(queries, top):
+        if any(spans[i][0] == filename and spans[i][1] <= position < spans[i][2] for i in row):
+            hits += 1
+
+    sizes = [len(chunk.split()) for chunk in chunk_texts]
+    print(f"{name:<22} chunks={len(chunk_texts):<7} words/chunk={np.mean(sizes):6.1f} "
+          f"(min {min(sizes)}, max {max(sizes)})  embed={embed_seconds:6.2f}s  "
+          f"hit@{k}={hits / len(queries):.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cases-dir", default=Config.CASES_DIR)
+    parser.add_argument("--files", default="houn.txt,scan.txt,blue.txt,redh.txt,spec.txt")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    texts = {}
+    for filename in args.files.split(","):
+        with open(os.path.join(args.cases_dir, filename), "r", encoding="utf-8") as file:
+            texts[filename] = file.read()
+
+    provider = create_embedding_provider()
+    queries = sample_queries(texts, args.queries)
+    print(f"{len(texts)} files, {len(queries)} queries, model {provider.model_id}")
+    print("=" * 50)
+
+    evaluate("paragraph split", paragraph_chunks, texts, queries, provider, args.k)
+    for max_tokens, overlap in [(128, 24), (200, 40), (300, 60)]:
+        chunker = Chunker(max_tokens=max_tokens, overlap_tokens=overlap)
+        evaluate(f"structured {max_tokens}/{overlap}", structured_chunks(chunker),
+                 texts, queries, provider, args.k)
+
+
+if __name__ == "__main__":
+    main()
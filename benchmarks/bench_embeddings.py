@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Ingest embedding benchmark: reports chunks/sec for the configured embedding provider.
+
+Usage: python benchmarks/bench_embeddings.py [--limit N] [--batch-sizes 16,64,100]
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+# Add src directory to Python path
+src_path = Path(__file__).parent.parent / "src"
+sys.path.insert(0, str(src_path))
+
+from services.embedding_provider import create_embedding_provider
+from utils.config import Config
+
+
+def load_chunks(cases_dir, limit):
+    """Split case files into paragraph chunks, up to limit chunks."""
+    chunks = []
+    for filename in sorted(os.listdir(cases_dir)):
+        if not filename.endswith('.txt'):
+            continue
+        with open(os.path.join(cases_dir, filename), "r", encoding="utf-8") as file:
+            chunks.extend(chunk for chunk in file.read().split("\n\n") if chunk.strip())
+        if len(chunks) >= limit:
+            break
+    return chunks[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--limit", type=int, default=2000, help="number of chunks to embed")
+    parser.add_argument("--batch-sizes", default=str(Config.EMBEDDING_BATCH_SIZE),
+                        help="comma-separated batch sizes to compare")
+    parser.add_argument("--cases-dir", default=Config.CASES_DIR)
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.cases_dir, args.limit)
+    print(f"Embedding {len(chunks)} chunks with {Config.EMBEDDING_MODEL} ({Config.EMBEDDING_BACKEND})")
+    print("=" * 50)
+
+    for batch_size in [int(size) for size in args.batch_sizes.split(",")]:
+        provider = create_embedding_provider(batch_size=batch_size)
+        provider.embed(chunks[:batch_size])  # warm up model load and kernels
+
+        start = time.perf_counter()
+        vectors = provider.embed(chunks)
+        elapsed = time.perf_counter() - start
+
+        print(f"batch={batch_size:<5} dim={vectors.shape[1]:<4} "
+              f"{elapsed:7.2f}s  {len(chunks) / elapsed:8.1f} chunks/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Worker startup benchmark: import cost of the app module, from `python -X importtime`.
+
+Each run imports the module in a fresh interpreter and reports wall time plus the
+top-level packages that take longest to import, summing the self time of each
+package's modules (medians over runs).
+
+Usage: python benchmarks/bench_startup.py [--module app] [--runs 5] [--top 15]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+src_path = Path(__file__).parent.parent / "src"
+
+
+def import_once(module, env):
+    """Import module in a new interpreter; returns (wall seconds, {top-level package: self us})."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=src_path, env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    packages = defaultdict(int)
+    for line in result.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us)
+    return elapsed, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--module", default="app", help="module to import from src/")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="number of packages to list")
+    args = parser.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        filter(None, [str(src_path), os.environ.get("PYTHONPATH")])
+    ))
+    walls = []
+    import_times = defaultdict(list)
+    for _ in range(args.runs):
+        elapsed, packages = import_once(args.module, env)
+        walls.append(elapsed)
+        for name, micros in packages.items():
+            import_times[name].append(micros)
+
+    total = sum(statistics.median(values) for values in import_times.values())
+    print(f"import {args.module}: {statistics.median(walls) * 1000:.0f} ms wall, "
+          f"{total / 1000:.0f} ms in imports (median of {args.runs} runs)")
+    print("=" * 50)
+    ranked = sorted(import_times.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for name, values in ranked[:args.top]:
+        print(f"{statistics.median(values) / 1000:9.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
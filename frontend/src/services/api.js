@@ -66,8 +66,8 @@ export const getCases = async () => {
   return api.get('/api/cases');
 };
 
-export const getCaseContent = async (caseName) => {
-  return api.get(`/api/cases/${caseName}`);
+export const getCaseContent = async (caseName, offset = 0, length) => {
+  return api.get(`/api/cases/${caseName}`, { params: { offset, length } });
 };
 
 export const searchCases = async (query, limit = 5) => {
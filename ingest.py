@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Offline case ingestion for the Sherlock Holmes AI backend.
+
+Builds the case index ahead of deployment so workers do not embed the corpus
+at boot. By default a new versioned snapshot is written under SNAPSHOT_ROOT,
+seeded from the active one so only changed files are re-embedded, and then
+activated. Serve it with CASE_INDEX_SNAPSHOT=current. Each snapshot also holds
+a quantized, memory-mapped copy of the index (case_index.bin), served instead
+of Chroma with CASE_INDEX_BACKEND=quantized.
+
+Usage:
+    python ingest.py                      # build and activate a new snapshot
+    python ingest.py --version v42 --no-activate
+    python ingest.py --from-scratch       # ignore the active snapshot
+    python ingest.py --in-place           # ingest into CHROMA_DB_PATH instead
+    python ingest.py --quantize float16   # store float16 instead of int8 vectors
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add src directory to Python path
+src_path = Path(__file__).parent / "src"
+sys.path.insert(0, str(src_path))
+
+from services.bm25_index import build_from_collection as build_bm25_index
+from services.chroma_registry import ChromaRegistry
+from services.embedding_provider import get_embedding_provider
+from services.ingestion import get_chunker, ingest_cases, ingestion_lock
+from services.quantized_index import DTYPES, build_quantized_index
+from services import snapshots
+from utils.config import Config
+from utils.logger import setup_logger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Sherlock Holmes case index offline.")
+    parser.add_argument("--cases-dir", default=Config.CASES_DIR)
+    parser.add_argument("--snapshot-root", default=Config.SNAPSHOT_ROOT)
+    parser.add_argument("--version", default=None, help="snapshot version (default: UTC timestamp)")
+    parser.add_argument("--from-scratch", action="store_true", help="do not seed from the active snapshot")
+    parser.add_argument("--no-activate", action="store_true", help="build without updating CURRENT")
+    parser.add_argument("--in-place", action="store_true", help="ingest into CHROMA_DB_PATH instead of a snapshot")
+    parser.add_argument("--quantize", choices=sorted(DTYPES), default=Config.QUANTIZED_INDEX_DTYPE,
+                        help="vector type of the quantized case index")
+    args = parser.parse_args()
+
+    logger = setup_logger("ingest")
+    provider = get_embedding_provider()
+    chunker = get_chunker()
+
+    if args.in_place:
+        collection = ChromaRegistry().get_collection("case_data")
+        stats = ingest_cases(
+            collection, args.cases_dir, Config.INGEST_MANIFEST_PATH,
+            provider=provider,
+            chunker=chunker,
+            batch_size=Config.EMBEDDING_BATCH_SIZE,
+            read_workers=Config.INGEST_READ_WORKERS,
+            max_inflight_files=Config.INGEST_MAX_INFLIGHT_FILES
+        )
+        if Config.HYBRID_SEARCH_ENABLED:
+            with ingestion_lock(Config.INGEST_MANIFEST_PATH):
+                build_bm25_index(collection, Config.BM25_INDEX_PATH)
+        if Config.CASE_INDEX_BACKEND == 'quantized':
+            build_quantized_index(collection, Config.QUANTIZED_INDEX_PATH, args.quantize, provider.model_id)
+        logger.info(f"In-place ingestion into {Config.CHROMA_DB_PATH} finished: {stats}")
+        return 0
+
+    os.makedirs(args.snapshot_root, exist_ok=True)
+    version = args.version or snapshots.new_snapshot_version()
+    base_version = None if args.from_scratch else snapshots.current_version(args.snapshot_root)
+    path = snapshots.prepare_snapshot(args.snapshot_root, version, base_version)
+    logger.info(f"Building case index snapshot {version} at {path}"
+                + (f" (seeded from {base_version})" if base_version else ""))
+
+    collection = ChromaRegistry().get_collection("case_data", path=path)
+    stats = ingest_cases(
+        collection, args.cases_dir, os.path.join(path, snapshots.MANIFEST_FILE),
+        provider=provider,
+        chunker=chunker,
+        batch_size=Config.EMBEDDING_BATCH_SIZE,
+        read_workers=Config.INGEST_READ_WORKERS,
+        max_inflight_files=Config.INGEST_MAX_INFLIGHT_FILES
+    )
+
+    build_bm25_index(collection, os.path.join(path, "bm25"))
+    build_quantized_index(collection, os.path.join(path, snapshots.QUANTIZED_INDEX_FILE),
+                          args.quantize, provider.model_id)
+
+    snapshots.write_snapshot_info(path, {
+        'version': version,
+        'created_at': datetime.utcnow().isoformat(),
+        'base_version': base_version,
+        'embedding_model': provider.model_id,
+        'chunker_version': chunker.version,
+        'chunk_count': collection.count(),
+        'quantized_dtype': args.quantize,
+        'stats': stats
+    })
+    if not args.no_activate:
+        snapshots.activate_snapshot(args.snapshot_root, version)
+
+    logger.info(f"Snapshot {version} ready: {stats}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
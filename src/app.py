@@ -1,20 +1,25 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-import os
-import logging
 from dotenv import load_dotenv
 from datetime import datetime
 import uuid
+import json
+import math
+import hashlib
 
-from services.text_processing import extract_text_from_txt
-from services.embeddings import store_embeddings
-from services.retrieval import retrieve_documents
+from services.case_catalog import CaseCatalog
+from services.ingestion import ingest_cases, ingestion_lock
+from services.bm25_index import build_from_collection as build_bm25_index
+from services.retrieval import retrieve_chunks, retrieve_documents_batch, retrieval_cache_stats
+from services.embedding_provider import query_embedding_cache
 from services.chat_service import ChatService
-from services.memory_service import MemoryService
+from services.llm_gateway import LLMUnavailableError
+from services.retention import RetentionJob
 from utils.logger import setup_logger
 from utils.config import Config
+from utils.metrics import registry as metrics
 
 # Load environment variables
 load_dotenv()
@@ -38,56 +43,131 @@ logger = setup_logger(__name__)
 
 # Initialize services
 chat_service = ChatService()
-memory_service = MemoryService()
+memory_service = chat_service.memory_service
+retention_job = RetentionJob(
+    memory_service,
+    ttl_days=Config.SESSION_TTL_DAYS,
+    interval=Config.RETENTION_INTERVAL,
+    batch_size=Config.RETENTION_BATCH_SIZE,
+    compact_free_ratio=Config.RETENTION_COMPACT_FREE_RATIO
+)
+case_catalog = CaseCatalog(
+    Config.CASES_DIR,
+    path=Config.CASE_CATALOG_PATH,
+    manifest_path=chat_service.case_manifest_path,
+    refresh_interval=Config.CASE_CATALOG_REFRESH_INTERVAL
+)
 
 def load_case_data():
-    """Load all case files from data/cases directory into ChromaDB."""
+    """Sync the case collection with data/cases, embedding only new or changed chunks."""
     try:
-        cases_dir = "data/cases"
-        case_data = {}
-        
-        for filename in os.listdir(cases_dir):
-            if filename.endswith('.txt'):
-                file_path = os.path.join(cases_dir, filename)
-                text = extract_text_from_txt(file_path)
-                case_data[filename] = text
-        
-        # Store embeddings in ChromaDB
         case_collection = chat_service.get_case_collection()
-        store_embeddings(case_collection, case_data)
-        logger.info(f"Loaded {len(case_data)} case files into ChromaDB")
+        stats = ingest_cases(
+            case_collection,
+            Config.CASES_DIR,
+            Config.INGEST_MANIFEST_PATH,
+            batch_size=Config.EMBEDDING_BATCH_SIZE,
+            read_workers=Config.INGEST_READ_WORKERS,
+            max_inflight_files=Config.INGEST_MAX_INFLIGHT_FILES
+        )
+        logger.info(
+            f"Case data up to date: {stats['files_changed']} files changed, "
+            f"{stats['chunks_added']} chunks embedded, {stats['chunks_deleted']} removed"
+        )
+        
+        # Keep the BM25 index over the same chunks. Workers booting together take
+        # the ingestion lock in turn, and pick up an index another one just built.
+        changed = stats['chunks_added'] or stats['chunks_deleted']
+        if Config.HYBRID_SEARCH_ENABLED and (changed or chat_service.keyword_index is None):
+            with ingestion_lock(Config.INGEST_MANIFEST_PATH):
+                if changed or chat_service.reload_keyword_index() is None:
+                    build_bm25_index(case_collection, chat_service.keyword_index_path)
+                    chat_service.reload_keyword_index()
+        return stats
         
     except Exception as e:
         logger.error(f"Error loading case data: {str(e)}")
         raise
 
 def initialize_data():
-    """Initialize ChromaDB collections and load case data on first request."""
+    """Initialize ChromaDB collections and sync case data."""
     try:
         logger.info("Initializing Sherlock Holmes AI backend...")
         
         # Initialize ChromaDB collections
-        case_collection = chat_service.get_case_collection()
-        memory_collection = chat_service.get_memory_collection()
-        
-        # Load case data if not already loaded
-        if case_collection.count() == 0:
-            logger.info("Loading case data into ChromaDB...")
+        chat_service.get_case_collection()
+        chat_service.get_memory_collection()
+        
+        # Ingest new or edited case files (a near no-op on an unchanged corpus),
+        # unless a prebuilt snapshot is mounted or ingestion runs offline
+        if Config.CASE_INDEX_SNAPSHOT:
+            logger.info("Case index snapshot mounted; skipping ingestion")
+        elif Config.CASE_INDEX_BACKEND == 'quantized':
+            logger.info("Quantized case index is read-only; skipping ingestion")
+        elif Config.INGEST_ON_STARTUP:
             load_case_data()
+        case_catalog.refresh()
+        
+        # Expire idle sessions in the background
+        if Config.RETENTION_ENABLED:
+            retention_job.start()
         
         logger.info("Backend initialization completed successfully")
     except Exception as e:
         logger.error(f"Error during initialization: {str(e)}")
         raise
 
-# Initialize data when the app starts (only in production)
-if not app.config['DEBUG']:
-    with app.app_context():
-        try:
-            initialize_data()
-        except Exception as e:
-            logger.error(f"Failed to initialize app: {str(e)}")
+# initialize_data() is called once by the entry point (wsgi.py / run_server.py)
+
+def service_metrics():
+    """Counters and gauges the services already keep, read when /metrics is scraped."""
+    caches = {
+        'response': chat_service.response_cache_stats(),
+        'retrieval': retrieval_cache_stats(),
+        'query_embedding': query_embedding_cache.stats()
+    }
+    hits = []
+    misses = []
+    for cache, stats in caches.items():
+        if stats is None:
+            continue
+        if cache == 'response':
+            hits.append(({'cache': cache, 'tier': 'exact'}, stats['exact_hits']))
+            hits.append(({'cache': cache, 'tier': 'semantic'}, stats['semantic_hits']))
+        else:
+            hits.append(({'cache': cache}, stats['hits']))
+        misses.append(({'cache': cache}, stats['misses']))
+    yield 'sherlock_cache_hits_total', 'counter', 'Cache lookups answered from the cache', hits
+    yield 'sherlock_cache_misses_total', 'counter', 'Cache lookups that missed', misses
+    
+    llm = chat_service.llm_stats()
+    yield 'sherlock_llm_events_total', 'counter', 'LLM gateway calls, retries, timeouts and refusals', [
+        ({'event': event}, llm[event])
+        for event in ('calls', 'retries', 'timeouts', 'failures', 'rejected', 'short_circuited')
+    ]
+    yield 'sherlock_llm_in_flight', 'gauge', 'LLM calls holding a gateway slot', [({}, llm['in_flight'])]
+    yield 'sherlock_llm_circuit_state', 'gauge', 'LLM circuit breaker state (1 for the current one)', [
+        ({'state': state}, llm['circuit']['state'] == state) for state in ('closed', 'open', 'half-open')
+    ]
+    
+    queues = {
+        'write_behind': memory_service.write_queue_stats(),
+        'summarizer': chat_service.summarizer.stats() if chat_service.summarizer else None
+    }
+    yield 'sherlock_queue_depth', 'gauge', 'Items waiting in background queues', [
+        ({'queue': queue}, stats['depth']) for queue, stats in queues.items() if stats
+    ]
 
+if metrics.enabled:
+    metrics.register_collector(service_metrics)
+
+def llm_unavailable(error):
+    """503 with Retry-After when the LLM gateway refuses or gives up on a call."""
+    logger.error(f"LLM unavailable: {str(error)}")
+    retry_after = math.ceil(error.retry_after)
+    response = jsonify({'error': 'Service temporarily unavailable', 'retry_after': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 503
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -95,9 +175,24 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.utcnow().isoformat(),
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'write_queue': memory_service.write_queue_stats(),
+        'response_cache': chat_service.response_cache_stats(),
+        'query_embedding_cache': query_embedding_cache.stats(),
+        'retrieval_cache': retrieval_cache_stats(),
+        'summarizer_queue': chat_service.summarizer.stats() if chat_service.summarizer else None,
+        'retention': retention_job.stats(),
+        'llm': chat_service.llm_stats()
     })
 
+@app.route('/metrics', methods=['GET'])
+@limiter.exempt
+def metrics_endpoint():
+    """Prometheus metrics of this worker process."""
+    if not metrics.enabled:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/chat', methods=['POST'])
 @limiter.limit("10 per minute")
 def chat():
@@ -133,23 +228,103 @@ def chat():
             'timestamp': datetime.utcnow().isoformat()
         })
         
+    except LLMUnavailableError as e:
+        return llm_unavailable(e)
     except Exception as e:
         logger.error(f"Error processing chat message: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+@limiter.limit("10 per minute")
+def chat_stream():
+    """Streaming chat endpoint: forwards Sherlock's response as Server-Sent Events."""
+    data = request.get_json()
+    
+    if not data or 'message' not in data:
+        return jsonify({'error': 'Message is required'}), 400
+    
+    message = data['message'].strip()
+    if not message:
+        return jsonify({'error': 'Message cannot be empty'}), 400
+    
+    # Generate session ID if not provided
+    session_id = data.get('session_id', str(uuid.uuid4()))
+    
+    # Get user context if provided
+    user_context = data.get('context', {})
+    
+    logger.info(f"Streaming chat message for session {session_id}: {message[:50]}...")
+    
+    def sse(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+    
+    def generate():
+        try:
+            for chunk in chat_service.stream_message(
+                message=message,
+                session_id=session_id,
+                user_context=user_context
+            ):
+                yield sse('chunk', {'text': chunk})
+            
+            yield sse('done', {
+                'session_id': session_id,
+                'timestamp': datetime.utcnow().isoformat()
+            })
+        except LLMUnavailableError as e:
+            logger.error(f"LLM unavailable while streaming: {str(e)}")
+            yield sse('error', {'error': 'Service temporarily unavailable', 'retry_after': math.ceil(e.retry_after)})
+        except Exception as e:
+            logger.error(f"Error streaming chat message: {str(e)}")
+            yield sse('error', {'error': 'Internal server error'})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 @app.route('/api/chat/history/<session_id>', methods=['GET'])
 @limiter.limit("100 per hour")
 def get_chat_history(session_id):
-    """Retrieve chat history for a specific session."""
+    """Retrieve chat history for a specific session, newest first.
+    
+    Query parameters: limit (page size), cursor (next_cursor from the previous
+    page) and fields (comma-separated; context is only included on request).
+    """
     try:
         if not session_id:
             return jsonify({'error': 'Session ID is required'}), 400
         
-        history = memory_service.get_chat_history(session_id)
+        try:
+            limit = int(request.args.get('limit', Config.HISTORY_PAGE_SIZE))
+            cursor = request.args.get('cursor')
+            before_seq = int(cursor) if cursor else None
+        except ValueError:
+            return jsonify({'error': 'limit and cursor must be integers'}), 400
+        limit = max(1, min(limit, Config.HISTORY_MAX_PAGE_SIZE))
+        fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+        
+        try:
+            # One extra row tells us whether an older page exists
+            history = memory_service.get_chat_history(
+                session_id, limit=limit + 1, before_seq=before_seq, fields=fields or None
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        next_cursor = None
+        if len(history) > limit:
+            history = history[:limit]
+            next_cursor = str(history[-1]['seq'])
         
         return jsonify({
             'session_id': session_id,
             'history': history,
+            'next_cursor': next_cursor,
             'timestamp': datetime.utcnow().isoformat()
         })
         
@@ -177,26 +352,27 @@ def clear_chat_history(session_id):
         logger.error(f"Error clearing chat history: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def etag_response(payload, etag):
+    """JSON response tagged with etag, or an empty 304 if the client already has it."""
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/cases', methods=['GET'])
 @limiter.limit("100 per hour")
 def get_cases():
-    """Get list of available cases."""
+    """Get list of available cases with their size, word and chunk counts."""
     try:
-        cases_dir = "data/cases"
-        cases = []
-        
-        for filename in os.listdir(cases_dir):
-            if filename.endswith('.txt'):
-                cases.append({
-                    'filename': filename,
-                    'title': filename.replace('.txt', '').replace('_', ' ').title()
-                })
-        
-        return jsonify({
+        cases = case_catalog.cases()
+        return etag_response({
             'cases': cases,
             'count': len(cases),
             'timestamp': datetime.utcnow().isoformat()
-        })
+        }, case_catalog.etag())
         
     except Exception as e:
         logger.error(f"Error retrieving cases: {str(e)}")
@@ -205,33 +381,113 @@ def get_cases():
 @app.route('/api/cases/<case_name>', methods=['GET'])
 @limiter.limit("50 per hour")
 def get_case_content(case_name):
-    """Get content of a specific case."""
+    """Get a page of a case's text.
+    
+    Query parameters: offset and length (in characters; length defaults to
+    CASE_CONTENT_PAGE_SIZE), or chunk_id for the exact passage behind a
+    search/chat chunk.
+    """
     try:
         if not case_name.endswith('.txt'):
             case_name += '.txt'
         
-        case_path = os.path.join("data/cases", case_name)
-        
-        if not os.path.exists(case_path):
+        entry = case_catalog.get(case_name)
+        if entry is None:
             return jsonify({'error': 'Case not found'}), 404
         
-        content = extract_text_from_txt(case_path)
+        # Return the exact passage behind a search/chat chunk when requested
+        chunk_id = request.args.get('chunk_id')
+        if chunk_id:
+            etag = f"{entry['etag']}-{hashlib.sha1(chunk_id.encode()).hexdigest()[:12]}"
+            if request.if_none_match.contains(etag):
+                return etag_response(None, etag)
+            chunk = chat_service.get_case_collection().get(ids=[chunk_id], include=["metadatas"])
+            metadata = (chunk.get('metadatas') or [None])[0]
+            if not metadata or metadata.get('filename') != case_name or 'start' not in metadata:
+                return jsonify({'error': 'Chunk not found'}), 404
+            
+            return etag_response({
+                'case_name': case_name,
+                'chunk_id': chunk_id,
+                'story': metadata.get('story', ''),
+                'chapter': metadata.get('chapter', ''),
+                'start': metadata['start'],
+                'end': metadata['end'],
+                'content': case_catalog.read(case_name, metadata['start'], metadata['end'] - metadata['start']),
+                'full_length': entry['characters'],
+                'timestamp': datetime.utcnow().isoformat()
+            }, etag)
         
-        return jsonify({
+        try:
+            offset = int(request.args.get('offset', 0))
+            length = int(request.args.get('length', Config.CASE_CONTENT_PAGE_SIZE))
+        except ValueError:
+            return jsonify({'error': 'offset and length must be integers'}), 400
+        offset = max(0, offset)
+        length = max(1, min(length, Config.CASE_CONTENT_MAX_LENGTH))
+        
+        etag = f"{entry['etag']}-{offset}-{length}"
+        if request.if_none_match.contains(etag):
+            return etag_response(None, etag)
+        
+        content = case_catalog.read(case_name, offset, length)
+        end = min(offset, entry['characters']) + len(content)
+        return etag_response({
             'case_name': case_name,
-            'content': content[:10000] + '...' if len(content) > 10000 else content,
-            'full_length': len(content),
+            'title': entry['title'],
+            'content': content,
+            'offset': offset,
+            'length': len(content),
+            'next_offset': end if end < entry['characters'] else None,
+            'full_length': entry['characters'],
             'timestamp': datetime.utcnow().isoformat()
-        })
+        }, etag)
         
     except Exception as e:
         logger.error(f"Error retrieving case content: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def search_options(data):
+    """(retrieval options, error) from a search request body.
+    
+    limit is capped at SEARCH_MAX_LIMIT; filename and story (a value or a
+    list of values) filter hits; max_distance drops weak matches and
+    mmr_lambda (0-1) diversifies them.
+    """
+    limit = data.get('limit', 5)
+    if isinstance(limit, bool) or not isinstance(limit, int):
+        return None, 'limit must be an integer'
+    options = {'k': max(1, min(limit, Config.SEARCH_MAX_LIMIT))}
+    
+    where = {}
+    for field in ('filename', 'story'):
+        value = data.get(field)
+        if value is None:
+            continue
+        values = value if isinstance(value, list) else [value]
+        if not values or not all(isinstance(item, str) and item for item in values):
+            return None, f'{field} must be a non-empty string or list of strings'
+        where[field] = values if isinstance(value, list) else value
+    if where:
+        options['where'] = where
+    
+    for field, low, high in (('max_distance', 0.0, 2.0), ('mmr_lambda', 0.0, 1.0)):
+        value = data.get(field)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not low <= value <= high:
+            return None, f'{field} must be a number between {low:g} and {high:g}'
+        options[field] = float(value)
+    return options, None
+
 @app.route('/api/search', methods=['POST'])
 @limiter.limit("20 per minute")
 def search_cases():
-    """Search through case content."""
+    """Search through case content.
+    
+    results lists the matching passages; hits carries the same passages with
+    their chunk ids, source and scores.
+    """
     try:
         data = request.get_json()
         
@@ -242,15 +498,21 @@ def search_cases():
         if not query:
             return jsonify({'error': 'Search query cannot be empty'}), 400
         
-        limit = data.get('limit', 5)
+        options, error = search_options(data)
+        if error:
+            return jsonify({'error': error}), 400
         
         # Search through case collection
-        results = retrieve_documents(chat_service.get_case_collection(), query, k=limit)
+        hits = retrieve_chunks(
+            chat_service.get_case_collection(), query,
+            keyword_index=chat_service.keyword_index, **options
+        )
         
         return jsonify({
             'query': query,
-            'results': results,
-            'count': len(results),
+            'results': [hit['text'] for hit in hits],
+            'hits': hits,
+            'count': len(hits),
             'timestamp': datetime.utcnow().isoformat()
         })
         
@@ -258,6 +520,50 @@ def search_cases():
         logger.error(f"Error searching cases: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/api/search/batch', methods=['POST'])
+@limiter.limit("20 per minute")
+def search_cases_batch():
+    """Search case content for several queries in one request.
+    
+    Body: {"queries": [...], "limit": 5}. Returns one result list per query,
+    in order, each hit with its chunk id, text and score.
+    """
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('queries'), list):
+            return jsonify({'error': 'queries must be a list of search queries'}), 400
+        
+        queries = [query.strip() for query in data['queries'] if isinstance(query, str)]
+        if len(queries) != len(data['queries']) or not all(queries):
+            return jsonify({'error': 'Search queries must be non-empty strings'}), 400
+        if not queries:
+            return jsonify({'error': 'At least one search query is required'}), 400
+        if len(queries) > Config.SEARCH_BATCH_MAX_QUERIES:
+            return jsonify({'error': f'At most {Config.SEARCH_BATCH_MAX_QUERIES} queries per batch'}), 400
+        
+        options, error = search_options(data)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        results = retrieve_documents_batch(
+            chat_service.get_case_collection(), queries,
+            keyword_index=chat_service.keyword_index, **options
+        )
+        
+        return jsonify({
+            'results': [
+                {'query': query, 'results': hits, 'count': len(hits)}
+                for query, hits in zip(queries, results)
+            ],
+            'count': len(queries),
+            'timestamp': datetime.utcnow().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Error batch searching cases: {str(e)}")
+        return jsonify({'error': 'Internal server error'}), 500
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors."""
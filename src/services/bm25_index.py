@@ -0,0 +1,194 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+INDEX_VERSION = 1
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from had has have he her him his i if in into is it its "
+    "me my no not of on or our she so that the their them then there they this to was we were "
+    "what when which who will with would you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word tokens with stopwords removed."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over case chunks, stored as compact arrays.
+
+    Postings are kept in CSR form: term_offsets[t]:term_offsets[t+1] slices
+    postings_docs (int32 document numbers) and postings_tf (uint16 term
+    frequencies). The arrays are saved as .npy files and loaded with
+    mmap_mode='r', so opening an index is cheap and its pages are shared
+    between worker processes.
+    """
+
+    def __init__(self, vocabulary, doc_ids, term_offsets, postings_docs, postings_tf,
+                 doc_lengths, k1: float = 1.2, b: float = 0.75):
+        self.vocabulary = vocabulary
+        self.doc_ids = doc_ids
+        self.term_offsets = term_offsets
+        self.postings_docs = postings_docs
+        self.postings_tf = postings_tf
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = float(np.mean(doc_lengths)) if len(doc_lengths) else 0.0
+        # Per-document length normalization, precomputed once
+        self._length_norm = (k1 * (1 - b + b * np.asarray(doc_lengths, dtype=np.float32)
+                                   / max(self.avg_doc_length, 1e-9))).astype(np.float32)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[str, str]], k1: float = 1.2, b: float = 0.75) -> 'BM25Index':
+        """Build an index from (chunk_id, text) pairs."""
+        doc_ids = []
+        doc_lengths = []
+        term_docs = {}
+        for doc_number, (doc_id, text) in enumerate(documents):
+            tokens = tokenize(text)
+            doc_ids.append(doc_id)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_docs.setdefault(term, []).append((doc_number, tf))
+
+        terms = sorted(term_docs)
+        vocabulary = {term: term_id for term_id, term in enumerate(terms)}
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for term_id, term in enumerate(terms):
+            term_offsets[term_id + 1] = term_offsets[term_id] + len(term_docs[term])
+
+        postings_docs = np.empty(int(term_offsets[-1]), dtype=np.int32)
+        postings_tf = np.empty(int(term_offsets[-1]), dtype=np.uint16)
+        for term_id, term in enumerate(terms):
+            postings = term_docs[term]
+            start = term_offsets[term_id]
+            postings_docs[start:start + len(postings)] = [doc for doc, _ in postings]
+            postings_tf[start:start + len(postings)] = [min(tf, 65535) for _, tf in postings]
+
+        return cls(vocabulary, doc_ids, term_offsets, postings_docs, postings_tf,
+                   np.asarray(doc_lengths, dtype=np.int32), k1=k1, b=b)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Top-k (chunk_id, score) pairs for a query."""
+        if not len(self.doc_ids):
+            return []
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        n_docs = len(self.doc_ids)
+        matched = False
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.postings_docs[start:end]
+            tf = self.postings_tf[start:end].astype(np.float32)
+            idf = np.log(1.0 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            # Each document appears once per term, so fancy-index += is safe
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+            matched = True
+        if not matched:
+            return []
+
+        k = min(k, n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.doc_ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def save(self, path: str):
+        """Write the index to a directory, replacing any existing one atomically.
+
+        Scratch directories are unique per call, so a save never writes into
+        or deletes another one's files. Processes that may save the same path
+        at once hold ingestion_lock around it so the swaps do not interleave.
+        """
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        name = os.path.basename(path)
+        tmp_path = tempfile.mkdtemp(prefix=f"{name}.", suffix=".tmp", dir=parent)
+        try:
+            np.save(os.path.join(tmp_path, "term_offsets.npy"), self.term_offsets)
+            np.save(os.path.join(tmp_path, "postings_docs.npy"), self.postings_docs)
+            np.save(os.path.join(tmp_path, "postings_tf.npy"), self.postings_tf)
+            np.save(os.path.join(tmp_path, "doc_lengths.npy"), self.doc_lengths)
+            with open(os.path.join(tmp_path, "terms.json"), "w", encoding="utf-8") as file:
+                json.dump(sorted(self.vocabulary, key=self.vocabulary.get), file)
+            with open(os.path.join(tmp_path, "doc_ids.json"), "w", encoding="utf-8") as file:
+                json.dump(self.doc_ids, file)
+            with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as file:
+                json.dump({'version': INDEX_VERSION, 'k1': self.k1, 'b': self.b,
+                           'documents': len(self.doc_ids), 'terms': len(self.vocabulary)}, file)
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+        # Renaming onto an empty directory is allowed, so the old index moves aside atomically
+        old_path = tempfile.mkdtemp(prefix=f"{name}.", suffix=".old", dir=parent)
+        try:
+            os.replace(path, old_path)
+        except FileNotFoundError:
+            pass
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        finally:
+            shutil.rmtree(old_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['BM25Index']:
+        """Open a saved index with its arrays memory-mapped, or None if absent."""
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, "r", encoding="utf-8") as file:
+            meta = json.load(file)
+        if meta.get('version') != INDEX_VERSION:
+            logger.info(f"Ignoring BM25 index at {path} with version {meta.get('version')}")
+            return None
+
+        with open(os.path.join(path, "terms.json"), "r", encoding="utf-8") as file:
+            vocabulary = {term: term_id for term_id, term in enumerate(json.load(file))}
+        with open(os.path.join(path, "doc_ids.json"), "r", encoding="utf-8") as file:
+            doc_ids = json.load(file)
+
+        def array(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+
+        return cls(vocabulary, doc_ids, array("term_offsets"), array("postings_docs"),
+                   array("postings_tf"), array("doc_lengths"), k1=meta['k1'], b=meta['b'])
+
+
+def build_from_collection(collection, path: str, page_size: int = 5000) -> BM25Index:
+    """Rebuild the BM25 index over every chunk in a case collection and save it."""
+    def documents():
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids = page.get('ids') or []
+            for chunk_id, metadata in zip(ids, page.get('metadatas') or []):
+                yield chunk_id, (metadata or {}).get('text', '')
+            if len(ids) < page_size:
+                return
+            offset += page_size
+
+    index = BM25Index.build(documents())
+    index.save(path)
+    logger.info(f"Built BM25 index over {len(index)} chunks at {path}")
+    return index
@@ -0,0 +1,236 @@
+import codecs
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from services.chunking import SMALL_WORDS, TOKEN_PATTERN, title_case
+from services.ingestion import IngestionManifest, get_chunker
+from services.text_processing import extract_text_from_txt
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CATALOG_VERSION = 1
+# A byte offset is recorded every CHECKPOINT_CHARS characters of a non-ASCII file
+CHECKPOINT_CHARS = 4096
+PUBLIC_FIELDS = ('filename', 'title', 'size', 'characters', 'word_count', 'chunk_count')
+
+
+def case_title(text: str, filename: str) -> str:
+    """Title from the upper-case heading of a Gutenberg text, or from the filename.
+
+    A heading split over blank lines ("THE ADVENTURE OF THE" ... "BRUCE-PARTINGTON
+    PLANS") is joined up.
+    """
+    heading = []
+    for line in text.lstrip("\ufeff\n\r\t ").splitlines()[:20]:
+        line = line.strip()
+        if not line:
+            if heading[-1].split()[-1].lower() in SMALL_WORDS:
+                continue
+            break
+        if line != line.upper():
+            break
+        heading.append(line)
+    title = " ".join(heading)
+    if not title or len(title) > 80:
+        return filename.replace('.txt', '').replace('_', ' ').title()
+    return title_case(title)
+
+
+def _checkpoints(text: str) -> List[int]:
+    """Byte offset of every CHECKPOINT_CHARS-th character of text in UTF-8."""
+    offsets = [0]
+    for start in range(0, len(text) - CHECKPOINT_CHARS, CHECKPOINT_CHARS):
+        offsets.append(offsets[-1] + len(text[start:start + CHECKPOINT_CHARS].encode("utf-8")))
+    return offsets
+
+
+class CaseCatalog:
+    """Metadata and ranged reads for the case files, built once and kept current.
+
+    Each file's entry holds its title, size, character, word and chunk
+    counts, a content hash used as its ETag and, for files with non-ASCII
+    text, byte offsets at every CHECKPOINT_CHARS characters. Entries are
+    saved to path and reused while a file's size and mtime are unchanged, so
+    only new or edited files are read on a refresh; chunk counts come from
+    the ingestion manifest when it covers the file. The directory is
+    rescanned at most every refresh_interval seconds.
+
+    read() serves a character range from a memory map of the file, decoding
+    at most one checkpoint interval beyond the range, so a preview of a
+    novel never reads the whole novel. Offsets are in characters, like the
+    start/end of chunk metadata.
+    """
+
+    def __init__(self, cases_dir: str, path: Optional[str] = None, manifest_path: Optional[str] = None,
+                 refresh_interval: float = 10.0):
+        self.cases_dir = cases_dir
+        self.path = path
+        self.manifest_path = manifest_path
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._etag = ""
+        self._maps: Dict[str, Any] = {}  # filename -> (etag, mmap)
+        self._next_check = 0.0
+
+    def cases(self) -> List[Dict[str, Any]]:
+        """Public metadata of every case, by filename."""
+        entries = self._current()
+        return [{field: entries[name][field] for field in PUBLIC_FIELDS} for name in sorted(entries)]
+
+    def etag(self) -> str:
+        """Changes whenever any case file is added, removed or edited."""
+        self._current()
+        return self._etag
+
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        return self._current().get(filename)
+
+    def read(self, filename: str, offset: int = 0, length: Optional[int] = None) -> str:
+        """Characters [offset, offset + length) of a case file."""
+        entry = self.get(filename)
+        if entry is not None and entry['ranged']:
+            mapped = self._map(filename, entry)
+            if len(mapped) != entry['size']:
+                # Edited since the last scan: index the new content first
+                self.refresh()
+                entry = self.get(filename)
+        if entry is None:
+            raise FileNotFoundError(filename)
+        start = max(0, min(offset, entry['characters']))
+        end = entry['characters'] if length is None else max(start, min(entry['characters'], start + length))
+        if start == end:
+            return ""
+        if not entry['ranged']:
+            return extract_text_from_txt(os.path.join(self.cases_dir, filename))[start:end]
+        mapped = self._map(filename, entry)
+        start_byte = self._byte_offset(entry, mapped, start)
+        end_byte = self._byte_offset(entry, mapped, end)
+        return mapped[start_byte:end_byte].decode("utf-8")
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rescan the cases directory; returns True if any entry changed."""
+        with self._lock:
+            self._next_check = time.monotonic() + self.refresh_interval
+            previous = self._entries if self._entries is not None else self._load()
+            entries = {}
+            manifest = None
+            for dir_entry in os.scandir(self.cases_dir):
+                if not dir_entry.name.endswith('.txt') or not dir_entry.is_file():
+                    continue
+                stat = dir_entry.stat()
+                entry = previous.get(dir_entry.name)
+                if (force or entry is None or entry['size'] != stat.st_size
+                        or entry['mtime_ns'] != stat.st_mtime_ns):
+                    if manifest is None:
+                        manifest = IngestionManifest(self.manifest_path).files if self.manifest_path else {}
+                    entry = self._build_entry(dir_entry.path, dir_entry.name, stat, manifest.get(dir_entry.name))
+                entries[dir_entry.name] = entry
+
+            changed = entries != previous or self._entries is None
+            self._entries = entries
+            self._etag = hashlib.sha1(
+                "".join(f"{name}:{entries[name]['etag']};" for name in sorted(entries)).encode()
+            ).hexdigest()[:16]
+            for name in list(self._maps):
+                if name not in entries or self._maps[name][0] != entries[name]['etag']:
+                    del self._maps[name]  # closed once no reader holds it
+            if entries != previous:
+                logger.info(f"Case catalog: {len(entries)} cases")
+                self._save(entries)
+            return changed
+
+    def _current(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            self.refresh()
+        elif time.monotonic() >= self._next_check and not self._lock.locked():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing case catalog: {str(e)}")
+        return self._entries
+
+    def _build_entry(self, file_path: str, filename: str, stat, manifest_entry) -> Dict[str, Any]:
+        with open(file_path, "rb") as file:
+            data = file.read()
+        text = data.decode("utf-8")
+        chunker = get_chunker()
+        if (manifest_entry and manifest_entry.get('size') == stat.st_size
+                and manifest_entry.get('mtime_ns') == stat.st_mtime_ns
+                and manifest_entry.get('chunker_version') == chunker.version):
+            chunk_count = len(manifest_entry.get('chunks', []))
+        else:
+            chunk_count = sum(1 for _ in chunker.iter_chunks(text))
+        return {
+            'filename': filename,
+            'title': case_title(text, filename),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'characters': len(text),
+            'word_count': sum(1 for _ in TOKEN_PATTERN.finditer(text)),
+            'chunk_count': chunk_count,
+            'etag': hashlib.sha256(data).hexdigest()[:16],
+            # Text reads translate \r\n, so such files are not served by byte range
+            'ranged': b"\r" not in data,
+            'checkpoints': None if len(text) == len(data) else _checkpoints(text)
+        }
+
+    def _byte_offset(self, entry: Dict[str, Any], mapped, char_offset: int) -> int:
+        checkpoints = entry['checkpoints']
+        if checkpoints is None:
+            return char_offset
+        if char_offset >= entry['characters']:
+            return entry['size']
+        base = checkpoints[char_offset // CHECKPOINT_CHARS]
+        remaining = char_offset % CHECKPOINT_CHARS
+        if not remaining:
+            return base
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        text = decoder.decode(mapped[base:base + remaining * 4])
+        return base + len(text[:remaining].encode("utf-8"))
+
+    def _map(self, filename: str, entry: Dict[str, Any]):
+        cached = self._maps.get(filename)
+        if cached is not None and cached[0] == entry['etag']:
+            return cached[1]
+        with open(os.path.join(self.cases_dir, filename), "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return b""
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps[filename] = (entry['etag'], mapped)
+        return mapped
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path:
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            if data.get('version') == CATALOG_VERSION and data.get('cases_dir') == os.path.abspath(self.cases_dir):
+                return data.get('files', {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Ignoring unreadable case catalog {self.path}: {str(e)}")
+        return {}
+
+    def _save(self, entries: Dict[str, Dict[str, Any]]):
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump({'version': CATALOG_VERSION, 'cases_dir': os.path.abspath(self.cases_dir),
+                           'files': entries}, file)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving case catalog {self.path}: {str(e)}")
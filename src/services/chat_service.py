@@ -1,64 +1,144 @@
 import os
-import google.generativeai as genai
-from langchain.prompts import PromptTemplate
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import chromadb
 
 from utils.config import Config
 from utils.logger import get_logger
-from services.retrieval import retrieve_documents
+from utils.metrics import in_context, observe_stage, registry as metrics, timed, trace
+from services.retrieval import invalidate_retrieval_cache, retrieve_chunks
 from services.memory_service import MemoryService
+from services.chroma_registry import get_registry
+from services.snapshots import MANIFEST_FILE, QUANTIZED_INDEX_FILE, resolve_snapshot
+from services.bm25_index import BM25Index
+from services.quantized_index import QuantizedCaseIndex
+from services.llm_gateway import create_llm_gateway
+from services.response_cache import ResponseCache
+from services.embedding_provider import get_embedding_provider
+from services.prompt_builder import PromptBuilder, count_tokens
+from services.prompt_template import PromptTemplate
+from services.summarizer import ConversationSummarizer
 
 logger = get_logger(__name__)
 
+LLM_TOKENS = metrics.counter(
+    "sherlock_llm_tokens_total", "Estimated prompt and response tokens of LLM calls", ("direction",)
+)
+
 class ChatService:
     """Service class for handling chat interactions with Sherlock Holmes AI."""
     
-    def __init__(self):
-        """Initialize the chat service."""
+    def __init__(self, registry=None, memory_service=None):
+        """Initialize the chat service.
+        
+        Collections come from the shared ChromaRegistry; pass registry and/or
+        memory_service to inject alternatives.
+        """
         self.config = Config()
-        self.memory_service = MemoryService()
+        self.registry = registry or get_registry()
+        self.memory_service = memory_service or MemoryService(registry=self.registry)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.config.RETRIEVAL_WORKERS,
+            thread_name_prefix="retrieval"
+        )
+        self.response_cache = None
+        if self.config.RESPONSE_CACHE_ENABLED:
+            self.response_cache = ResponseCache(
+                get_embedding_provider(),
+                threshold=self.config.RESPONSE_CACHE_THRESHOLD,
+                ttl=self.config.RESPONSE_CACHE_TTL,
+                max_entries=self.config.RESPONSE_CACHE_MAX_ENTRIES
+            )
         self._initialize_chroma()
         self._initialize_gemini()
         self._load_sherlock_prompt()
+        self.summarizer = None
+        if self.config.SUMMARY_ENABLED:
+            self.summarizer = ConversationSummarizer(
+                self.memory_service, self.llm,
+                keep_recent=self.config.MEMORY_RETRIEVAL_LIMIT,
+                min_turns=self.config.SUMMARY_MIN_TURNS,
+                max_tokens=self.config.SUMMARY_MAX_TOKENS
+            )
     
     def _initialize_chroma(self):
-        """Initialize ChromaDB client and collections."""
+        """Initialize ChromaDB collections from the shared registry."""
         try:
-            self.chroma_client = chromadb.PersistentClient(path=self.config.CHROMA_DB_PATH)
-            self.case_collection = self.chroma_client.get_or_create_collection("case_data")
-            self.memory_collection = self.chroma_client.get_or_create_collection("chat_memory")
+            self.case_index_path = None
+            if self.config.CASE_INDEX_SNAPSHOT:
+                self.case_index_path = resolve_snapshot(
+                    self.config.SNAPSHOT_ROOT, self.config.CASE_INDEX_SNAPSHOT
+                )
+                logger.info(f"Serving case index snapshot {self.case_index_path}")
+            if self.config.CASE_INDEX_BACKEND == 'quantized':
+                self.case_collection = QuantizedCaseIndex(
+                    os.path.join(self.case_index_path, QUANTIZED_INDEX_FILE) if self.case_index_path
+                    else self.config.QUANTIZED_INDEX_PATH,
+                    embedding_model=get_embedding_provider().model_id
+                )
+            else:
+                # A snapshot is served as built; never create (or write) collections in it
+                self.case_collection = self.registry.get_collection(
+                    "case_data", path=self.case_index_path, read_only=self.case_index_path is not None
+                )
+            self.keyword_index_path = (
+                os.path.join(self.case_index_path, "bm25") if self.case_index_path
+                else self.config.BM25_INDEX_PATH
+            )
+            # The manifest describing the chunks being served (the case catalog reads its counts)
+            self.case_manifest_path = (
+                os.path.join(self.case_index_path, MANIFEST_FILE) if self.case_index_path
+                else self.config.INGEST_MANIFEST_PATH
+            )
+            self.reload_keyword_index()
+            self.memory_collection = self.memory_service.memory_collection
             logger.info("ChromaDB initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing ChromaDB: {str(e)}")
             raise
     
     def _initialize_gemini(self):
-        """Initialize Google Gemini model."""
+        """Initialize the LLM provider (Gemini or the offline fake) behind the LLM gateway."""
         try:
-            genai.configure(api_key=self.config.GOOGLE_API_KEY)
-            self.llm = genai.GenerativeModel(self.config.GEMINI_MODEL)
-            logger.info("Google Gemini initialized successfully")
+            self.llm = create_llm_gateway(self.config)
+            logger.info(f"LLM provider {self.config.LLM_PROVIDER} initialized "
+                        f"(max {self.llm.max_concurrency} concurrent calls, {self.llm.timeout}s timeout)")
         except Exception as e:
-            logger.error(f"Error initializing Gemini: {str(e)}")
+            logger.error(f"Error initializing LLM: {str(e)}")
             raise
     
     def _load_sherlock_prompt(self):
         """Load the Sherlock Holmes prompt template."""
         try:
-            prompt_file = "src/templates/sherlock_prompt.txt"
-            with open(prompt_file, "r", encoding="utf-8") as file:
-                sherlock_prompt_template = file.read()
-            
+            reload_interval = self.config.PROMPT_TEMPLATE_RELOAD_INTERVAL
             self.prompt_template = PromptTemplate(
-                template=sherlock_prompt_template,
-                input_variables=["query", "memory_context", "case_context", "session_context"]
+                self.config.PROMPT_TEMPLATE_PATH,
+                variables=["query", "memory_context", "case_context", "session_context"],
+                reload_interval=reload_interval if reload_interval > 0 else None
+            )
+            self.prompt_builder = PromptBuilder(
+                self.prompt_template.format,
+                budget=self.config.PROMPT_TOKEN_BUDGET,
+                response_tokens=self.config.PROMPT_MEMORY_RESPONSE_TOKENS,
+                dedup_threshold=self.config.PROMPT_DEDUP_THRESHOLD
             )
             logger.info("Sherlock prompt template loaded successfully")
         except Exception as e:
             logger.error(f"Error loading prompt template: {str(e)}")
             raise
     
+    def reload_keyword_index(self):
+        """(Re)open the memory-mapped BM25 index used for hybrid case retrieval."""
+        self.keyword_index = None
+        invalidate_retrieval_cache()
+        if self.config.HYBRID_SEARCH_ENABLED:
+            self.keyword_index = BM25Index.load(self.keyword_index_path)
+            if self.keyword_index is None:
+                logger.info("No BM25 index found; case retrieval is vector-only")
+        return self.keyword_index
+    
     def get_case_collection(self):
         """Get the case collection for external access."""
         return self.case_collection
@@ -72,42 +152,9 @@ class ChatService:
         try:
             logger.info(f"Processing message for session {session_id}")
             
-            # Get relevant memory context
-            memory_context = self.memory_service.retrieve_memory(
-                session_id, message, limit=self.config.MEMORY_RETRIEVAL_LIMIT
-            )
-            
-            # Get relevant case context
-            case_context = retrieve_documents(
-                self.case_collection, message, k=5
-            )
-            
-            # Build session context
-            session_context = self._build_session_context(session_id, user_context)
-            
-            # Generate the final prompt
-            final_prompt = self.prompt_template.format(
-                query=message,
-                memory_context=memory_context,
-                case_context="\n".join(case_context),
-                session_context=session_context
-            )
-            
-            # Generate response from Gemini
-            response = self.llm.generate_content(final_prompt)
-            response_text = response.text
-            
-            # Store the conversation in memory
-            self.memory_service.store_conversation(
-                session_id=session_id,
-                user_message=message,
-                assistant_response=response_text,
-                context={
-                    'case_context': case_context,
-                    'memory_context': memory_context,
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-            )
+            with trace() as request_trace, timed("chat.process_message"):
+                response_text = self._respond(message, session_id, user_context)
+            self._log_slow_chat(session_id, request_trace)
             
             logger.info(f"Successfully processed message for session {session_id}")
             return response_text
@@ -116,6 +163,198 @@ class ChatService:
             logger.error(f"Error processing message: {str(e)}")
             raise
     
+    def _respond(self, message, session_id, user_context):
+        """Answer a message (from the cache or the LLM) and store the turn."""
+        # Repeated questions are answered from the cache before any retrieval
+        recent = self._get_recent_memory(session_id)
+        partition, cached = self._cached_response(message, recent, user_context)
+        if cached is not None:
+            self._store_turn(session_id, message, cached, cached=True)
+            logger.info(f"Served cached response for session {session_id}")
+            return cached
+        
+        build = self._prepare_prompt(message, session_id, user_context, recent)
+        
+        # Generate response from Gemini
+        with timed("chat.generate_content"):
+            response = self.llm.generate_content(build.prompt)
+            response_text = response.text
+        self._count_tokens(build, response_text)
+        
+        if partition is not None:
+            self.response_cache.put(message, response_text, partition)
+        
+        # Store the conversation in memory
+        self._store_turn(session_id, message, response_text, build)
+        return response_text
+    
+    def stream_message(self, message, session_id, user_context=None):
+        """Process a user message and yield Sherlock's response in chunks.
+        
+        The completed turn is stored in memory once the stream is exhausted;
+        a stream abandoned part-way (e.g. client disconnect) is not stored.
+        """
+        logger.info(f"Streaming message for session {session_id}")
+        
+        recent = self._get_recent_memory(session_id)
+        partition, cached = self._cached_response(message, recent, user_context)
+        if cached is not None:
+            yield cached
+            self._store_turn(session_id, message, cached, cached=True)
+            return
+        
+        build = self._prepare_prompt(message, session_id, user_context, recent)
+        
+        parts = []
+        started = time.perf_counter()
+        for chunk in self.llm.generate_content(build.prompt, stream=True):
+            text = getattr(chunk, 'text', '')
+            if text:
+                if not parts:
+                    observe_stage("chat.first_chunk", time.perf_counter() - started)
+                parts.append(text)
+                yield text
+        # Includes the time the client took to take each chunk
+        observe_stage("chat.generate_content_stream", time.perf_counter() - started)
+        
+        response_text = "".join(parts)
+        self._count_tokens(build, response_text)
+        if partition is not None:
+            self.response_cache.put(message, response_text, partition)
+        self._store_turn(session_id, message, response_text, build)
+        logger.info(f"Successfully streamed message for session {session_id}")
+    
+    def _prepare_prompt(self, message, session_id, user_context, recent):
+        """Gather similar-memory and case context concurrently and build the final prompt."""
+        similar_future = self.executor.submit(in_context(self._get_similar_memory), session_id, message)
+        case_future = self.executor.submit(in_context(self._get_case_context), message)
+        summary_future = self.executor.submit(in_context(self._get_conversation_summary), session_id)
+        
+        return self._render_prompt(
+            message, session_id, user_context,
+            recent, similar_future.result(), case_future.result(), summary_future.result()
+        )
+    
+    def _cached_response(self, message, recent, user_context):
+        """Return (partition, cached response); partition is None when caching does not apply."""
+        partition = self._cache_partition(recent, user_context)
+        if partition is None:
+            return None, None
+        with timed("chat.response_cache"):
+            return partition, self.response_cache.get(message, partition)
+    
+    def _cache_partition(self, recent, user_context):
+        """Cache partition for a prompt, or None when session memory makes it one-off.
+        
+        Prompts carrying this session's previous turns are not cached. Prompts
+        with user-supplied context share answers only with identical context.
+        """
+        if self.response_cache is None or recent:
+            return None
+        if not user_context:
+            return "global"
+        digest = hashlib.sha1(json.dumps(user_context, sort_keys=True, default=str).encode()).hexdigest()
+        return f"context:{digest[:16]}"
+    
+    def _get_recent_memory(self, session_id):
+        """Recent turns from this session, oldest first.
+        
+        With summarization on, up to SUMMARY_MIN_TURNS - 1 extra turns are read
+        so the turns between the summary and the raw window are not lost.
+        """
+        limit = self.config.MEMORY_RETRIEVAL_LIMIT
+        if self.summarizer is not None:
+            limit += self.summarizer.min_turns - 1
+        return self.memory_service.get_recent_conversations(session_id, limit=limit)
+    
+    def _get_similar_memory(self, session_id, message):
+        """Semantically similar turns from other sessions."""
+        return self.memory_service.get_similar_conversations(
+            session_id, message, limit=self.config.MEMORY_RETRIEVAL_LIMIT
+        )
+    
+    def _get_conversation_summary(self, session_id):
+        """(summary, seq of the last turn it covers) for this session's older turns."""
+        if self.summarizer is None:
+            return "", 0
+        return self.memory_service.get_conversation_summary(session_id)
+    
+    def _get_case_context(self, message):
+        """Relevant, mutually distinct case chunks as scored hit dicts."""
+        mmr_lambda = self.config.RETRIEVAL_MMR_LAMBDA
+        with timed("chat.retrieve_documents"):
+            return retrieve_chunks(
+                self.case_collection, message, k=self.config.CASE_CONTEXT_CHUNKS,
+                keyword_index=self.keyword_index,
+                max_distance=self.config.RETRIEVAL_MAX_DISTANCE,
+                mmr_lambda=mmr_lambda if mmr_lambda < 1 else None
+            )
+    
+    def _render_prompt(self, message, session_id, user_context, recent, similar, case_context,
+                       summary=("", 0)):
+        """Assemble the token-budgeted prompt once all retrievals are back.
+        
+        Recent turns already folded into the summary are left out; without a
+        summary only the last MEMORY_RETRIEVAL_LIMIT turns are used.
+        """
+        summary, summary_seq = summary
+        if summary:
+            recent = [turn for turn in recent if turn.get('seq', 0) > summary_seq]
+        else:
+            recent = recent[-self.config.MEMORY_RETRIEVAL_LIMIT:]
+        with timed("chat.prompt_format"):
+            session_context = self._build_session_context(session_id, user_context)
+            build = self.prompt_builder.build(
+                message, session_context, recent, similar, case_context, summary=summary
+            )
+        logger.info(f"Prompt tokens for session {session_id}: {build.breakdown}")
+        return build
+    
+    def _store_turn(self, session_id, message, response_text, build=None, cached=False):
+        """Persist a completed conversation turn.
+        
+        Only the ids of the case chunks and memory turns behind the answer are
+        kept, not their text, so stored turns stay small.
+        """
+        context = {
+            'case_chunk_ids': [chunk['id'] for chunk in build.case_chunks] if build else [],
+            'memory_turn_ids': build.memory_turn_ids if build else [],
+            'timestamp': datetime.utcnow().isoformat()
+        }
+        if build is not None:
+            context['prompt_tokens'] = build.breakdown
+        if cached:
+            context['cached'] = True
+        self.memory_service.store_conversation(
+            session_id=session_id,
+            user_message=message,
+            assistant_response=response_text,
+            context=context
+        )
+        if self.summarizer is not None:
+            self.summarizer.schedule(session_id)
+    
+    def _count_tokens(self, build, response_text):
+        if metrics.enabled:
+            LLM_TOKENS.inc(build.breakdown['total'], direction='prompt')
+            LLM_TOKENS.inc(count_tokens(response_text), direction='response')
+    
+    def _log_slow_chat(self, session_id, request_trace):
+        """Log where the time went when a chat took at least METRICS_SLOW_CHAT_SECONDS."""
+        if request_trace is not None and request_trace.elapsed() >= self.config.METRICS_SLOW_CHAT_SECONDS:
+            logger.info(f"Slow chat for session {session_id} ({request_trace.elapsed():.2f}s): "
+                        f"{request_trace.summary()}")
+    
+    def llm_stats(self):
+        """LLM gateway counters, slot usage and circuit state."""
+        return self.llm.stats()
+    
+    def response_cache_stats(self):
+        """Response cache hit/miss counters, or None when disabled."""
+        if self.response_cache is None:
+            return None
+        return self.response_cache.stats()
+    
     def _build_session_context(self, session_id, user_context):
         """Build session-specific context information."""
         context_parts = []
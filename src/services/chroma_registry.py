@@ -0,0 +1,126 @@
+import threading
+
+from utils.config import Config
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Every collection is opened with the same metadata no matter which service asks first
+COLLECTION_METADATA = {
+    "case_data": None,
+    "chat_memory": {"hnsw:space": "cosine"},
+    "session_data": {"hnsw:space": "cosine"},
+}
+
+# Collections whose documents and query_texts are embedded with the shared provider
+EMBEDDED_COLLECTIONS = {"case_data", "chat_memory"}
+
+
+class ReadOnlyCollection:
+    """A collection whose reads pass through and whose writes are refused."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def _read_only(self, *args, **kwargs):
+        raise RuntimeError(f"Collection {self._collection.name} is opened read-only; rebuild it with ingest.py")
+
+    add = update = upsert = delete = modify = _read_only
+
+
+class ChromaRegistry:
+    """Process-wide registry of ChromaDB clients and collections.
+
+    Services receive collections from here instead of opening their own
+    PersistentClient, so each worker holds one set of SQLite/HNSW handles.
+    When CHROMA_SERVER_HOST is set, an HttpClient is used instead and all
+    workers share the index held by that server.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or Config()
+        self._lock = threading.RLock()
+        self._clients = {}
+        self._collections = {}
+
+    def get_client(self, path=None):
+        """Return the shared client for a storage path (or the configured HTTP server)."""
+        key = self._client_key(path)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._create_client(key)
+                self._clients[key] = client
+            return client
+
+    def get_collection(self, name, path=None, embedding_function=None, read_only=False):
+        """Return a shared collection, creating it on first use.
+
+        With read_only=True (e.g. for a snapshot) the collection must already
+        exist, Chroma's error is raised if it does not, and writes through the
+        returned collection raise RuntimeError. Chroma itself still opens the
+        files writable; mount the snapshot read-only to rule out any write.
+        """
+        key = (self._client_key(path), name, read_only)
+        with self._lock:
+            collection = self._collections.get(key)
+            if collection is None:
+                client = self.get_client(path)
+                kwargs = {}
+                if COLLECTION_METADATA.get(name):
+                    kwargs['metadata'] = COLLECTION_METADATA[name]
+                if embedding_function is None and name in EMBEDDED_COLLECTIONS:
+                    from services.embedding_provider import get_embedding_provider
+                    embedding_function = get_embedding_provider()
+                if embedding_function is not None:
+                    kwargs['embedding_function'] = embedding_function
+                if read_only:
+                    kwargs.pop('metadata', None)
+                    collection = ReadOnlyCollection(client.get_collection(name, **kwargs))
+                else:
+                    collection = client.get_or_create_collection(name, **kwargs)
+                self._collections[key] = collection
+            return collection
+
+    def reset(self):
+        """Drop all cached clients and collections (e.g. after fork or in tests)."""
+        with self._lock:
+            self._collections.clear()
+            self._clients.clear()
+
+    def _client_key(self, path):
+        # An explicit path (e.g. a case index snapshot) always means a local client
+        if path is None and self.config.CHROMA_SERVER_HOST:
+            return ('http', self.config.CHROMA_SERVER_HOST, self.config.CHROMA_SERVER_PORT)
+        return ('path', path or self.config.CHROMA_DB_PATH)
+
+    def _create_client(self, key):
+        import chromadb
+
+        try:
+            if key[0] == 'http':
+                client = chromadb.HttpClient(host=key[1], port=key[2])
+                logger.info(f"Connected to ChromaDB server at {key[1]}:{key[2]}")
+            else:
+                client = chromadb.PersistentClient(path=key[1])
+                logger.info(f"Opened ChromaDB at {key[1]}")
+            return client
+        except Exception as e:
+            logger.error(f"Error initializing ChromaDB: {str(e)}")
+            raise
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the process-wide ChromaRegistry."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ChromaRegistry()
+        return _registry
@@ -0,0 +1,166 @@
+import re
+from typing import Dict, Iterator, List, Optional
+
+# Whitespace-delimited words stand in for model tokens (MiniLM sees ~1.3 per word)
+TOKEN_PATTERN = re.compile(r"\S+")
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+
+CHAPTER_HEADING = re.compile(r"^\s*(?:CHAPTER|Chapter)\s+(?:[IVXLC]+|\d+)\.?\s*$")
+PART_HEADING = re.compile(r"^\s*PART\s+[IVXLC]+\.?\s*$")
+SECTION_NUMERAL = re.compile(r"^\s{3,}[IVXLC]+\.\s*$")
+# Story titles in the Gutenberg texts are centred, upper-case lines
+STORY_TITLE = re.compile(r"^\s{15,}(?=.*[A-Z]{3})[A-Z][A-Z'-]*(?: [A-Z][A-Z'-]*)*\s*$")
+SENTENCE_END = re.compile(r"[.!?][\"')\]]*$")
+# Kept lower case inside titles ("The Adventure of the Blue Carbuncle")
+SMALL_WORDS = frozenset({'a', 'an', 'and', 'at', 'in', 'of', 'on', 'the', 'to', 'with'})
+_FIRST_LETTER = re.compile(r"[^\W\d_]")
+
+
+def title_case(heading: str) -> str:
+    """Title-case an upper-case heading the way case titles are shown.
+
+    Small words after the first stay lower case and only the first letter of
+    each hyphenated part is raised, so "THE ENGINEER'S THUMB" becomes
+    "The Engineer's Thumb" rather than str.title()'s "The Engineer'S Thumb".
+    """
+    def capitalize(word):
+        return "-".join(_FIRST_LETTER.sub(lambda m: m.group().upper(), part, count=1) for part in word.split("-"))
+
+    return " ".join(
+        word if i and word in SMALL_WORDS else capitalize(word)
+        for i, word in enumerate(heading.lower().split())
+    )
+
+
+class Chunk:
+    """A window of a case text with its character offsets and location."""
+
+    __slots__ = ("text", "start", "end", "index", "story", "chapter", "token_count")
+
+    def __init__(self, text, start, end, index, story, chapter, token_count):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.index = index
+        self.story = story
+        self.chapter = chapter
+        self.token_count = token_count
+
+    def metadata(self) -> Dict[str, object]:
+        """Chroma-safe metadata (no None values)."""
+        return {
+            "chunk_index": self.index,
+            "start": self.start,
+            "end": self.end,
+            "story": self.story or "",
+            "chapter": self.chapter or "",
+            "token_count": self.token_count
+        }
+
+
+class Chunker:
+    """Structure-aware chunker for the Holmes texts.
+
+    The text is first cut at story, part and chapter headings, so no chunk
+    spans two chapters. Each section is then packed into windows of at most
+    max_tokens words that overlap by overlap_tokens; window ends snap back to
+    a paragraph break (or failing that a sentence end) when one falls in the
+    second half of the window. Short dialogue lines are therefore merged
+    with their neighbours and very long paragraphs are split.
+    """
+
+    def __init__(self, max_tokens: int = 200, overlap_tokens: int = 40):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    @property
+    def version(self) -> str:
+        """Identifies the chunk boundaries this configuration produces."""
+        return f"structured-v2-{self.max_tokens}-{self.overlap_tokens}"
+
+    def chunk(self, text: str) -> List[Chunk]:
+        return list(self.iter_chunks(text))
+
+    def iter_chunks(self, text: str) -> Iterator[Chunk]:
+        """Yield chunks lazily, section by section."""
+        index = 0
+        for section_start, section_end, story, chapter in self._sections(text):
+            for start, end, token_count in self._windows(text, section_start, section_end):
+                yield Chunk(text[start:end], start, end, index, story, chapter, token_count)
+                index += 1
+
+    def _sections(self, text: str):
+        """Yield (start, end, story, chapter) spans between headings; headings are excluded."""
+        story: Optional[str] = None
+        chapter: Optional[str] = None
+        # A story title split over lines ("THE ADVENTURE OF THE" / "BRUCE-PARTINGTON PLANS")
+        open_title: Optional[str] = None
+        section_start = 0
+        offset = 0
+        for line in text.splitlines(keepends=True):
+            line_start = offset
+            offset += len(line)
+            stripped = line.strip()
+            if not stripped:
+                continue
+
+            heading = None
+            if CHAPTER_HEADING.match(line) or SECTION_NUMERAL.match(line):
+                heading = "chapter"
+            elif PART_HEADING.match(line):
+                heading = "part"
+            elif STORY_TITLE.match(line):
+                heading = "story"
+            if heading is None:
+                open_title = None
+                continue
+
+            if section_start < line_start:
+                yield section_start, line_start, story, chapter
+            section_start = offset
+            if heading == "story":
+                title = f"{open_title} {stripped}" if open_title else stripped
+                story = title_case(title)
+                chapter = None
+                open_title = title if title.split()[-1].lower() in SMALL_WORDS else None
+            else:
+                chapter = stripped.title() if heading == "part" else stripped
+                open_title = None
+
+        if section_start < len(text):
+            yield section_start, len(text), story, chapter
+
+    def _windows(self, text: str, start: int, end: int):
+        """Yield (start, end, token_count) token windows within [start, end)."""
+        tokens = [(m.start(), m.end()) for m in TOKEN_PATTERN.finditer(text, start, end)]
+        if not tokens:
+            return
+        # paragraph_after[i] is True when a blank line follows token i
+        paragraph_after = [
+            bool(PARAGRAPH_BREAK.search(text, tokens[i][1], tokens[i + 1][0])) if i + 1 < len(tokens) else True
+            for i in range(len(tokens))
+        ]
+
+        i = 0
+        n = len(tokens)
+        while i < n:
+            stop = min(i + self.max_tokens, n)
+            if stop < n:
+                stop = self._snap(text, tokens, paragraph_after, i, stop)
+            yield tokens[i][0], tokens[stop - 1][1], stop - i
+            if stop >= n:
+                break
+            i = max(i + 1, stop - self.overlap_tokens)
+
+    def _snap(self, text, tokens, paragraph_after, first, stop):
+        """Move a window end back to a paragraph or sentence boundary in its second half."""
+        floor = first + (stop - first) // 2
+        for j in range(stop - 1, floor - 1, -1):
+            if paragraph_after[j]:
+                return j + 1
+        for j in range(stop - 1, floor - 1, -1):
+            if SENTENCE_END.search(text, tokens[j][0], tokens[j][1]):
+                return j + 1
+        return stop
@@ -0,0 +1,157 @@
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+import numpy as np
+
+from utils.config import Config
+from utils.logger import get_logger
+from utils.lru_cache import LRUCache
+
+logger = get_logger(__name__)
+
+# The model Chroma's bundled ONNX embedding function ships with
+ONNX_DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+# Query vectors shared by retrieval, memory search and the response cache
+query_embedding_cache = LRUCache(max_size=Config.QUERY_EMBEDDING_CACHE_SIZE)
+
+
+def normalize_query_text(text: str) -> str:
+    """Collapse whitespace so trivially different spellings share a cache entry."""
+    return " ".join(text.split())
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row of a 2-D array in one vectorized pass."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class EmbeddingProvider(ABC):
+    """Base class for text embedding providers.
+
+    Providers embed in batches of batch_size and return unit-length float32
+    rows. Instances are also valid Chroma embedding functions, so the same
+    provider embeds chunks at ingest time and query_texts at query time.
+    """
+
+    model_id = None
+
+    def __init__(self, batch_size: int = 100):
+        self.batch_size = max(1, batch_size)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts and return an (n, dim) array of normalized vectors."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        batches = [
+            self._encode(texts[i:i + self.batch_size])
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        return normalize(np.vstack(batches))
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Embed a single query, served from the shared LRU when seen before."""
+        return self._query_vectors([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """Embed queries as an (n, dim) array; uncached ones are encoded in one batch."""
+        vectors = self._query_vectors(texts)
+        return np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    def _query_vectors(self, texts: List[str]) -> List[np.ndarray]:
+        """Read-only cached vectors for texts, encoding the misses together."""
+        keys = [(self.model_id, normalize_query_text(text)) for text in texts]
+        vectors = [query_embedding_cache.get(key) for key in keys]
+        missing = list(dict.fromkeys(key for key, vector in zip(keys, vectors) if vector is None))
+        if missing:
+            encoded = dict(zip(missing, self.embed([normalized for _, normalized in missing])))
+            for key, vector in encoded.items():
+                vector.setflags(write=False)
+                query_embedding_cache.put(key, vector)
+            vectors = [encoded[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        return vectors
+
+    def __call__(self, input):
+        """Chroma EmbeddingFunction interface."""
+        return self.embed(list(input)).tolist()
+
+    @abstractmethod
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Raw (not yet normalized) vectors for one batch of at most batch_size texts."""
+
+
+class SentenceTransformerProvider(EmbeddingProvider):
+    """Local CPU sentence-transformers model (e.g. all-MiniLM-L6-v2)."""
+
+    def __init__(self, model_name: str, batch_size: int = 100, device: str = "cpu"):
+        super().__init__(batch_size)
+        from sentence_transformers import SentenceTransformer
+
+        self.model_id = model_name
+        self.model = SentenceTransformer(model_name, device=device)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+
+
+class OnnxMiniLMProvider(EmbeddingProvider):
+    """Chroma's bundled ONNX all-MiniLM-L6-v2, used when sentence-transformers is absent."""
+
+    def __init__(self, batch_size: int = 100):
+        super().__init__(batch_size)
+        from chromadb.utils import embedding_functions
+
+        self.model_id = ONNX_DEFAULT_MODEL
+        self.model = embedding_functions.DefaultEmbeddingFunction()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return np.asarray(self.model(texts), dtype=np.float32)
+
+
+def create_embedding_provider(model_name: Optional[str] = None, batch_size: Optional[int] = None,
+                              backend: Optional[str] = None) -> EmbeddingProvider:
+    """Build a provider for model_name using the configured backend.
+
+    backend is 'sentence-transformers', 'onnx' or 'auto' (sentence-transformers
+    if installed, otherwise Chroma's ONNX build of the same MiniLM model).
+    """
+    model_name = model_name or Config.EMBEDDING_MODEL
+    batch_size = batch_size or Config.EMBEDDING_BATCH_SIZE
+    backend = (backend or Config.EMBEDDING_BACKEND).lower()
+
+    if backend in ('sentence-transformers', 'auto'):
+        try:
+            provider = SentenceTransformerProvider(model_name, batch_size=batch_size)
+            logger.info(f"Embedding provider: sentence-transformers/{model_name}")
+            return provider
+        except ImportError:
+            if backend != 'auto':
+                raise
+
+    if model_name.split('/')[-1] != ONNX_DEFAULT_MODEL:
+        raise ValueError(f"ONNX embedding backend only supports {ONNX_DEFAULT_MODEL}, not {model_name}")
+    provider = OnnxMiniLMProvider(batch_size=batch_size)
+    logger.info(f"Embedding provider: onnx/{ONNX_DEFAULT_MODEL}")
+    return provider
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    """Return the process-wide embedding provider for the configured model."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = create_embedding_provider()
+        return _provider
@@ -0,0 +1,69 @@
+import random
+import time
+
+
+class FakeChunk:
+    """A single streamed chunk, shaped like a Gemini response chunk."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeResponse:
+    """A complete (non-streamed) response, shaped like a Gemini response."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeLLMError(ConnectionError):
+    """Injected transient failure, retried by the LLM gateway like a dropped connection."""
+
+
+class FakeLLM:
+    """Offline stand-in for genai.GenerativeModel.
+
+    Produces a deterministic reply and, when streaming, yields it word by word
+    with configurable delays so time-to-first-byte can be measured without a
+    network round-trip. A failure_rate fraction of calls raise FakeLLMError
+    before the first token, to exercise retries and the circuit breaker.
+    """
+
+    def __init__(self, reply=None, first_token_delay=0.0, chunk_delay=0.0, chunk_words=3,
+                 failure_rate=0.0):
+        self.reply = reply or (
+            "Elementary. You see, but you do not observe. "
+            "The distinction is clear once the facts are arranged in order."
+        )
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.chunk_words = max(1, chunk_words)
+        self.failure_rate = failure_rate
+
+    def generate_content(self, prompt, stream=False):
+        """Return a FakeResponse, or an iterator of FakeChunk when stream=True."""
+        if stream:
+            return self._stream()
+        self._maybe_fail()
+        time.sleep(self.first_token_delay + self.chunk_delay * len(self._split()))
+        return FakeResponse(self.reply)
+
+    def _maybe_fail(self):
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise FakeLLMError("Injected fake LLM failure")
+
+    def _split(self):
+        words = self.reply.split(" ")
+        pieces = [
+            " ".join(words[i:i + self.chunk_words])
+            for i in range(0, len(words), self.chunk_words)
+        ]
+        return [piece + " " for piece in pieces[:-1]] + pieces[-1:]
+
+    def _stream(self):
+        self._maybe_fail()
+        time.sleep(self.first_token_delay)
+        for i, piece in enumerate(self._split()):
+            if i:
+                time.sleep(self.chunk_delay)
+            yield FakeChunk(piece)
@@ -0,0 +1,308 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from services.embedding_provider import get_embedding_provider
+from services.embeddings import store_chunks
+from services.retrieval import invalidate_retrieval_cache
+from services.chunking import Chunker
+from services.text_processing import extract_text_from_txt
+from utils.config import Config
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def content_hash(text: str) -> str:
+    """Stable hash of a file's or chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def get_chunker() -> Chunker:
+    """Chunker built from the configured window and overlap sizes."""
+    return Chunker(max_tokens=Config.CHUNK_MAX_TOKENS, overlap_tokens=Config.CHUNK_OVERLAP_TOKENS)
+
+
+def chunk_ids(filename: str, chunks: List[str]) -> List[str]:
+    """Content-addressed chunk ids; repeated paragraphs get an occurrence suffix."""
+    seen = {}
+    ids = []
+    for chunk in chunks:
+        digest = content_hash(chunk)[:16]
+        occurrence = seen.get(digest, 0)
+        seen[digest] = occurrence + 1
+        ids.append(f"{filename}_{digest}" + (f"_{occurrence}" if occurrence else ""))
+    return ids
+
+
+class IngestionManifest:
+    """JSON record of what has been ingested, keyed by file path.
+
+    Each entry stores the file's size, mtime, content hash, chunker version,
+    embedding model and the ids of its chunks, so a re-run only touches files
+    whose content (or chunking/embedding scheme) changed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            if data.get('version') == MANIFEST_VERSION:
+                self.files = data.get('files', {})
+        except FileNotFoundError:
+            self.files = {}
+        except Exception as e:
+            logger.error(f"Ignoring unreadable ingestion manifest {self.path}: {str(e)}")
+            self.files = {}
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.files}, file)
+        os.replace(tmp_path, self.path)
+
+
+@contextmanager
+def ingestion_lock(manifest_path: str):
+    """Serialize ingestion (and index rebuilds) across processes sharing the same manifest."""
+    if fcntl is None:
+        yield
+        return
+    directory = os.path.dirname(manifest_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{manifest_path}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ingest_cases(collection, cases_dir: str, manifest_path: str, provider=None, chunker=None,
+                 batch_size: int = 100, read_workers: int = 4, max_inflight_files: int = 8) -> Dict[str, Any]:
+    """Bring the case collection in line with the .txt files in cases_dir.
+
+    Files are read, hashed and chunked by a pool of read_workers threads; at
+    most max_inflight_files are held in memory at once, so readers wait when
+    embedding falls behind. Chunks from consecutive files share embedding
+    batches of batch_size. Only chunks that are new or changed are embedded;
+    chunks whose file was edited or removed are deleted. On an unchanged
+    corpus this only stats the files. Returns counts of files and chunks touched.
+    """
+    provider = provider or get_embedding_provider()
+    chunker = chunker or get_chunker()
+    start = time.perf_counter()
+    stats = {'files_seen': 0, 'files_changed': 0, 'files_removed': 0,
+             'chunks_added': 0, 'chunks_deleted': 0, 'chunks_kept': 0}
+
+    with ingestion_lock(manifest_path):
+        manifest = IngestionManifest(manifest_path)
+        on_disk = sorted(name for name in os.listdir(cases_dir) if name.endswith('.txt'))
+        batcher = _ChunkBatcher(collection, provider, batch_size, manifest)
+
+        with ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="ingest-read") as executor:
+            plans = _iter_file_plans(
+                executor, cases_dir, on_disk, manifest, chunker, provider.model_id, max_inflight_files
+            )
+            for plan in plans:
+                stats['files_seen'] += 1
+                _apply_plan(collection, manifest, plan, batcher, stats)
+
+        batcher.flush()
+
+        for filename in set(manifest.files) - set(on_disk):
+            old_ids = manifest.files.pop(filename).get('chunks', [])
+            if old_ids:
+                collection.delete(ids=old_ids)
+            stats['chunks_deleted'] += len(old_ids)
+            stats['files_removed'] += 1
+
+        if stats['files_changed'] or stats['files_removed']:
+            manifest.save()
+            invalidate_retrieval_cache()
+
+    stats['seconds'] = round(time.perf_counter() - start, 3)
+    logger.info(f"Case ingestion finished: {stats}")
+    return stats
+
+
+def _iter_file_plans(executor, cases_dir: str, filenames: List[str], manifest: IngestionManifest,
+                     chunker: Chunker, model_id: str, max_inflight: int) -> Iterator[Dict[str, Any]]:
+    """Yield file plans as readers finish them, keeping at most max_inflight outstanding."""
+    pending = set()
+    queued = iter(filenames)
+
+    def submit_next():
+        filename = next(queued, None)
+        if filename is not None:
+            pending.add(executor.submit(
+                _plan_file, filename, os.path.join(cases_dir, filename),
+                manifest.files.get(filename), chunker, model_id
+            ))
+
+    for _ in range(max(1, max_inflight)):
+        submit_next()
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.discard(future)
+            # Read the next file once this one has been applied, not while it is
+            yield future.result()
+            submit_next()
+
+
+def _plan_file(filename: str, file_path: str, entry: Optional[Dict[str, Any]],
+               chunker: Chunker, model_id: str) -> Dict[str, Any]:
+    """Work out what a file needs (runs on a reader thread, touches no shared state)."""
+    file_stat = os.stat(file_path)
+    scheme_current = bool(entry) and (
+        entry.get('chunker_version') == chunker.version
+        and entry.get('embedding_model') == model_id
+    )
+    plan = {'filename': filename, 'entry': entry, 'scheme_current': scheme_current,
+            'chunker_version': chunker.version,
+            'size': file_stat.st_size, 'mtime_ns': file_stat.st_mtime_ns}
+
+    # Fast path: nothing about the file or the chunking/embedding scheme changed
+    if scheme_current and entry.get('size') == file_stat.st_size and entry.get('mtime_ns') == file_stat.st_mtime_ns:
+        plan['status'] = 'unchanged'
+        return plan
+
+    text = extract_text_from_txt(file_path)
+    plan['content_hash'] = content_hash(text)
+    if scheme_current and entry.get('content_hash') == plan['content_hash']:
+        # Touched but not modified
+        plan['status'] = 'touched'
+        return plan
+
+    plan['status'] = 'changed'
+    plan['chunks'] = chunker.chunk(text)
+    plan['ids'] = chunk_ids(filename, [chunk.text for chunk in plan['chunks']])
+    return plan
+
+
+def _apply_plan(collection, manifest: IngestionManifest, plan: Dict[str, Any],
+                batcher: '_ChunkBatcher', stats: Dict[str, Any]):
+    """Apply one file plan: delete stale chunks and queue new ones for embedding."""
+    filename = plan['filename']
+    entry = plan['entry']
+
+    if plan['status'] == 'unchanged':
+        stats['chunks_kept'] += len(entry.get('chunks', []))
+        return
+    stats['files_changed'] += 1
+    if plan['status'] == 'touched':
+        entry.update(size=plan['size'], mtime_ns=plan['mtime_ns'])
+        stats['chunks_kept'] += len(entry.get('chunks', []))
+        return
+
+    chunks, ids = plan['chunks'], plan['ids']
+    if entry is None:
+        # No record of this file: clear anything a previous ingester left behind
+        collection.delete(where={"filename": filename})
+        old_ids = set()
+    elif not plan['scheme_current']:
+        # Chunked or embedded differently: nothing stored can be reused
+        stale = entry.get('chunks', [])
+        if stale:
+            collection.delete(ids=stale)
+        stats['chunks_deleted'] += len(stale)
+        old_ids = set()
+    else:
+        old_ids = set(entry.get('chunks', []))
+
+    orphaned = list(old_ids - set(ids))
+    if orphaned:
+        collection.delete(ids=orphaned)
+    # The file's manifest entry is dropped until its new chunks are stored
+    manifest.files.pop(filename, None)
+
+    kept_ids, kept_metadatas = [], []
+    for id, chunk in zip(ids, chunks):
+        metadata = {"filename": filename, "text": chunk.text, **chunk.metadata(),
+                    "chunker_version": plan['chunker_version'],
+                    "embedding_model": batcher.provider.model_id}
+        if id in old_ids:
+            kept_ids.append(id)
+            kept_metadatas.append(metadata)
+        else:
+            batcher.add(id, chunk.text, metadata)
+            stats['chunks_added'] += 1
+    if kept_ids:
+        # Unchanged chunks may have moved; refresh their position without re-embedding
+        collection.update(ids=kept_ids, metadatas=kept_metadatas)
+
+    batcher.commit_file(filename, {
+        'size': plan['size'],
+        'mtime_ns': plan['mtime_ns'],
+        'content_hash': plan['content_hash'],
+        'chunker_version': plan['chunker_version'],
+        'embedding_model': batcher.provider.model_id,
+        'chunks': ids
+    })
+    stats['chunks_deleted'] += len(orphaned)
+    stats['chunks_kept'] += len(kept_ids)
+
+
+class _ChunkBatcher:
+    """Accumulates chunks across files and embeds them in fixed-size batches.
+
+    A file's manifest entry is recorded only after the last of its chunks has
+    been stored, so an interrupted run re-ingests that file next time.
+    """
+
+    def __init__(self, collection, provider, batch_size: int, manifest: IngestionManifest):
+        self.collection = collection
+        self.provider = provider
+        self.batch_size = max(1, batch_size)
+        self.manifest = manifest
+        self.ids, self.texts, self.metadatas = [], [], []
+        self.queued = 0
+        self.stored = 0
+        self.waiting_files = []
+
+    def add(self, id: str, text: str, metadata: Dict[str, Any]):
+        self.ids.append(id)
+        self.texts.append(text)
+        self.metadatas.append(metadata)
+        self.queued += 1
+        if len(self.ids) >= self.batch_size:
+            self.flush()
+
+    def commit_file(self, filename: str, entry: Dict[str, Any]):
+        self.waiting_files.append((self.queued, filename, entry))
+        self._commit_stored()
+
+    def flush(self):
+        if self.ids:
+            store_chunks(self.collection, self.ids, self.texts, self.metadatas,
+                         provider=self.provider, batch_size=self.batch_size)
+            self.stored += len(self.ids)
+            self.ids, self.texts, self.metadatas = [], [], []
+        self._commit_stored()
+
+    def _commit_stored(self):
+        while self.waiting_files and self.waiting_files[0][0] <= self.stored:
+            _, filename, entry = self.waiting_files.pop(0)
+            self.manifest.files[filename] = entry
@@ -0,0 +1,324 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# google.api_core exception names (and Python builtins) worth retrying
+TRANSIENT_ERRORS = {
+    'ServiceUnavailable', 'DeadlineExceeded', 'InternalServerError', 'GatewayTimeout',
+    'ResourceExhausted', 'TooManyRequests', 'Aborted', 'RetryError'
+}
+
+_END = object()
+
+
+class LLMUnavailableError(Exception):
+    """The LLM cannot take this request now: circuit open, all slots busy, or out of time."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMTimeoutError(LLMUnavailableError, TimeoutError):
+    """An LLM call ran past its deadline."""
+
+
+def is_transient(error: Exception) -> bool:
+    """True for errors a retry may fix: timeouts, dropped connections, 429/5xx."""
+    if isinstance(error, LLMTimeoutError):
+        return True
+    if isinstance(error, LLMUnavailableError):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return type(error).__name__ in TRANSIENT_ERRORS or getattr(error, 'code', None) in (429, 500, 502, 503, 504)
+
+
+class CircuitBreaker:
+    """Fails fast once the LLM keeps failing.
+
+    After failure_threshold consecutive transient failures the circuit opens
+    and calls are refused for reset_timeout seconds. Then one trial call is
+    let through (half-open): success closes the circuit, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """Raise LLMUnavailableError unless a call may go out now."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            waited = time.monotonic() - self._opened_at
+            if waited < self.reset_timeout:
+                raise LLMUnavailableError("LLM circuit open", retry_after=self.reset_timeout - waited)
+            if self._trial_in_flight:
+                raise LLMUnavailableError("LLM circuit half-open, trial call in flight")
+            self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            trial, self._trial_in_flight = self._trial_in_flight, False
+            if trial or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self.opened += 1
+                logger.error(f"LLM circuit opened after {self._failures} consecutive failures")
+
+    def cancel(self):
+        """Give back a half-open trial that was never sent."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {'state': self.state, 'consecutive_failures': self._failures, 'opened': self.opened}
+
+
+class LLMGateway:
+    """Deadlines, retries, a concurrency cap and a circuit breaker around an LLM provider.
+
+    Wraps anything with generate_content(prompt, stream=False) (a Gemini
+    GenerativeModel or FakeLLM) and exposes the same interface, so callers
+    are unchanged. Each attempt holds one of max_concurrency slots for as
+    long as the provider call actually runs; a request that cannot get a
+    slot within queue_timeout is refused rather than queued indefinitely.
+    Attempts run on a private thread pool and are abandoned after timeout
+    seconds; transient failures are retried with full-jitter exponential
+    backoff while the whole call stays within deadline. Streams retry only
+    until their first chunk, after which timeout bounds the gap between
+    chunks; a stream that breaks off counts as a failed call. A request the
+    provider rejects as bad is not retried and leaves the breaker as it was.
+    LLMUnavailableError is raised when the call cannot be served.
+    """
+
+    def __init__(self, provider, max_concurrency: int = 8, timeout: float = 20.0,
+                 deadline: float = 45.0, max_retries: int = 2, backoff: float = 0.5,
+                 backoff_max: float = 4.0, queue_timeout: float = 5.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.provider = provider
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.queue_timeout = queue_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm")
+        self._counter_lock = threading.Lock()
+        self._in_flight = 0
+        self._counters = {'calls': 0, 'retries': 0, 'timeouts': 0, 'failures': 0,
+                          'rejected': 0, 'short_circuited': 0}
+
+    def generate_content(self, prompt, stream: bool = False):
+        """Same contract as GenerativeModel.generate_content, within the gateway's limits."""
+        self._count('calls')
+        if stream:
+            return self._stream(prompt)
+        return self._with_retries(lambda deadline: self._attempt(
+            lambda: self.provider.generate_content(prompt), deadline
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            return {
+                **self._counters,
+                'in_flight': self._in_flight,
+                'max_concurrency': self.max_concurrency,
+                'circuit': self.breaker.stats()
+            }
+
+    def _with_retries(self, attempt: Callable[[float], Any], settle: bool = True):
+        """Run attempt(deadline) with retries; settle=False leaves recording its success to the caller."""
+        deadline = time.monotonic() + self.deadline
+        for retry in range(self.max_retries + 1):
+            try:
+                self.breaker.allow()
+            except LLMUnavailableError:
+                self._count('short_circuited')
+                raise
+            try:
+                result = attempt(deadline)
+                if settle:
+                    self.breaker.record_success()
+                return result
+            except LLMUnavailableError as e:
+                if not isinstance(e, LLMTimeoutError):
+                    self.breaker.cancel()  # no slot: nothing was sent
+                    raise
+                error = e
+            except Exception as e:
+                if not is_transient(e):
+                    self.breaker.cancel()  # a bad request says nothing about the service's health
+                    raise
+                error = e
+            self.breaker.record_failure()
+            pause = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** retry))
+            if retry == self.max_retries or time.monotonic() + pause >= deadline:
+                break
+            self._count('retries')
+            logger.info(f"Retrying LLM call in {pause:.2f}s after: {str(error)}")
+            time.sleep(pause)
+        self._count('failures')
+        logger.error(f"LLM call failed: {str(error)}")
+        if isinstance(error, LLMUnavailableError):
+            raise error
+        raise LLMUnavailableError(f"LLM call failed: {str(error)}") from error
+
+    def _attempt(self, fn: Callable[[], Any], deadline: float):
+        """Run fn in a slot, waiting at most timeout (and never past deadline)."""
+        self._acquire(deadline)
+        future = self._submit(fn)
+        future.add_done_callback(lambda _: self._release())
+        return self._wait(future, min(deadline, time.monotonic() + self.timeout))
+
+    def _stream(self, prompt) -> Iterator[Any]:
+        def open_stream():
+            iterator = iter(self.provider.generate_content(prompt, stream=True))
+            return iterator, next(iterator, _END)
+
+        def start(deadline):
+            # The slot stays held for the whole stream once the first chunk is in
+            self._acquire(deadline)
+            future = None
+            try:
+                future = self._submit(open_stream)
+                return self._wait(future, min(deadline, time.monotonic() + self.timeout))
+            except BaseException:
+                self._release_after(future)
+                raise
+
+        # The breaker hears how a stream went only once it has ended
+        iterator, chunk = self._with_retries(start, settle=False)
+        pending = None
+        try:
+            while chunk is not _END:
+                yield chunk
+                pending = self._submit(lambda: next(iterator, _END))
+                chunk = self._wait(pending, time.monotonic() + self.timeout)
+                pending = None
+            self.breaker.record_success()
+        except GeneratorExit:
+            self.breaker.cancel()  # the client went away
+            raise
+        except Exception as e:
+            # Too late to retry, but a stream that breaks off still counts against the service
+            self.breaker.record_failure()
+            self._count('failures')
+            logger.error(f"LLM stream failed: {str(e)}")
+            raise
+        finally:
+            self._release_after(pending)
+
+    def _submit(self, fn):
+        return self._executor.submit(fn)
+
+    def _wait(self, future, until: float):
+        try:
+            return future.result(timeout=max(0.0, until - time.monotonic()))
+        except FutureTimeoutError:
+            if not future.done():
+                self._count('timeouts')
+                raise LLMTimeoutError("LLM call timed out") from None
+            raise
+
+    def _acquire(self, deadline: float):
+        wait = max(0.0, min(self.queue_timeout, deadline - time.monotonic()))
+        if not self._slots.acquire(timeout=wait):
+            self._count('rejected')
+            raise LLMUnavailableError("LLM concurrency limit reached")
+        with self._counter_lock:
+            self._in_flight += 1
+
+    def _release(self):
+        with self._counter_lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _release_after(self, future):
+        """Free a slot now, or once the provider call still running on it finishes."""
+        if future is None or future.done():
+            self._release()
+        else:
+            future.add_done_callback(lambda _: self._release())
+
+    def _count(self, name: str):
+        with self._counter_lock:
+            self._counters[name] += 1
+
+
+def _create_gemini(config):
+    # Imported here so workers running another provider never load the SDK
+    import google.generativeai as genai
+
+    genai.configure(api_key=config.GOOGLE_API_KEY)
+    return genai.GenerativeModel(config.GEMINI_MODEL)
+
+
+def _create_fake(config):
+    from services.fake_llm import FakeLLM
+
+    return FakeLLM(
+        first_token_delay=config.FAKE_LLM_FIRST_TOKEN_DELAY,
+        chunk_delay=config.FAKE_LLM_CHUNK_DELAY,
+        failure_rate=config.FAKE_LLM_FAILURE_RATE
+    )
+
+
+_PROVIDERS: Dict[str, Callable[[Any], Any]] = {'gemini': _create_gemini, 'fake': _create_fake}
+
+
+def register_provider(name: str, factory: Callable[[Any], Any]):
+    """Make factory(config) available as LLM_PROVIDER=name."""
+    _PROVIDERS[name.lower()] = factory
+
+
+def create_llm_provider(config):
+    """Build the raw provider named by config.LLM_PROVIDER."""
+    factory = _PROVIDERS.get(config.LLM_PROVIDER)
+    if factory is None:
+        raise ValueError(f"Unknown LLM_PROVIDER {config.LLM_PROVIDER!r}; expected one of {sorted(_PROVIDERS)}")
+    return factory(config)
+
+
+def create_llm_gateway(config, provider=None) -> LLMGateway:
+    """Gateway around provider (default: the configured one) using the LLM_* settings."""
+    return LLMGateway(
+        provider if provider is not None else create_llm_provider(config),
+        max_concurrency=config.LLM_MAX_CONCURRENCY,
+        timeout=config.LLM_TIMEOUT,
+        deadline=config.LLM_DEADLINE,
+        max_retries=config.LLM_MAX_RETRIES,
+        backoff=config.LLM_RETRY_BACKOFF,
+        backoff_max=config.LLM_RETRY_BACKOFF_MAX,
+        queue_timeout=config.LLM_QUEUE_TIMEOUT,
+        breaker=CircuitBreaker(config.LLM_BREAKER_THRESHOLD, config.LLM_BREAKER_RESET)
+    )
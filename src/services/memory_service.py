@@ -1,124 +1,172 @@
 import json
+import os
+import threading
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-import chromadb
-from chromadb.utils import embedding_functions
+from typing import List, Dict, Any, Optional, Tuple
 
 from utils.config import Config
 from utils.logger import get_logger
+from utils.metrics import traced
+from services.write_behind import WriteBehindQueue
+from services.chroma_registry import get_registry
+from services.embedding_provider import get_embedding_provider
+from services.session_store import create_session_store
 
 logger = get_logger(__name__)
 
+HISTORY_FIELDS = ('seq', 'user_message', 'assistant_response', 'timestamp', 'context')
+DEFAULT_HISTORY_FIELDS = ('user_message', 'assistant_response', 'timestamp')
+# Written next to the Chroma data once chat_memory has been copied into the session store
+BACKFILL_MARKER = 'session_store_backfilled'
+
 class MemoryService:
     """Service for managing conversation memory and context."""
     
-    def __init__(self):
-        """Initialize the memory service."""
+    def __init__(self, registry=None, session_store=None):
+        """Initialize the memory service.
+        
+        The chat_memory collection (similarity search) comes from the shared
+        registry; turns and session records live in the configured
+        SessionStore unless one is passed in.
+        """
         self.config = Config()
-        self.chroma_client = chromadb.PersistentClient(path=self.config.CHROMA_DB_PATH)
-        self.memory_collection = self.chroma_client.get_or_create_collection(
-            "chat_memory",
-            metadata={"hnsw:space": "cosine"}
-        )
-        self.session_collection = self.chroma_client.get_or_create_collection(
-            "session_data",
-            metadata={"hnsw:space": "cosine"}
-        )
+        self.registry = registry or get_registry()
+        self.memory_collection = self.registry.get_collection("chat_memory")
+        self.store = session_store or create_session_store(self.config, self.registry)
+        # Serializes read-modify-write of session records (turn folding vs. running summary)
+        self._session_lock = threading.Lock()
+        self._backfill_session_store()
+        self.write_queue = None
+        if self.config.WRITE_BEHIND_ENABLED:
+            self.write_queue = WriteBehindQueue(
+                self._index_conversations,
+                max_size=self.config.WRITE_BEHIND_MAX_SIZE,
+                batch_size=self.config.WRITE_BEHIND_BATCH_SIZE,
+                flush_interval=self.config.WRITE_BEHIND_FLUSH_INTERVAL,
+                name="conversation-writer"
+            )
     
+    @traced("memory.store_conversation")
     def store_conversation(self, session_id: str, user_message: str, 
                           assistant_response: str, context: Dict[str, Any] = None):
-        """Store a conversation turn in memory."""
+        """Store a conversation turn in memory.
+        
+        The turn is appended to the session store right away, so recent
+        turns and history see it immediately. Embedding it for similarity
+        search is queued when write-behind is enabled (and done synchronously
+        if the queue is full).
+        """
         try:
-            # Create conversation record
-            conversation_id = f"{session_id}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S_%f')}"
+            turn = self._build_turn(session_id, user_message, assistant_response, context)
+            self.store.append_turns([turn])
+            
+            if self.write_queue is not None and self.write_queue.submit(turn):
+                return
             
-            conversation_data = {
+            self._index_conversations([turn])
+            
+        except Exception as e:
+            logger.error(f"Error storing conversation: {str(e)}")
+            raise
+    
+    @traced("memory.index_conversations")
+    def _index_conversations(self, turns: List[Dict[str, Any]]):
+        """Embed turns for similarity search with one add and one summary update per session."""
+        if not turns:
+            return
+        
+        # Store in memory collection
+        self.memory_collection.add(
+            ids=[turn['id'] for turn in turns],
+            documents=[f"{turn['user_message']}\n{turn['assistant_response']}" for turn in turns],
+            metadatas=[turn['metadata'] for turn in turns]
+        )
+        
+        # Update session summaries
+        self._update_session_summaries(turns)
+        
+        logger.info(f"Stored {len(turns)} conversation turns")
+    
+    def flush(self):
+        """Flush any queued conversation turns to the store."""
+        if self.write_queue is not None:
+            self.write_queue.flush()
+    
+    def write_queue_stats(self) -> Optional[Dict[str, int]]:
+        """Write-behind queue depth and counters, or None when disabled."""
+        if self.write_queue is None:
+            return None
+        return self.write_queue.stats()
+    
+    @staticmethod
+    def _build_turn(session_id: str, user_message: str, assistant_response: str,
+                    context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Create the record for one conversation turn."""
+        now = datetime.utcnow()
+        return {
+            'id': f"{session_id}_{now.strftime('%Y%m%d_%H%M%S_%f')}",
+            'session_id': session_id,
+            'user_message': user_message,
+            'assistant_response': assistant_response,
+            'metadata': {
                 'session_id': session_id,
                 'user_message': user_message,
                 'assistant_response': assistant_response,
-                'timestamp': datetime.utcnow().isoformat(),
+                'timestamp': now.isoformat(),
                 'context': json.dumps(context or {})
             }
-            
-            # Store in memory collection
-            self.memory_collection.add(
-                ids=[conversation_id],
-                documents=[f"{user_message}\n{assistant_response}"],
-                metadatas=[conversation_data]
-            )
-            
-            # Update session summary
-            self._update_session_summary(session_id, user_message, assistant_response)
-            
-            logger.info(f"Stored conversation for session {session_id}")
+        }
+    
+    @traced("memory.get_recent_conversations")
+    def get_recent_conversations(self, session_id: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Get the last limit turns of this session, oldest first."""
+        try:
+            return self.store.recent_turns(session_id, limit)
             
         except Exception as e:
-            logger.error(f"Error storing conversation: {str(e)}")
-            raise
+            logger.error(f"Error retrieving recent memory: {str(e)}")
+            return []
     
-    def retrieve_memory(self, session_id: str, query: str, limit: int = 5) -> str:
-        """Retrieve relevant memory for a session and query."""
+    @traced("memory.get_similar_conversations")
+    def get_similar_conversations(self, session_id: str, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Get semantically similar conversation metadata across all other sessions."""
         try:
-            # Get recent conversations for this session
-            recent_results = self.memory_collection.get(
-                where={"session_id": session_id},
-                limit=limit,
-                include=["metadatas", "documents"]
-            )
-            
-            # Get semantically similar conversations across all sessions
-            similar_results = self.memory_collection.query(
-                query_texts=[query],
+            results = self.memory_collection.query(
+                query_embeddings=[get_embedding_provider().embed_query(query).tolist()],
                 n_results=limit,
                 where={"session_id": {"$ne": session_id}}  # Exclude current session
             )
-            
-            # Combine and format results
-            memory_contexts = []
-            
-            # Add recent conversations
-            if recent_results.get('metadatas'):
-                for metadata in recent_results['metadatas']:
-                    memory_contexts.append(
-                        f"Previous conversation: {metadata.get('user_message', '')} "
-                        f"-> {metadata.get('assistant_response', '')}"
-                    )
-            
-            # Add similar conversations
-            if similar_results.get('metadatas') and len(similar_results['metadatas']) > 0:
-                for metadata in similar_results['metadatas'][0]:
-                    memory_contexts.append(
-                        f"Similar case: {metadata.get('user_message', '')} "
-                        f"-> {metadata.get('assistant_response', '')}"
-                    )
-            
-            return "\n".join(memory_contexts[:limit])
+            if results.get('metadatas') and len(results['metadatas']) > 0:
+                ids = (results.get('ids') or [[]])[0]
+                return [{**metadata, 'turn_id': turn_id}
+                        for turn_id, metadata in zip(ids, results['metadatas'][0])]
+            return []
             
         except Exception as e:
-            logger.error(f"Error retrieving memory: {str(e)}")
-            return ""
+            logger.error(f"Error retrieving similar memory: {str(e)}")
+            return []
     
-    def get_chat_history(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get chat history for a specific session."""
+    @traced("memory.get_chat_history")
+    def get_chat_history(self, session_id: str, limit: int = 50, before_seq: Optional[int] = None,
+                         fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get chat history for a session, most recent first.
+        
+        Pages are keyset-based: pass the smallest 'seq' of one page as
+        before_seq to get the next (older) page. fields picks from
+        HISTORY_FIELDS; by default the stored context is left out.
+        """
+        fields = list(fields or DEFAULT_HISTORY_FIELDS)
+        unknown = set(fields) - set(HISTORY_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown history fields: {', '.join(sorted(unknown))}")
+        
         try:
-            results = self.memory_collection.get(
-                where={"session_id": session_id},
-                limit=limit,
-                include=["metadatas"]
-            )
-            
             history = []
-            if results.get('metadatas'):
-                for metadata in results['metadatas']:
-                    history.append({
-                        'user_message': metadata.get('user_message', ''),
-                        'assistant_response': metadata.get('assistant_response', ''),
-                        'timestamp': metadata.get('timestamp', ''),
-                        'context': json.loads(metadata.get('context', '{}'))
-                    })
-            
-            # Sort by timestamp (most recent first)
-            history.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+            for row in self.store.turn_history(session_id, limit, before_seq=before_seq, fields=fields):
+                item = {'seq': row['seq']}
+                for field in fields:
+                    item[field] = json.loads(row[field] or '{}') if field == 'context' else row[field]
+                history.append(item)
             
             return history
             
@@ -126,40 +174,92 @@ class MemoryService:
             logger.error(f"Error getting chat history: {str(e)}")
             return []
     
+    @traced("memory.clear_chat_history")
     def clear_chat_history(self, session_id: str):
         """Clear chat history for a specific session."""
         try:
-            # Get all conversation IDs for this session
-            results = self.memory_collection.get(
-                where={"session_id": session_id},
-                include=["metadatas"]
-            )
-            
-            if results.get('ids'):
-                # Delete all conversations for this session
-                self.memory_collection.delete(ids=results['ids'])
-            
-            # Clear session data
-            self._clear_session_data(session_id)
-            
+            self.delete_sessions([session_id])
             logger.info(f"Cleared chat history for session {session_id}")
             
         except Exception as e:
             logger.error(f"Error clearing chat history: {str(e)}")
             raise
     
+    @traced("memory.delete_sessions")
+    def delete_sessions(self, session_ids: List[str]) -> Dict[str, int]:
+        """Delete the turns and session records of several sessions.
+        
+        One where-filtered delete on chat_memory and one batched delete in
+        the session store, however many sessions are passed.
+        """
+        session_ids = list(session_ids)
+        if not session_ids:
+            return {'sessions': 0, 'turns': 0}
+        
+        # Make sure no queued turns land after the delete
+        self.flush()
+        
+        self.memory_collection.delete(where=self._session_filter(session_ids))
+        with self._session_lock:
+            turns = self.store.delete_sessions(session_ids)
+        return {'sessions': len(session_ids), 'turns': turns}
+    
+    @staticmethod
+    def _session_filter(session_ids: List[str]) -> Dict[str, Any]:
+        """Chroma where clause matching any of session_ids.
+        
+        An $or of equalities rather than $in, which older Chroma servers reject;
+        $or needs at least two clauses, so a single id is a plain equality.
+        """
+        clauses = [{"session_id": session_id} for session_id in dict.fromkeys(session_ids)]
+        return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+    
+    def _backfill_session_store(self, page_size: int = 1000):
+        """One-time copy of turns that predate the session store out of the memory collection.
+        
+        Once it has run (or found nothing to copy) a marker file in
+        CHROMA_DB_PATH stops later starts from copying the collection again,
+        even into a store that starts out empty such as the in-memory one.
+        """
+        marker_path = os.path.join(self.config.CHROMA_DB_PATH, BACKFILL_MARKER)
+        if os.path.exists(marker_path):
+            return
+        try:
+            if not self.store.count_turns() and self.memory_collection.count():
+                self._copy_memory_to_session_store(page_size)
+            os.makedirs(self.config.CHROMA_DB_PATH, exist_ok=True)
+            with open(marker_path, "w", encoding="utf-8") as file:
+                file.write(datetime.utcnow().isoformat())
+            
+        except Exception as e:
+            logger.error(f"Error backfilling session store: {str(e)}")
+    
+    def _copy_memory_to_session_store(self, page_size: int):
+        """Copy every turn in chat_memory into the session store, oldest first."""
+        metadatas = []
+        offset = 0
+        while True:
+            page = self.memory_collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids = page.get('ids') or []
+            metadatas.extend(zip(ids, page.get('metadatas') or []))
+            if len(ids) < page_size:
+                break
+            offset += page_size
+        
+        metadatas.sort(key=lambda item: item[1].get('timestamp', ''))
+        self.store.append_turns([{
+            'id': turn_id,
+            'session_id': metadata.get('session_id', ''),
+            'user_message': metadata.get('user_message', ''),
+            'assistant_response': metadata.get('assistant_response', ''),
+            'metadata': {'timestamp': '', **metadata}
+        } for turn_id, metadata in metadatas])
+        logger.info(f"Backfilled {len(metadatas)} turns into the session store")
+    
     def get_session_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get summary information for a session."""
         try:
-            results = self.session_collection.get(
-                where={"session_id": session_id},
-                include=["metadatas"]
-            )
-            
-            if results.get('metadatas') and len(results['metadatas']) > 0:
-                return results['metadatas'][0]
-            
-            return None
+            return self.store.get_sessions([session_id]).get(session_id)
             
         except Exception as e:
             logger.error(f"Error getting session summary: {str(e)}")
@@ -168,97 +268,99 @@ class MemoryService:
     def clear_session(self, session_id: str):
         """Clear all data for a session."""
         try:
-            self.clear_chat_history(session_id)
-            self._clear_session_data(session_id)
+            self.delete_sessions([session_id])
             logger.info(f"Cleared all data for session {session_id}")
         except Exception as e:
             logger.error(f"Error clearing session: {str(e)}")
             raise
     
-    def _update_session_summary(self, session_id: str, user_message: str, assistant_response: str):
-        """Update session summary with new conversation."""
+    def _update_session_summaries(self, turns: List[Dict[str, Any]]):
+        """Fold a batch of turns into their session summaries (one write for all sessions)."""
         try:
-            # Get existing summary
-            existing = self.get_session_summary(session_id)
-            
-            if existing:
-                # Update existing summary
-                message_count = existing.get('message_count', 0) + 1
-                last_activity = datetime.utcnow().isoformat()
-                
-                # Keep track of conversation topics
-                topics = existing.get('topics', [])
-                if len(user_message.split()) > 2:  # Simple topic extraction
-                    topics.append(user_message[:50])
-                
-                summary_data = {
-                    'session_id': session_id,
-                    'message_count': message_count,
-                    'last_activity': last_activity,
-                    'created_at': existing.get('created_at', last_activity),
-                    'topics': topics[-10:],  # Keep last 10 topics
-                    'last_user_message': user_message[:100],
-                    'last_assistant_response': assistant_response[:100]
-                }
-                
-                # Update the summary
-                self.session_collection.update(
-                    ids=[session_id],
-                    metadatas=[summary_data]
-                )
-            else:
-                # Create new summary
-                summary_data = {
-                    'session_id': session_id,
-                    'message_count': 1,
-                    'last_activity': datetime.utcnow().isoformat(),
-                    'created_at': datetime.utcnow().isoformat(),
-                    'topics': [user_message[:50]] if len(user_message.split()) > 2 else [],
-                    'last_user_message': user_message[:100],
-                    'last_assistant_response': assistant_response[:100]
-                }
-                
-                self.session_collection.add(
-                    ids=[session_id],
-                    embeddings=[[0] * 384],  # Placeholder embedding
-                    metadatas=[summary_data]
-                )
-                
+            with self._session_lock:
+                self._fold_into_session_records(turns)
         except Exception as e:
             logger.error(f"Error updating session summary: {str(e)}")
     
-    def _clear_session_data(self, session_id: str):
-        """Clear session summary data."""
+    def _fold_into_session_records(self, turns: List[Dict[str, Any]]):
+        turns_by_session = {}
+        for turn in turns:
+            turns_by_session.setdefault(turn['session_id'], []).append(turn)
+        
+        existing = self.store.get_sessions(list(turns_by_session))
+        
+        summaries = {}
+        for session_id, session_turns in turns_by_session.items():
+            summary = existing.get(session_id)
+            for turn in session_turns:
+                summary = self._fold_turn(summary, session_id, turn)
+            summaries[session_id] = summary
+        
+        self.store.put_sessions(summaries)
+    
+    @traced("memory.get_conversation_summary")
+    def get_conversation_summary(self, session_id: str) -> Tuple[str, int]:
+        """Running summary of a session's older turns and the seq of the last turn it covers."""
         try:
-            results = self.session_collection.get(
-                where={"session_id": session_id},
-                include=["metadatas"]
-            )
+            record = self.store.get_sessions([session_id]).get(session_id)
+            if record:
+                return record.get('conversation_summary', ''), int(record.get('summary_seq', 0))
+            return '', 0
             
-            if results.get('ids'):
-                self.session_collection.delete(ids=results['ids'])
-                
         except Exception as e:
-            logger.error(f"Error clearing session data: {str(e)}")
+            logger.error(f"Error getting conversation summary: {str(e)}")
+            return '', 0
+    
+    @traced("memory.save_conversation_summary")
+    def save_conversation_summary(self, session_id: str, summary: str, summary_seq: int):
+        """Store the running summary with the session record."""
+        with self._session_lock:
+            record = self.store.get_sessions([session_id]).get(session_id) or {'session_id': session_id}
+            record['conversation_summary'] = summary
+            record['summary_seq'] = summary_seq
+            self.store.put_sessions({session_id: record})
+    
+    @staticmethod
+    def _fold_turn(existing: Optional[Dict[str, Any]], session_id: str,
+                   turn: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the session summary updated with one conversation turn."""
+        user_message = turn['user_message']
+        assistant_response = turn['assistant_response']
+        last_activity = turn['metadata']['timestamp']
+        existing = existing or {}
+        
+        # Keep track of conversation topics
+        topics = list(existing.get('topics', []))
+        if len(user_message.split()) > 2:  # Simple topic extraction
+            topics.append(user_message[:50])
+        
+        return {
+            **existing,
+            'session_id': session_id,
+            'message_count': existing.get('message_count', 0) + 1,
+            'last_activity': last_activity,
+            'created_at': existing.get('created_at', last_activity),
+            'topics': topics[-10:],  # Keep last 10 topics
+            'last_user_message': user_message[:100],
+            'last_assistant_response': assistant_response[:100]
+        }
     
-    def cleanup_old_sessions(self, days: int = 30):
-        """Clean up sessions older than specified days."""
+    def cleanup_old_sessions(self, days: int = 30, batch_size: int = 100) -> Dict[str, int]:
+        """Delete sessions with no activity in the last days, batch_size sessions per delete."""
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=days)
+            expired = self.store.expired_sessions(cutoff_date.isoformat())
             
-            # Get old sessions
-            results = self.session_collection.get(
-                where={"last_activity": {"$lt": cutoff_date.isoformat()}},
-                include=["metadatas"]
-            )
+            totals = {'sessions': 0, 'turns': 0}
+            for start in range(0, len(expired), batch_size):
+                deleted = self.delete_sessions(expired[start:start + batch_size])
+                totals['sessions'] += deleted['sessions']
+                totals['turns'] += deleted['turns']
             
-            if results.get('metadatas'):
-                old_session_ids = [metadata['session_id'] for metadata in results['metadatas']]
-                
-                for session_id in old_session_ids:
-                    self.clear_session(session_id)
-                
-                logger.info(f"Cleaned up {len(old_session_ids)} old sessions")
+            if expired:
+                logger.info(f"Cleaned up {totals['sessions']} old sessions ({totals['turns']} turns)")
+            return totals
                 
         except Exception as e:
             logger.error(f"Error cleaning up old sessions: {str(e)}")
+            raise
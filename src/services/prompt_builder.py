@@ -0,0 +1,146 @@
+import re
+from typing import Any, Callable, Dict, List
+
+_WORD = re.compile(r"\w+")
+
+# Gemini's SentencePiece tokenizer averages roughly four characters per token on English prose
+CHARS_PER_TOKEN = 4
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count, cheap enough to run on every candidate passage."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, at a word boundary, marking the cut."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max_tokens * CHARS_PER_TOKEN]
+    space = cut.rfind(" ")
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut.rstrip() + " ..."
+
+
+def shingles(text: str, size: int = 3) -> frozenset:
+    """Set of word n-grams used for near-duplicate detection."""
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return frozenset([tuple(words)]) if words else frozenset()
+    return frozenset(tuple(words[i:i + size]) for i in range(len(words) - size + 1))
+
+
+def is_near_duplicate(candidate: frozenset, accepted: List[frozenset], threshold: float) -> bool:
+    """True when most of the smaller text's shingles also occur in an accepted text."""
+    for other in accepted:
+        smaller = min(len(candidate), len(other))
+        if smaller and len(candidate & other) / smaller >= threshold:
+            return True
+    return False
+
+
+class PromptBuild:
+    """A rendered prompt plus what went into it."""
+
+    __slots__ = ("prompt", "case_chunks", "memory_turn_ids", "breakdown")
+
+    def __init__(self, prompt: str, case_chunks: List[Dict[str, Any]], memory_turn_ids: List[str],
+                 breakdown: Dict[str, int]):
+        self.prompt = prompt
+        self.case_chunks = case_chunks
+        self.memory_turn_ids = memory_turn_ids
+        self.breakdown = breakdown
+
+
+class PromptBuilder:
+    """Fills the prompt template's context sections up to a token budget.
+
+    The query, session context and template text are always included, then
+    the session's running summary (if any) as the first memory line. The
+    rest of the budget goes to memory turns and case chunks, taken
+    round-robin from case chunks (retrieval rank), this session's recent
+    turns (newest first) and similar turns from other sessions, so every
+    section gets its most relevant items first. Items that would overflow
+    the budget are skipped, near-duplicates of an item already in the same
+    section are dropped, and previous assistant responses are truncated to
+    response_tokens.
+    """
+
+    def __init__(self, render: Callable[..., str], budget: int = 2048, response_tokens: int = 150,
+                 dedup_threshold: float = 0.8):
+        self.render = render
+        self.budget = budget
+        self.response_tokens = response_tokens
+        self.dedup_threshold = dedup_threshold
+
+    def build(self, query: str, session_context: str, recent: List[Dict[str, Any]],
+              similar: List[Dict[str, Any]], case_chunks: List[Dict[str, Any]],
+              summary: str = "") -> PromptBuild:
+        fixed = count_tokens(self.render(query=query, memory_context="", case_context="",
+                                         session_context=session_context))
+        remaining = self.budget - fixed
+
+        summary_line = ""
+        if summary and remaining > 16:
+            summary_line = truncate_tokens(f"Conversation so far: {summary}", remaining - 1)
+            remaining -= count_tokens(summary_line) + 1
+
+        queues = [
+            [('case_context', chunk['text'], chunk) for chunk in case_chunks],
+            [('memory', self._format_turn("Previous conversation", turn), turn) for turn in reversed(recent)],
+            [('memory', self._format_turn("Similar case", turn), turn) for turn in similar],
+        ]
+        texts = {}  # id(item) -> rendered text, for accepted items
+        seen = {'case_context': [], 'memory': []}
+        used = {'case_context': 0, 'memory': 0}
+        dropped = deduplicated = 0
+
+        while any(queues):
+            for queue in queues:
+                if not queue:
+                    continue
+                section, text, item = queue.pop(0)
+                fingerprint = shingles(text)
+                if is_near_duplicate(fingerprint, seen[section], self.dedup_threshold):
+                    deduplicated += 1
+                    continue
+                cost = count_tokens(text) + 1  # joining newline
+                if cost > remaining:
+                    dropped += 1
+                    continue
+                remaining -= cost
+                used[section] += cost
+                seen[section].append(fingerprint)
+                texts[id(item)] = text
+
+        # Memory reads oldest to newest, then other sessions; case chunks keep their rank
+        memory_used = [turn for turn in list(recent) + list(similar) if id(turn) in texts]
+        memory_context = "\n".join(([summary_line] if summary_line else [])
+                                   + [texts[id(turn)] for turn in memory_used])
+        case_used = [chunk for chunk in case_chunks if id(chunk) in texts]
+
+        prompt = self.render(query=query, memory_context=memory_context,
+                             case_context="\n".join(chunk['text'] for chunk in case_used),
+                             session_context=session_context)
+        template_tokens = count_tokens(self.render(query="", memory_context="", case_context="",
+                                                   session_context=""))
+        query_tokens = count_tokens(query)
+        breakdown = {
+            'template': template_tokens,
+            'query': query_tokens,
+            'session_context': max(0, fixed - template_tokens - query_tokens),
+            'summary': count_tokens(summary_line) + 1 if summary_line else 0,
+            'memory': used['memory'],
+            'case_context': used['case_context'],
+            'total': count_tokens(prompt),
+            'budget': self.budget,
+            'dropped': dropped,
+            'deduplicated': deduplicated
+        }
+        memory_turn_ids = [turn['turn_id'] for turn in memory_used if turn.get('turn_id')]
+        return PromptBuild(prompt, case_used, memory_turn_ids, breakdown)
+
+    def _format_turn(self, label: str, turn: Dict[str, Any]) -> str:
+        response = truncate_tokens(turn.get('assistant_response', ''), self.response_tokens)
+        return f"{label}: {turn.get('user_message', '')} -> {response}"
@@ -0,0 +1,95 @@
+import os
+import string
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_formatter = string.Formatter()
+
+
+def compile_template(text: str, variables: Iterable[str]) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Split a {name}-style template into literal runs and the fields between them.
+
+    Returns (literals, fields) with len(literals) == len(fields) + 1. Doubled
+    braces are literal braces; fields must be plain names from variables.
+    """
+    variables = set(variables)
+    literals: List[str] = [""]
+    fields: List[str] = []
+    for literal, field, spec, conversion in _formatter.parse(text):
+        literals[-1] += literal
+        if field is None:
+            continue
+        if field not in variables:
+            raise ValueError(f"Unknown template variable {{{field}}}; expected one of {sorted(variables)}")
+        if spec or conversion:
+            raise ValueError(f"Format specs are not supported in template variable {{{field}}}")
+        fields.append(field)
+        literals.append("")
+    return tuple(literals), tuple(fields)
+
+
+class PromptTemplate:
+    """A prompt template file compiled once and re-read when it changes.
+
+    The file is parsed into literal runs and field names up front, so
+    format() is a single join rather than a re-parse per request. Every
+    reload_interval seconds format() checks the file's mtime and size and
+    recompiles it if either changed; an edit that fails to compile is logged
+    and the previous template stays in use. Variables not used by the
+    template are ignored, as with str.format.
+    """
+
+    def __init__(self, path: str, variables: Iterable[str], reload_interval: Optional[float] = 2.0):
+        self.path = os.path.abspath(path)
+        self.variables = tuple(variables)
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._compiled = None
+        self._next_check = 0.0
+        self._load()
+
+    def format(self, **values) -> str:
+        if self.reload_interval is not None and time.monotonic() >= self._next_check:
+            self._maybe_reload()
+        literals, fields = self._compiled
+        parts = [literals[0]]
+        for field, literal in zip(fields, literals[1:]):
+            parts.append(str(values[field]))
+            parts.append(literal)
+        return "".join(parts)
+
+    def _stat(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        signature = self._stat()
+        with open(self.path, "r", encoding="utf-8") as file:
+            compiled = compile_template(file.read(), self.variables)
+        self._compiled = compiled
+        self._signature = signature
+        self._next_check = time.monotonic() + (self.reload_interval or 0)
+
+    def _maybe_reload(self):
+        if not self._lock.acquire(blocking=False):
+            return  # another thread is already checking
+        try:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self.reload_interval
+            try:
+                signature = self._stat()
+                if signature != self._signature:
+                    self._signature = signature  # a broken edit is reported once, not on every check
+                    self._load()
+                    logger.info(f"Reloaded prompt template {self.path}")
+            except Exception as e:
+                logger.error(f"Error reloading prompt template {self.path}: {str(e)}")
+        finally:
+            self._lock.release()
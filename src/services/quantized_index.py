@@ -0,0 +1,259 @@
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MAGIC = b"SHQIDX\x00\x01"
+# magic, then the byte offset of the JSON trailer
+HEADER = struct.Struct("<8sQ")
+ALIGNMENT = 64
+DTYPES = {'int8': np.int8, 'float16': np.float16}
+# Rows scored per matrix product, bounding the float32 scratch space of a scan
+BLOCK_ROWS = 4096
+
+
+class QuantizedCaseIndex:
+    """Read-only case index in a single memory-mapped file.
+
+    Chunk vectors are stored as int8 (or float16) rows next to one float32
+    per row that rescales a dot product with the row to its cosine, followed
+    by the chunk texts as one UTF-8 blob; ids and the remaining metadata sit
+    in a JSON trailer. The file is mapped read-only, so every worker process
+    serving it shares the same page-cache pages instead of holding its own
+    copy of HNSW graph, SQLite cache and float32 vectors.
+
+    Queries are an exact scan: each block of BLOCK_ROWS rows is widened to
+    float32 and multiplied with all query vectors at once. Exposes the part
+    of the Chroma collection interface that retrieval, the BM25 builder and
+    the API use (query, get, count, name, metadata), with distances in
+    cosine space. Writes raise; rebuild the file with ingest.py instead.
+
+    Pass the model_id of the embedding provider that will embed queries as
+    embedding_model; a file built with a different model is refused, since
+    its vectors live in another space.
+    """
+
+    name = "case_data"
+
+    def __init__(self, path: str, embedding_model: Optional[str] = None):
+        self.path = path
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, trailer_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a quantized case index")
+        info = json.loads(self._map[trailer_offset:].decode("utf-8"))
+
+        self.dtype = info['dtype']
+        self.dim = info['dim']
+        self.embedding_model = info.get('embedding_model')
+        if embedding_model and self.embedding_model != embedding_model:
+            self._map.close()
+            raise ValueError(f"{path} was built with embedding model {self.embedding_model!r}, "
+                             f"but queries are embedded with {embedding_model!r}; rebuild it with ingest.py")
+        self.ids: List[str] = info['ids']
+        self._metadatas: List[Dict[str, Any]] = info['metadatas']
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self.ids)}
+        self._field_rows: Dict[str, Dict[Any, np.ndarray]] = {}
+        count = len(self.ids)
+
+        def section(name, dtype, shape):
+            offset = info['sections'][name]
+            return np.frombuffer(self._map, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+
+        self._vectors = section('vectors', DTYPES[self.dtype], (count, self.dim))
+        self._scales = section('scales', np.float32, (count,))
+        self._text_offsets = section('text_offsets', np.uint64, (count + 1,))
+        self._texts_start = info['sections']['texts']
+        self.metadata = {"hnsw:space": "cosine", "dtype": self.dtype}
+        logger.info(f"Opened quantized case index {path}: {count} chunks, {self.dtype}, dim {self.dim}")
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def query(self, query_embeddings, n_results: int = 10, where=None, include=None, **kwargs):
+        """Top n_results rows per query embedding, shaped like Chroma's query result."""
+        include = include if include is not None else ["metadatas", "distances"]
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        rows = self._where_rows(where)
+        result = {'ids': [], 'distances': [], 'metadatas': [], 'embeddings': []}
+        if rows is not None and not len(rows):
+            similarity = np.zeros((len(queries), 0), dtype=np.float32)
+        else:
+            similarity = self._similarity(queries, rows)
+        k = min(n_results, similarity.shape[1])
+        for scores in similarity:
+            top = np.argpartition(-scores, k - 1)[:k] if k else np.zeros(0, dtype=np.int64)
+            top = top[np.argsort(-scores[top], kind="stable")]
+            found = top if rows is None else rows[top]
+            result['ids'].append([self.ids[row] for row in found])
+            result['distances'].append((1.0 - scores[top]).tolist())
+            result['metadatas'].append([self._metadata(row) for row in found])
+            result['embeddings'].append(self._dequantize(found).tolist() if "embeddings" in include else None)
+        return self._select(result, include)
+
+    def get(self, ids=None, where=None, limit: Optional[int] = None, offset: Optional[int] = None,
+            include=None, **kwargs):
+        """Rows by id and/or metadata filter, shaped like Chroma's get result."""
+        include = include if include is not None else ["metadatas"]
+        if ids is not None:
+            rows = np.asarray([self._rows[chunk_id] for chunk_id in ids if chunk_id in self._rows], dtype=np.int64)
+            if where:
+                rows = rows[np.isin(rows, self._where_rows(where))]
+        else:
+            rows = self._where_rows(where)
+            if rows is None:
+                rows = np.arange(len(self.ids))
+        start = offset or 0
+        rows = rows[start:None if limit is None else start + limit]
+        return self._select({
+            'ids': [self.ids[row] for row in rows],
+            'metadatas': [self._metadata(row) for row in rows],
+            'embeddings': self._dequantize(rows).tolist() if "embeddings" in include else None
+        }, include)
+
+    def _read_only(self, *args, **kwargs):
+        raise RuntimeError(f"Quantized case index {self.path} is read-only; rebuild it with ingest.py")
+
+    add = update = upsert = delete = _read_only
+
+    def _similarity(self, queries: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Cosine similarity of each query to every (selected) row."""
+        total = len(self.ids) if rows is None else len(rows)
+        similarity = np.empty((len(queries), total), dtype=np.float32)
+        for start in range(0, total, BLOCK_ROWS):
+            end = min(total, start + BLOCK_ROWS)
+            selected = slice(start, end) if rows is None else rows[start:end]
+            block = self._vectors[selected].astype(np.float32)
+            similarity[:, start:end] = (queries @ block.T) * self._scales[selected]
+        return similarity
+
+    def _dequantize(self, rows) -> np.ndarray:
+        return self._vectors[rows].astype(np.float32) * self._scales[rows][:, None]
+
+    def _metadata(self, row: int) -> Dict[str, Any]:
+        start, end = self._text_offsets[row], self._text_offsets[row + 1]
+        text = self._map[self._texts_start + int(start):self._texts_start + int(end)].decode("utf-8")
+        return {**self._metadatas[row], "text": text}
+
+    def _where_rows(self, where) -> Optional[np.ndarray]:
+        """Sorted rows matching a Chroma where filter ($eq, $in, $and, $or), or None for all."""
+        if not where:
+            return None
+        if "$and" in where:
+            rows = None
+            for clause in where["$and"]:
+                matched = self._where_rows(clause)
+                rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+            return rows
+        if "$or" in where:
+            matched = [self._where_rows(clause) for clause in where["$or"]]
+            if any(rows is None for rows in matched):
+                return None
+            return np.unique(np.concatenate(matched or [np.zeros(0, dtype=np.int64)]))
+        rows = None
+        for field, condition in where.items():
+            if isinstance(condition, dict):
+                (operator, value), = condition.items()
+                if operator not in ("$eq", "$in"):
+                    raise ValueError(f"Unsupported where operator {operator} on the quantized case index")
+                values = value if operator == "$in" else [value]
+            else:
+                values = [condition]
+            index = self._field_index(field)
+            matched = np.unique(np.concatenate(
+                [index.get(value, np.zeros(0, dtype=np.int64)) for value in values] or [np.zeros(0, dtype=np.int64)]
+            ))
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+        return rows
+
+    def _field_index(self, field: str) -> Dict[Any, np.ndarray]:
+        """value -> rows for one metadata field, built on first use."""
+        index = self._field_rows.get(field)
+        if index is None:
+            grouped = {}
+            for row, metadata in enumerate(self._metadatas):
+                if field in metadata:
+                    grouped.setdefault(metadata[field], []).append(row)
+            index = {value: np.asarray(rows, dtype=np.int64) for value, rows in grouped.items()}
+            self._field_rows[field] = index
+        return index
+
+    @staticmethod
+    def _select(result: Dict[str, Any], include) -> Dict[str, Any]:
+        return {key: value if key == 'ids' or key in include else None for key, value in result.items()}
+
+
+def quantize(vectors: np.ndarray, dtype: str = "int8"):
+    """(stored rows, per-row scales) such that scale * (q . row) is the cosine of q and the row."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == "int8":
+        peak = np.abs(vectors).max(axis=1, keepdims=True, initial=0.0)
+        peak[peak == 0] = 1.0
+        stored = np.rint(vectors * (127.0 / peak)).astype(np.int8)
+    elif dtype == "float16":
+        stored = vectors.astype(np.float16)
+    else:
+        raise ValueError(f"Unknown quantized index dtype {dtype!r}; expected one of {sorted(DTYPES)}")
+    norms = np.linalg.norm(stored.astype(np.float32), axis=1)
+    norms[norms == 0] = 1.0
+    return stored, (1.0 / norms).astype(np.float32)
+
+
+def build_quantized_index(collection, path: str, dtype: str = "int8", embedding_model: Optional[str] = None,
+                          page_size: int = 5000) -> int:
+    """Write every chunk of a case collection to a quantized index file; returns the chunk count.
+
+    The file is written next to path and renamed into place, so processes
+    still mapping the previous version keep reading it undisturbed.
+    """
+    ids, metadatas, texts, vectors = [], [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=["metadatas", "embeddings"], limit=page_size, offset=offset)
+        page_ids = page.get('ids') or []
+        for metadata in page.get('metadatas') or []:
+            metadata = dict(metadata or {})
+            texts.append(metadata.pop('text', '').encode("utf-8"))
+            metadatas.append(metadata)
+        ids.extend(page_ids)
+        if page_ids:
+            vectors.append(np.asarray(page['embeddings'], dtype=np.float32))
+        if len(page_ids) < page_size:
+            break
+        offset += page_size
+
+    dim = vectors[0].shape[1] if vectors else 0
+    stored, scales = quantize(np.vstack(vectors) if vectors else np.zeros((0, dim)), dtype)
+    text_offsets = np.zeros(len(texts) + 1, dtype=np.uint64)
+    text_offsets[1:] = np.cumsum([len(text) for text in texts], dtype=np.uint64)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    sections = {}
+    with open(tmp_path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, 0))
+        for name, data in (('vectors', stored.tobytes()), ('scales', scales.tobytes()),
+                           ('text_offsets', text_offsets.tobytes()), ('texts', b"".join(texts))):
+            file.write(b"\0" * (-file.tell() % ALIGNMENT))
+            sections[name] = file.tell()
+            file.write(data)
+        trailer_offset = file.tell()
+        file.write(json.dumps({
+            'dtype': dtype, 'dim': dim, 'embedding_model': embedding_model,
+            'sections': sections, 'ids': ids, 'metadatas': metadatas
+        }).encode("utf-8"))
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, trailer_offset))
+    os.replace(tmp_path, path)
+    logger.info(f"Built {dtype} quantized case index over {len(ids)} chunks at {path}")
+    return len(ids)
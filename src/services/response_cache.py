@@ -0,0 +1,142 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_PUNCTUATION = re.compile(r"[^\w\s']")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Case-, whitespace- and punctuation-insensitive form of a question."""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", text.lower())).strip()
+
+
+class ResponseCache:
+    """Two-tier cache of LLM responses keyed by question.
+
+    The exact tier is a dict lookup on the normalized question. The semantic
+    tier compares the question's embedding against every cached question in
+    the same partition (one matrix-vector product) and hits when cosine
+    similarity reaches threshold. Entries expire after ttl seconds (expired
+    ones are dropped before a semantic lookup or an eviction) and the least
+    recently used entry is evicted beyond max_entries. Partitions keep
+    answers produced under different prompt conditions apart.
+    """
+
+    def __init__(self, provider, threshold: float = 0.95, ttl: float = 3600,
+                 max_entries: int = 2000):
+        self.provider = provider
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (partition, normalized) -> entry
+        self._vectors = None           # (max_entries, dim), rows addressed by slot
+        self._slot_partition = np.full(self.max_entries, -1, dtype=np.int64)
+        self._slot_expires = np.zeros(self.max_entries, dtype=np.float64)
+        self._slot_keys = [None] * self.max_entries
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+        self._partition_ids: Dict[str, int] = {}
+        self._counters = {'exact_hits': 0, 'semantic_hits': 0, 'misses': 0,
+                          'evictions': 0, 'expirations': 0}
+
+    def get(self, query: str, partition: str = "global") -> Optional[str]:
+        """Return a cached response for query, or None."""
+        key = (partition, normalize_query(query))
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._alive(key, entry, now):
+                self._entries.move_to_end(key)
+                self._counters['exact_hits'] += 1
+                return entry['response']
+
+            partition_id = self._partition_ids.get(partition)
+            if self._vectors is None or partition_id is None:
+                self._counters['misses'] += 1
+                return None
+
+        vector = self.provider.embed_query(query)
+
+        with self._lock:
+            # Expired entries are dropped first, so the best match is always a live one
+            self._purge_expired(now)
+            slots = np.flatnonzero(self._slot_partition == partition_id)
+            if len(slots):
+                similarities = self._vectors[slots] @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    hit_key = self._slot_keys[slots[best]]
+                    self._entries.move_to_end(hit_key)
+                    self._counters['semantic_hits'] += 1
+                    return self._entries[hit_key]['response']
+            self._counters['misses'] += 1
+            return None
+
+    def put(self, query: str, response: str, partition: str = "global"):
+        """Cache response for query within partition."""
+        key = (partition, normalize_query(query))
+        vector = self.provider.embed_query(query)
+
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+
+            entry = self._entries.get(key)
+            if entry is None:
+                if not self._free_slots:
+                    self._purge_expired(time.monotonic())
+                if not self._free_slots:
+                    self._evict(next(iter(self._entries)))
+                    self._counters['evictions'] += 1
+                entry = {'slot': self._free_slots.pop()}
+                self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+            slot = entry['slot']
+            entry['response'] = response
+            entry['expires_at'] = time.monotonic() + self.ttl
+            self._slot_expires[slot] = entry['expires_at']
+            self._vectors[slot] = vector
+            self._slot_partition[slot] = self._partition_ids.setdefault(partition, len(self._partition_ids))
+            self._slot_keys[slot] = key
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._evict(key)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            return {**self._counters, 'entries': len(self._entries), 'capacity': self.max_entries}
+
+    def _alive(self, key, entry, now) -> bool:
+        if entry['expires_at'] > now:
+            return True
+        self._evict(key)
+        self._counters['expirations'] += 1
+        return False
+
+    def _purge_expired(self, now):
+        """Evict every expired entry (one vectorized scan of the slot expiry times)."""
+        for slot in np.flatnonzero((self._slot_partition >= 0) & (self._slot_expires <= now)):
+            self._evict(self._slot_keys[slot])
+            self._counters['expirations'] += 1
+
+    def _evict(self, key):
+        entry = self._entries.pop(key)
+        slot = entry['slot']
+        self._slot_partition[slot] = -1
+        self._slot_keys[slot] = None
+        self._free_slots.append(slot)
@@ -0,0 +1,104 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from utils.config import Config
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@contextmanager
+def _try_lock(lock_path: str):
+    """Yield True if this process got the retention lock, False if another holds it."""
+    if fcntl is None:
+        yield True
+        return
+    directory = os.path.dirname(lock_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(lock_path, "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class RetentionJob:
+    """Periodically deletes sessions idle for longer than ttl_days.
+
+    Every interval seconds one worker process (guarded by a non-blocking file
+    lock) removes expired sessions from chat_memory and the session store
+    in batches of batch_size sessions. The store is compacted only once at
+    least compact_free_ratio of it is free space, since compaction holds off
+    appends while it runs.
+    The last run's counts and rows/sec are kept for /health.
+    """
+
+    def __init__(self, memory_service, ttl_days: int = 30, interval: float = 3600,
+                 batch_size: int = 100, compact_free_ratio: float = 0.25, lock_path: Optional[str] = None):
+        self.memory_service = memory_service
+        self.ttl_days = ttl_days
+        self.interval = interval
+        self.batch_size = batch_size
+        self.compact_free_ratio = compact_free_ratio
+        self.lock_path = lock_path or os.path.join(Config.CHROMA_DB_PATH, "retention.lock")
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Run the job in a daemon thread every interval seconds."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="session-retention", daemon=True)
+        self._thread.start()
+        logger.info(f"Session retention every {self.interval}s, expiring after {self.ttl_days} days")
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """Expire old sessions now; returns the run's stats, or None if another process is running it."""
+        with _try_lock(self.lock_path) as acquired:
+            if not acquired:
+                return None
+            start = time.perf_counter()
+            deleted = self.memory_service.cleanup_old_sessions(self.ttl_days, batch_size=self.batch_size)
+            delete_seconds = time.perf_counter() - start
+            compacted = bool(deleted['sessions']) and self.memory_service.store.compact(self.compact_free_ratio)
+            seconds = time.perf_counter() - start
+
+            rows = deleted['turns'] * 2 + deleted['sessions']  # turns + memory vectors, session records
+            self.last_run = {
+                **deleted,
+                'rows': rows,
+                'seconds': round(seconds, 3),
+                'rows_per_sec': round(rows / delete_seconds, 1) if delete_seconds > 0 else 0.0,
+                'compacted': compacted,
+                'finished_at': time.time()
+            }
+            logger.info(f"Session retention run: {self.last_run}")
+            return self.last_run
+
+    def stats(self) -> Dict[str, Any]:
+        return {'ttl_days': self.ttl_days, 'interval': self.interval, 'last_run': self.last_run}
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Error running session retention: {str(e)}")
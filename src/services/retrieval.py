@@ -1,9 +1,198 @@
-def retrieve_documents(collection, query, k=5):
-    """Retrieves relevant excerpts from ChromaDB."""
+import json
+
+import numpy as np
+
+from services.embedding_provider import get_embedding_provider, normalize_query_text
+from utils.config import Config
+from utils.lru_cache import LRUCache
+
+# Top-k results per (collection, query, k, options); cleared whenever ingestion changes the index
+_result_cache = LRUCache(max_size=Config.RETRIEVAL_CACHE_SIZE, ttl=Config.RETRIEVAL_CACHE_TTL)
+
+
+def invalidate_retrieval_cache():
+    """Drops cached retrieval results, e.g. after ingestion added or removed chunks."""
+    _result_cache.clear()
+
+
+def retrieval_cache_stats():
+    return _result_cache.stats()
+
+
+def retrieve_documents(collection, query, k=5, keyword_index=None, **options):
+    """Retrieves relevant excerpts from ChromaDB as a list of texts.
+
+    With a keyword_index (BM25), vector and keyword rankings are merged with
+    reciprocal rank fusion so exact names like "Irene Adler" are not missed.
+    options are those of retrieve_documents_batch.
+    """
+    return [chunk["text"] for chunk in retrieve_chunks(collection, query, k, keyword_index, **options)]
+
+
+def retrieve_chunks(collection, query, k=5, keyword_index=None, **options):
+    """Like retrieve_documents, but returns scored hits (see retrieve_documents_batch).
+
+    Results are cached briefly per normalized query.
+    """
+    return retrieve_documents_batch(collection, [query], k, keyword_index, **options)[0]
+
+
+def retrieve_documents_batch(collection, queries, k=5, keyword_index=None, where=None,
+                             max_distance=None, mmr_lambda=None, candidates=None):
+    """Retrieves excerpts for many queries in one round trip.
+
+    Returns one list of hits per query, in order. Each hit is a dict with the
+    chunk's id, text, filename and story, its cosine distance to the query,
+    and score: the cosine similarity for vector-only retrieval, the fused
+    reciprocal-rank score with a keyword_index. Uncached queries are embedded
+    in a single batch and sent to Chroma as one multi-query lookup.
+
+    where restricts hits to chunks whose metadata equals the given values
+    (e.g. {"filename": "houn.txt"}; a list value matches any of its items).
+    Hits farther than max_distance from the query are dropped. With
+    mmr_lambda, the k hits are picked from the candidates by maximal marginal
+    relevance, trading relevance (1.0) against novelty (0.0) so near-identical
+    passages do not crowd out the rest.
+    """
     try:
-        results = collection.query(query_texts=[query], n_results=k)
-        if results.get("metadatas") and len(results["metadatas"]) > 0:
-            return [doc["text"] for doc in results["metadatas"][0] if "text" in doc]
-        return []
+        options = (json.dumps(where, sort_keys=True) if where else None, max_distance, mmr_lambda, candidates)
+        cache_keys = [(getattr(collection, "name", None), id(collection), id(keyword_index),
+                       normalize_query_text(query), k, options) for query in queries]
+        results = {}
+        for cache_key in cache_keys:
+            cached = _result_cache.get(cache_key)
+            if cached is not None:
+                results[cache_key] = cached
+
+        pending = list(dict.fromkeys(cache_key for cache_key in cache_keys if cache_key not in results))
+        if pending:
+            searched = _search(collection, [cache_key[3] for cache_key in pending], k, keyword_index,
+                               where, max_distance, mmr_lambda, candidates)
+            for cache_key, chunks in zip(pending, searched):
+                _result_cache.put(cache_key, chunks)
+                results[cache_key] = chunks
+
+        return [[dict(chunk) for chunk in results[cache_key]] for cache_key in cache_keys]
     except Exception as e:
-        raise RuntimeError(f"Error retrieving documents: {e}")
\ No newline at end of file
+        raise RuntimeError(f"Error retrieving documents: {e}")
+
+
+def _search(collection, texts, k, keyword_index, where, max_distance, mmr_lambda, candidates):
+    """Scored hits for each text: one batched embed, one multi-query lookup, one get for the rest."""
+    rerank = keyword_index is not None or mmr_lambda is not None or max_distance is not None
+    candidates = candidates or (max(k * 4, 20) if rerank else k)
+    space = (getattr(collection, "metadata", None) or {}).get("hnsw:space", "l2")
+    include = ["metadatas", "distances"] + (["embeddings"] if mmr_lambda is not None else [])
+
+    query_vectors = get_embedding_provider().embed_queries(texts)
+    query_kwargs = {"where": _chroma_where(where)} if where else {}
+    vector_results = collection.query(
+        query_embeddings=query_vectors.tolist(), n_results=candidates, include=include, **query_kwargs
+    )
+
+    metadatas, embeddings = {}, {}
+    distances = []  # per query: id -> cosine distance
+    rankings = []
+    for i in range(len(texts)):
+        ids = vector_results["ids"][i]
+        metadatas.update(zip(ids, vector_results["metadatas"][i]))
+        if mmr_lambda is not None:
+            embeddings.update(zip(ids, vector_results["embeddings"][i]))
+        distances.append({doc_id: _cosine_distance(distance, space)
+                          for doc_id, distance in zip(ids, vector_results["distances"][i])})
+        rankings.append(ids)
+
+    scores = [{doc_id: 1.0 - distance for doc_id, distance in query_distances.items()}
+              for query_distances in distances]
+    if keyword_index is not None:
+        for i, text in enumerate(texts):
+            keyword_ids = [doc_id for doc_id, _ in keyword_index.search(text, k=candidates)]
+            scores[i] = reciprocal_rank_scores([rankings[i], keyword_ids])
+            rankings[i] = sorted(scores[i], key=scores[i].get, reverse=True)[:candidates]
+
+        # Keyword-only hits still need their text and vector from the collection
+        missing = list(dict.fromkeys(doc_id for i, ranking in enumerate(rankings) for doc_id in ranking
+                                     if doc_id not in distances[i] and doc_id not in embeddings))
+        if missing:
+            fetched = collection.get(ids=missing, include=["metadatas", "embeddings"])
+            metadatas.update(zip(fetched.get("ids") or [], fetched.get("metadatas") or []))
+            embeddings.update(zip(fetched.get("ids") or [], fetched.get("embeddings") or []))
+
+    searched = []
+    for i, ranking in enumerate(rankings):
+        ranking = [doc_id for doc_id in ranking if metadatas.get(doc_id) and "text" in metadatas[doc_id]
+                   and (not where or _matches(metadatas[doc_id], where))]
+        for doc_id in ranking:
+            if doc_id not in distances[i]:
+                distances[i][doc_id] = 1.0 - float(np.dot(embeddings[doc_id], query_vectors[i]))
+        if max_distance is not None:
+            ranking = [doc_id for doc_id in ranking if distances[i][doc_id] <= max_distance]
+        if mmr_lambda is not None and len(ranking) > k:
+            similarity = np.array([1.0 - distances[i][doc_id] for doc_id in ranking], dtype=np.float32)
+            vectors = np.asarray([embeddings[doc_id] for doc_id in ranking], dtype=np.float32)
+            ranking = [ranking[j] for j in maximal_marginal_relevance(similarity, vectors, k, mmr_lambda)]
+        searched.append(tuple(
+            {"id": doc_id, "text": metadatas[doc_id]["text"],
+             "filename": metadatas[doc_id].get("filename", ""), "story": metadatas[doc_id].get("story", ""),
+             "score": round(scores[i][doc_id], 6), "distance": round(distances[i][doc_id], 6)}
+            for doc_id in ranking[:k]
+        ))
+    return searched
+
+
+def maximal_marginal_relevance(similarity, vectors, k, mmr_lambda=0.7):
+    """Indices of k candidates chosen greedily by MMR.
+
+    similarity is each candidate's similarity to the query and vectors their
+    unit-length embeddings; each pick maximises
+    mmr_lambda * similarity - (1 - mmr_lambda) * (max similarity to the picks so far).
+    """
+    n = len(similarity)
+    if n == 0:
+        return []
+    pairwise = vectors @ vectors.T
+    selected = [int(np.argmax(similarity))]
+    redundancy = pairwise[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < min(k, n):
+        scores = mmr_lambda * similarity - (1.0 - mmr_lambda) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, pairwise[best], out=redundancy)
+    return selected
+
+
+def _cosine_distance(distance, space):
+    """Cosine distance from a Chroma distance (vectors are unit length, l2 is squared)."""
+    return distance / 2.0 if space == "l2" else distance
+
+
+def _chroma_where(where):
+    clauses = [_any_of(field, value if isinstance(value, (list, tuple)) else [value])
+               for field, value in where.items()]
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _any_of(field, values):
+    # $or of equalities instead of $in, which older Chroma servers reject; $or needs two or more clauses
+    clauses = [{field: value} for value in dict.fromkeys(values)]
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def _matches(metadata, where):
+    return all(
+        metadata.get(field) in value if isinstance(value, (list, tuple)) else metadata.get(field) == value
+        for field, value in where.items()
+    )
+
+
+def reciprocal_rank_scores(rankings, k=60):
+    """Fused score per id: sum(1 / (k + rank)) over the ranked id lists it appears in."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return scores
@@ -0,0 +1,397 @@
+import json
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from services.turn_log import FIELDS, TurnLog
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _turn_row(turn: Dict[str, Any], seq: int) -> Dict[str, Any]:
+    """The stored form of a turn built by MemoryService._build_turn."""
+    metadata = turn['metadata']
+    return {
+        'session_id': turn['session_id'],
+        'seq': seq,
+        'turn_id': turn['id'],
+        'timestamp': metadata['timestamp'],
+        'user_message': turn['user_message'],
+        'assistant_response': turn['assistant_response'],
+        'context': metadata.get('context', '{}')
+    }
+
+
+def _project(row: Dict[str, Any], fields: Optional[Iterable[str]]) -> Dict[str, Any]:
+    if not fields:
+        return row
+    wanted = set(fields) | {'seq'}
+    unknown = wanted - set(FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown turn fields: {sorted(unknown)}")
+    return {field: row[field] for field in FIELDS if field in wanted}
+
+
+def _epoch(timestamp: str) -> float:
+    """Seconds since the epoch for a naive UTC ISO timestamp."""
+    return datetime.fromisoformat(timestamp).replace(tzinfo=timezone.utc).timestamp()
+
+
+class SessionStore(ABC):
+    """Storage for per-session turns and session records.
+
+    Turns are numbered per session (seq 1, 2, ...) as they are appended.
+    Session records are plain dicts keyed by session id (message counts,
+    topics, running summary). Every read and update is by session id, so
+    backends can serve them from a key-value store.
+    """
+
+    # Turns
+
+    @abstractmethod
+    def append_turns(self, turns: List[Dict[str, Any]]):
+        """Append turns in order, setting each turn's 'seq'. Already stored turn ids are skipped."""
+
+    @abstractmethod
+    def recent_turns(self, session_id: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """The last limit turns of a session, oldest first."""
+
+    @abstractmethod
+    def turn_history(self, session_id: str, limit: int = 50, before_seq: Optional[int] = None,
+                     fields: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """A page of a session's turns, newest first, strictly older than before_seq."""
+
+    @abstractmethod
+    def turns_between(self, session_id: str, after_seq: int, through_seq: int,
+                      limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Turns with after_seq < seq <= through_seq, oldest first."""
+
+    @abstractmethod
+    def last_seq(self, session_id: str) -> int:
+        """seq of the session's newest turn (0 when it has none)."""
+
+    @abstractmethod
+    def count_turns(self) -> int:
+        """Number of stored turns across all sessions."""
+
+    # Session records
+
+    @abstractmethod
+    def get_sessions(self, session_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Records of the sessions that have one, keyed by session id."""
+
+    @abstractmethod
+    def put_sessions(self, records: Dict[str, Dict[str, Any]]):
+        """Create or replace session records."""
+
+    # Lifecycle
+
+    @abstractmethod
+    def delete_sessions(self, session_ids: List[str]) -> int:
+        """Delete the turns and records of sessions; returns the number of turns removed."""
+
+    @abstractmethod
+    def expired_sessions(self, before: str) -> List[str]:
+        """Sessions whose newest turn is older than the ISO timestamp before."""
+
+    def compact(self, min_free_ratio: float = 0.0) -> bool:
+        """Reclaim space after deletes once min_free_ratio of it is free, where the backend needs it.
+
+        Returns True if space was reclaimed.
+        """
+        return False
+
+
+class ChromaSessionStore(SessionStore):
+    """Turns in the SQLite TurnLog, session records in the session_data collection.
+
+    Records are only ever read and written by id, so session_data is used as a
+    key-value table: its vectors are placeholders and it is never queried.
+    """
+
+    def __init__(self, session_collection, turn_log: TurnLog):
+        self.session_collection = session_collection
+        self.turn_log = turn_log
+
+    def append_turns(self, turns):
+        self.turn_log.append(turns)
+
+    def recent_turns(self, session_id, limit=5):
+        return self.turn_log.recent(session_id, limit)
+
+    def turn_history(self, session_id, limit=50, before_seq=None, fields=None):
+        return self.turn_log.history(session_id, limit, before_seq=before_seq, fields=fields)
+
+    def turns_between(self, session_id, after_seq, through_seq, limit=None):
+        return self.turn_log.between(session_id, after_seq, through_seq, limit=limit)
+
+    def last_seq(self, session_id):
+        return self.turn_log.last_seq(session_id)
+
+    def count_turns(self):
+        return self.turn_log.count()
+
+    def get_sessions(self, session_ids):
+        results = self.session_collection.get(ids=list(session_ids), include=["metadatas"])
+        return {
+            session_id: self._decode(metadata)
+            for session_id, metadata in zip(results.get('ids') or [], results.get('metadatas') or [])
+            if metadata
+        }
+
+    def put_sessions(self, records):
+        if not records:
+            return
+        self.session_collection.upsert(
+            ids=list(records),
+            embeddings=[[0] * 384 for _ in records],  # Placeholder embedding
+            metadatas=[self._encode(record) for record in records.values()]
+        )
+
+    def delete_sessions(self, session_ids):
+        self.session_collection.delete(ids=list(session_ids))
+        return self.turn_log.delete_sessions(session_ids)
+
+    def expired_sessions(self, before):
+        return self.turn_log.expired_sessions(before)
+
+    def compact(self, min_free_ratio=0.0):
+        return self.turn_log.compact(min_free_ratio)
+
+    @staticmethod
+    def _encode(record: Dict[str, Any]) -> Dict[str, Any]:
+        """Chroma metadata values must be scalars, so topics are stored as JSON."""
+        return {**record, 'topics': json.dumps(record.get('topics', []))}
+
+    @staticmethod
+    def _decode(metadata: Dict[str, Any]) -> Dict[str, Any]:
+        topics = metadata.get('topics', '[]')
+        if isinstance(topics, str):
+            topics = json.loads(topics or '[]')
+        return {**metadata, 'topics': topics}
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local dicts; for tests and single-process development."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._turns: Dict[str, List[Dict[str, Any]]] = {}
+        self._turn_ids = set()
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+
+    def append_turns(self, turns):
+        with self._lock:
+            for turn in turns:
+                if turn['id'] in self._turn_ids:
+                    continue
+                rows = self._turns.setdefault(turn['session_id'], [])
+                turn['seq'] = len(rows) + 1
+                rows.append(_turn_row(turn, turn['seq']))
+                self._turn_ids.add(turn['id'])
+
+    def recent_turns(self, session_id, limit=5):
+        with self._lock:
+            rows = self._turns.get(session_id, [])
+            return [dict(row) for row in rows[-limit:]] if limit > 0 else []
+
+    def turn_history(self, session_id, limit=50, before_seq=None, fields=None):
+        with self._lock:
+            rows = self._turns.get(session_id, [])
+            # Sessions are only ever deleted whole, so seq n lives at index n - 1
+            if before_seq is not None:
+                rows = rows[:max(0, before_seq - 1)]
+            page = rows[-limit:] if limit > 0 else []
+            return [_project(dict(row), fields) for row in reversed(page)]
+
+    def turns_between(self, session_id, after_seq, through_seq, limit=None):
+        with self._lock:
+            rows = self._turns.get(session_id, [])[max(0, after_seq):max(0, through_seq)]
+            return [dict(row) for row in (rows if limit is None else rows[:limit])]
+
+    def last_seq(self, session_id):
+        with self._lock:
+            return len(self._turns.get(session_id, []))
+
+    def count_turns(self):
+        with self._lock:
+            return sum(len(rows) for rows in self._turns.values())
+
+    def get_sessions(self, session_ids):
+        with self._lock:
+            return {session_id: dict(self._sessions[session_id])
+                    for session_id in session_ids if session_id in self._sessions}
+
+    def put_sessions(self, records):
+        with self._lock:
+            for session_id, record in records.items():
+                self._sessions[session_id] = dict(record)
+
+    def delete_sessions(self, session_ids):
+        removed = 0
+        with self._lock:
+            for session_id in session_ids:
+                rows = self._turns.pop(session_id, [])
+                self._turn_ids.difference_update(row['turn_id'] for row in rows)
+                self._sessions.pop(session_id, None)
+                removed += len(rows)
+        return removed
+
+    def expired_sessions(self, before):
+        with self._lock:
+            return [session_id for session_id, rows in self._turns.items()
+                    if rows and rows[-1]['timestamp'] < before]
+
+
+class RedisSessionStore(SessionStore):
+    """Redis (or any Redis-protocol server) backend shared by all workers.
+
+    Keys, under prefix:
+      turns:<session>    sorted set of turn JSON scored by seq
+      seq:<session>      seq of the session's newest turn
+      session:<session>  session record JSON
+      activity           sorted set of session ids scored by last turn time
+      turn_ids           set of stored turn ids (makes appends idempotent)
+      turn_count         total number of stored turns
+    """
+
+    def __init__(self, client, prefix: str = "sherlock"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "sherlock") -> 'RedisSessionStore':
+        import redis
+
+        return cls(redis.Redis.from_url(url), prefix=prefix)
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    @staticmethod
+    def _text(value) -> str:
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    def append_turns(self, turns):
+        turns = list(turns)
+        if not turns:
+            return
+        seq_keys = sorted({self._key("seq", turn['session_id']) for turn in turns})
+
+        def append(pipe):
+            # WATCH on the sessions' counters restarts this if another worker appends to
+            # (or deletes) one of them meanwhile; turn ids embed their session id, so a
+            # duplicate of one of these turns can only come through the same counter
+            seqs = {}
+            stored = set()
+            new = []
+            for turn in turns:
+                if turn['id'] in stored or pipe.sismember(self._key("turn_ids"), turn['id']):
+                    continue
+                session_id = turn['session_id']
+                if session_id not in seqs:
+                    seqs[session_id] = int(pipe.get(self._key("seq", session_id)) or 0)
+                seqs[session_id] += 1
+                stored.add(turn['id'])
+                new.append((turn, seqs[session_id]))
+            pipe.multi()
+            for turn, seq in new:
+                row = _turn_row(turn, seq)
+                pipe.sadd(self._key("turn_ids"), turn['id'])
+                pipe.zadd(self._key("turns", turn['session_id']), {json.dumps(row): seq})
+                pipe.zadd(self._key("activity"), {turn['session_id']: _epoch(row['timestamp'])})
+            for session_id, seq in seqs.items():
+                pipe.set(self._key("seq", session_id), seq)
+            if new:
+                pipe.incrby(self._key("turn_count"), len(new))
+            return new
+
+        for turn, seq in self.client.transaction(append, *seq_keys, value_from_callable=True):
+            turn['seq'] = seq
+
+    def recent_turns(self, session_id, limit=5):
+        if limit <= 0:
+            return []
+        rows = self.client.zrevrange(self._key("turns", session_id), 0, limit - 1)
+        return [json.loads(row) for row in reversed(rows)]
+
+    def turn_history(self, session_id, limit=50, before_seq=None, fields=None):
+        if limit <= 0:
+            return []
+        upper = "+inf" if before_seq is None else f"({before_seq}"
+        rows = self.client.zrevrangebyscore(self._key("turns", session_id), upper, "-inf",
+                                            start=0, num=limit)
+        return [_project(json.loads(row), fields) for row in rows]
+
+    def turns_between(self, session_id, after_seq, through_seq, limit=None):
+        key = self._key("turns", session_id)
+        if limit is None:
+            rows = self.client.zrangebyscore(key, f"({after_seq}", through_seq)
+        else:
+            rows = self.client.zrangebyscore(key, f"({after_seq}", through_seq, start=0, num=limit)
+        return [json.loads(row) for row in rows]
+
+    def last_seq(self, session_id):
+        return int(self.client.get(self._key("seq", session_id)) or 0)
+
+    def count_turns(self):
+        return int(self.client.get(self._key("turn_count")) or 0)
+
+    def get_sessions(self, session_ids):
+        session_ids = list(session_ids)
+        if not session_ids:
+            return {}
+        values = self.client.mget([self._key("session", session_id) for session_id in session_ids])
+        return {session_id: json.loads(value)
+                for session_id, value in zip(session_ids, values) if value is not None}
+
+    def put_sessions(self, records):
+        if not records:
+            return
+        pipe = self.client.pipeline()
+        for session_id, record in records.items():
+            pipe.set(self._key("session", session_id), json.dumps(record))
+        pipe.execute()
+
+    def delete_sessions(self, session_ids):
+        session_ids = list(session_ids)
+        if not session_ids:
+            return 0
+        turn_keys = [self._key("turns", session_id) for session_id in session_ids]
+
+        def delete(pipe):
+            # WATCH on the turn sets restarts this if a turn is appended meanwhile
+            turn_ids = [json.loads(row)['turn_id'] for key in turn_keys for row in pipe.zrange(key, 0, -1)]
+            pipe.multi()
+            if turn_ids:
+                pipe.srem(self._key("turn_ids"), *turn_ids)
+                pipe.decrby(self._key("turn_count"), len(turn_ids))
+            pipe.delete(*turn_keys,
+                        *(self._key("seq", session_id) for session_id in session_ids),
+                        *(self._key("session", session_id) for session_id in session_ids))
+            pipe.zrem(self._key("activity"), *session_ids)
+            return len(turn_ids)
+
+        return self.client.transaction(delete, *turn_keys, value_from_callable=True)
+
+    def expired_sessions(self, before):
+        return [self._text(session_id) for session_id in
+                self.client.zrangebyscore(self._key("activity"), "-inf", f"({_epoch(before)}")]
+
+
+def create_session_store(config, registry=None) -> SessionStore:
+    """Build the session store selected by config.SESSION_STORE ('chroma', 'memory' or 'redis')."""
+    backend = config.SESSION_STORE.lower()
+    if backend == 'chroma':
+        if registry is None:
+            from services.chroma_registry import get_registry
+            registry = get_registry()
+        return ChromaSessionStore(registry.get_collection("session_data"), TurnLog(config.TURN_LOG_PATH))
+    if backend == 'memory':
+        return InMemorySessionStore()
+    if backend == 'redis':
+        logger.info(f"Session store: redis at {config.REDIS_URL}")
+        return RedisSessionStore.from_url(config.REDIS_URL, prefix=config.REDIS_KEY_PREFIX)
+    raise ValueError(f"Unknown SESSION_STORE backend: {config.SESSION_STORE}")
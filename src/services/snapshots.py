@@ -0,0 +1,84 @@
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CURRENT_POINTER = "CURRENT"
+SNAPSHOT_INFO = "snapshot.json"
+MANIFEST_FILE = "ingest_manifest.json"
+QUANTIZED_INDEX_FILE = "case_index.bin"
+
+
+def new_snapshot_version() -> str:
+    """Sortable, unique-enough version name for a new snapshot."""
+    return datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+
+
+def snapshot_path(root: str, version: str) -> str:
+    return os.path.join(root, version)
+
+
+def current_version(root: str) -> Optional[str]:
+    """Version named by the CURRENT pointer, or None if no snapshot is active."""
+    try:
+        with open(os.path.join(root, CURRENT_POINTER), "r", encoding="utf-8") as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve_snapshot(root: str, version: str = "current") -> str:
+    """Path of a snapshot directory; 'current' follows the CURRENT pointer."""
+    if version == "current":
+        version = current_version(root)
+        if version is None:
+            raise FileNotFoundError(f"No active case index snapshot under {root}")
+    path = snapshot_path(root, version)
+    if not os.path.exists(os.path.join(path, SNAPSHOT_INFO)):
+        raise FileNotFoundError(f"Case index snapshot {path} is missing or incomplete")
+    return path
+
+
+def prepare_snapshot(root: str, version: str, base_version: Optional[str] = None) -> str:
+    """Create the directory for a new snapshot, seeded from base_version if given.
+
+    Seeding copies the base snapshot's index and manifest so ingestion only
+    embeds what changed since then.
+    """
+    path = snapshot_path(root, version)
+    if os.path.exists(path):
+        raise FileExistsError(f"Snapshot {path} already exists")
+    if base_version:
+        shutil.copytree(snapshot_path(root, base_version), path)
+        info = os.path.join(path, SNAPSHOT_INFO)
+        if os.path.exists(info):
+            os.remove(info)
+    else:
+        os.makedirs(path)
+    return path
+
+
+def write_snapshot_info(path: str, info: Dict[str, Any]):
+    """Mark a snapshot complete; resolve_snapshot ignores snapshots without this file."""
+    with open(os.path.join(path, SNAPSHOT_INFO), "w", encoding="utf-8") as file:
+        json.dump(info, file, indent=2)
+
+
+def read_snapshot_info(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, SNAPSHOT_INFO), "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def activate_snapshot(root: str, version: str):
+    """Atomically point CURRENT at version."""
+    resolve_snapshot(root, version)
+    tmp_path = os.path.join(root, f"{CURRENT_POINTER}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        file.write(version)
+    os.replace(tmp_path, os.path.join(root, CURRENT_POINTER))
+    logger.info(f"Activated case index snapshot {version}")
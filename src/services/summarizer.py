@@ -0,0 +1,105 @@
+from typing import Any, Dict, List
+
+from services.prompt_builder import truncate_tokens
+from services.write_behind import WriteBehindQueue
+from utils.logger import get_logger
+from utils.metrics import traced
+
+logger = get_logger(__name__)
+
+SUMMARY_PROMPT = """You keep a running summary of a conversation between a user and Sherlock Holmes.
+Update the summary with the new turns. Keep names, facts, suspects, open questions
+and conclusions; drop pleasantries. Write at most {max_words} words of plain prose.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
+
+class ConversationSummarizer:
+    """Folds a session's older turns into a running summary in the background.
+
+    The last keep_recent turns of a session stay raw in the prompt; once at
+    least min_turns older turns have not been summarized yet, they are folded
+    into the session's summary with one call to model (anything with a
+    generate_content(prompt) returning an object with .text, so FakeLLM works
+    as a stub). The summary is capped at max_tokens and saved with the session
+    record together with the seq of the last turn it covers, so prompt memory
+    stays at summary + keep_recent turns however long the session runs.
+    """
+
+    def __init__(self, memory_service, model, keep_recent: int = 5, min_turns: int = 4,
+                 max_tokens: int = 300, max_batch_turns: int = 20, background: bool = True):
+        self.memory_service = memory_service
+        self.model = model
+        self.keep_recent = max(0, keep_recent)
+        self.min_turns = max(1, min_turns)
+        self.max_tokens = max_tokens
+        self.max_batch_turns = max(self.min_turns, max_batch_turns)
+        self.queue = None
+        if background:
+            self.queue = WriteBehindQueue(
+                self._summarize_sessions, max_size=1000, batch_size=32,
+                flush_interval=1.0, name="conversation-summarizer"
+            )
+
+    def schedule(self, session_id: str):
+        """Ask for session_id to be summarized if it has fallen behind.
+
+        When the queue is full the request is dropped; the session is
+        scheduled again on its next turn.
+        """
+        if self.queue is None:
+            self.summarize(session_id)
+        else:
+            self.queue.submit(session_id)
+
+    def flush(self):
+        """Run any scheduled summarization now."""
+        if self.queue is not None:
+            self.queue.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return self.queue.stats() if self.queue is not None else {}
+
+    @traced("summarizer.summarize")
+    def summarize(self, session_id: str) -> bool:
+        """Fold pending older turns of a session into its summary; True if it changed."""
+        store = self.memory_service.store
+        summary, summary_seq = self.memory_service.get_conversation_summary(session_id)
+        through_seq = store.last_seq(session_id) - self.keep_recent
+        if through_seq - summary_seq < self.min_turns:
+            return False
+
+        while summary_seq < through_seq:
+            turns = store.turns_between(session_id, summary_seq, through_seq, limit=self.max_batch_turns)
+            if not turns:
+                break
+            summary = self._fold(summary, turns)
+            summary_seq = turns[-1]['seq']
+        self.memory_service.save_conversation_summary(session_id, summary, summary_seq)
+        logger.info(f"Summarized session {session_id} through turn {summary_seq}")
+        return True
+
+    def _summarize_sessions(self, session_ids: List[str]):
+        for session_id in dict.fromkeys(session_ids):
+            try:
+                self.summarize(session_id)
+            except Exception as e:
+                logger.error(f"Error summarizing session {session_id}: {str(e)}")
+
+    def _fold(self, summary: str, turns: List[Dict[str, Any]]) -> str:
+        prompt = SUMMARY_PROMPT.format(
+            max_words=int(self.max_tokens * 0.75),
+            summary=summary or "(none yet)",
+            turns="\n".join(
+                f"User: {turn['user_message']}\nHolmes: {truncate_tokens(turn['assistant_response'], 200)}"
+                for turn in turns
+            )
+        )
+        response = self.model.generate_content(prompt)
+        return truncate_tokens(response.text.strip(), self.max_tokens)
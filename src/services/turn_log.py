@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    turn_id TEXT NOT NULL UNIQUE,
+    timestamp TEXT NOT NULL,
+    user_message TEXT NOT NULL,
+    assistant_response TEXT NOT NULL,
+    context TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID
+"""
+
+FIELDS = ("session_id", "seq", "turn_id", "timestamp", "user_message", "assistant_response", "context")
+COLUMNS = ", ".join(FIELDS)
+
+
+class TurnLog:
+    """Append-only per-session log of conversation turns in SQLite.
+
+    Turns are numbered per session (seq 1, 2, ...) and the (session_id, seq)
+    primary key keeps each session's turns contiguous and ordered, so the last
+    N turns and keyset pages of history are index range scans. Each thread
+    gets its own connection; WAL mode lets readers run alongside the writer
+    and across worker processes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._connection().execute(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def append(self, turns: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Append turns in order, setting each turn's 'seq'; returns the turns.
+
+        Turns whose id is already logged are skipped, so replays are harmless.
+        """
+        turns = list(turns)
+        if not turns:
+            return turns
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            next_seq = {}
+            for turn in turns:
+                session_id = turn['session_id']
+                if session_id not in next_seq:
+                    next_seq[session_id] = self.last_seq(session_id) + 1
+                metadata = turn['metadata']
+                cursor = connection.execute(
+                    f"INSERT OR IGNORE INTO turns ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (session_id, next_seq[session_id], turn['id'], metadata['timestamp'],
+                     turn['user_message'], turn['assistant_response'], metadata.get('context', '{}'))
+                )
+                if cursor.rowcount:
+                    turn['seq'] = next_seq[session_id]
+                    next_seq[session_id] += 1
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return turns
+
+    def recent(self, session_id: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """The last limit turns of a session, oldest first."""
+        rows = self._connection().execute(
+            f"SELECT {COLUMNS} FROM turns WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+            (session_id, limit)
+        ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def history(self, session_id: str, limit: int = 50, before_seq: Optional[int] = None,
+                fields: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """A page of a session's turns, newest first, strictly older than before_seq.
+
+        fields selects a subset of FIELDS; 'seq' is always included.
+        """
+        wanted = set(fields or FIELDS) | {"seq"}
+        unknown = wanted - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown turn fields: {sorted(unknown)}")
+        columns = ", ".join(field for field in FIELDS if field in wanted)
+        if before_seq is None:
+            rows = self._connection().execute(
+                f"SELECT {columns} FROM turns WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                (session_id, limit)
+            ).fetchall()
+        else:
+            rows = self._connection().execute(
+                f"SELECT {columns} FROM turns WHERE session_id = ? AND seq < ? "
+                f"ORDER BY seq DESC LIMIT ?",
+                (session_id, before_seq, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def between(self, session_id: str, after_seq: int, through_seq: int,
+                limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Turns with after_seq < seq <= through_seq, oldest first."""
+        return [dict(row) for row in self._connection().execute(
+            f"SELECT {COLUMNS} FROM turns WHERE session_id = ? AND seq > ? AND seq <= ? "
+            f"ORDER BY seq LIMIT ?",
+            (session_id, after_seq, through_seq, -1 if limit is None else limit)
+        ).fetchall()]
+
+    def last_seq(self, session_id: str) -> int:
+        """Sequence number of the session's newest turn (0 when it has none)."""
+        return self._connection().execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM turns WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+
+    def count(self, session_id: Optional[str] = None) -> int:
+        if session_id is None:
+            return self._connection().execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM turns WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+
+    def delete_sessions(self, session_ids: List[str]) -> int:
+        """Remove every turn of the given sessions in one statement; returns the number removed."""
+        if not session_ids:
+            return 0
+        placeholders = ", ".join("?" * len(session_ids))
+        return self._connection().execute(
+            f"DELETE FROM turns WHERE session_id IN ({placeholders})", list(session_ids)
+        ).rowcount
+
+    def expired_sessions(self, before: str) -> List[str]:
+        """Sessions whose newest turn is older than the ISO timestamp before."""
+        return [row[0] for row in self._connection().execute(
+            "SELECT session_id FROM turns GROUP BY session_id HAVING MAX(timestamp) < ?", (before,)
+        ).fetchall()]
+
+    def compact(self, min_free_ratio: float = 0.0) -> bool:
+        """VACUUM and truncate the WAL once min_free_ratio of the file's pages are free.
+
+        VACUUM rewrites the whole file and holds off appends while it runs,
+        so it only pays off once deletes have freed a good share of it.
+        Returns True if it ran.
+        """
+        connection = self._connection()
+        pages = connection.execute("PRAGMA page_count").fetchone()[0]
+        free = connection.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free or free < min_free_ratio * pages:
+            return False
+        connection.execute("VACUUM")
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return True
@@ -0,0 +1,126 @@
+import atexit
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class WriteBehindQueue:
+    """Bounded queue drained by a background worker that flushes items in batches.
+
+    Producers call submit(); the worker collects up to batch_size items (or
+    whatever arrived within flush_interval seconds) and hands them to flush_fn
+    in a single call. A full queue rejects the item so the caller can fall back
+    to a synchronous write instead of blocking the request. Items count as
+    unfinished from submit() until their batch has been handed to flush_fn,
+    including while the worker is writing it.
+    """
+
+    def __init__(self, flush_fn: Callable[[List[Any]], None], max_size: int = 1000,
+                 batch_size: int = 64, flush_interval: float = 0.5, name: str = "write-behind"):
+        self.flush_fn = flush_fn
+        self.max_size = max_size
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.name = name
+
+        self._queue = queue.Queue(maxsize=max_size)
+        self._flush_lock = threading.Lock()
+        # Submitted items whose batch has not been written yet
+        self._unfinished = 0
+        self._idle = threading.Condition()
+        self._stop = threading.Event()
+        self._flushed = 0
+        self._rejected = 0
+        self._failed = 0
+
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+        atexit.register(self.shutdown)
+
+    def submit(self, item: Any) -> bool:
+        """Enqueue an item; returns False if the queue is full or shut down."""
+        if self._stop.is_set():
+            return False
+        with self._idle:
+            self._unfinished += 1
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self._done(1)
+            self._rejected += 1
+            return False
+
+    def depth(self) -> int:
+        """Number of items waiting to be flushed."""
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, int]:
+        """Queue depth and lifetime counters."""
+        return {
+            'depth': self.depth(),
+            'capacity': self.max_size,
+            'flushed': self._flushed,
+            'rejected': self._rejected,
+            'failed': self._failed
+        }
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Synchronously drain everything queued and wait for the batch the worker is writing.
+
+        Returns False if that batch was still being written after timeout seconds.
+        """
+        while True:
+            batch = self._drain(block=False)
+            if not batch:
+                break
+            self._flush_batch(batch)
+        with self._idle:
+            return self._idle.wait_for(lambda: self._unfinished == 0, timeout)
+
+    def shutdown(self, timeout: float = 10.0):
+        """Stop the worker and flush whatever is still queued."""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._worker.join(timeout)
+        self.flush(timeout)
+        logger.info(f"{self.name} queue shut down ({self._flushed} items flushed)")
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._drain(block=True)
+            if batch:
+                self._flush_batch(batch)
+
+    def _drain(self, block: bool) -> List[Any]:
+        batch = []
+        try:
+            if block:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _flush_batch(self, batch: List[Any]):
+        with self._flush_lock:
+            try:
+                self.flush_fn(batch)
+                self._flushed += len(batch)
+            except Exception as e:
+                self._failed += len(batch)
+                logger.error(f"Error flushing {len(batch)} items from {self.name} queue: {str(e)}")
+            finally:
+                self._done(len(batch))
+
+    def _done(self, count: int):
+        with self._idle:
+            self._unfinished -= count
+            if not self._unfinished:
+                self._idle.notify_all()
@@ -17,26 +17,147 @@ class Config:
     
     # ChromaDB settings
     CHROMA_DB_PATH = os.getenv('CHROMA_DB_PATH', 'chroma_db')
+    # Set to use a shared Chroma server instead of an in-process PersistentClient
+    CHROMA_SERVER_HOST = os.getenv('CHROMA_SERVER_HOST')
+    CHROMA_SERVER_PORT = int(os.getenv('CHROMA_SERVER_PORT', 8000))
     
     # Google AI settings
     GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
     GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
     
+    # LLM provider: 'gemini' or 'fake' (offline, for tests and load testing)
+    LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'gemini').lower()
+    FAKE_LLM_FIRST_TOKEN_DELAY = float(os.getenv('FAKE_LLM_FIRST_TOKEN_DELAY', 0.0))
+    FAKE_LLM_CHUNK_DELAY = float(os.getenv('FAKE_LLM_CHUNK_DELAY', 0.0))
+    # Fraction of fake LLM calls that fail with a transient error (exercises retries and the breaker)
+    FAKE_LLM_FAILURE_RATE = float(os.getenv('FAKE_LLM_FAILURE_RATE', 0.0))
+    # LLM gateway: per-attempt timeout and whole-call deadline (seconds, retries included),
+    # retries with jittered exponential backoff, in-flight cap per worker process and how
+    # long a request may wait for a slot, and the circuit breaker's threshold/cool-down
+    LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 20.0))
+    LLM_DEADLINE = float(os.getenv('LLM_DEADLINE', 45.0))
+    LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+    LLM_RETRY_BACKOFF = float(os.getenv('LLM_RETRY_BACKOFF', 0.5))
+    LLM_RETRY_BACKOFF_MAX = float(os.getenv('LLM_RETRY_BACKOFF_MAX', 4.0))
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+    LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', 5.0))
+    LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', 5))
+    LLM_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', 30.0))
+    
     # Case data settings
     CASES_DIR = os.getenv('CASES_DIR', 'data/cases')
+    INGEST_MANIFEST_PATH = os.getenv('INGEST_MANIFEST_PATH', os.path.join(CHROMA_DB_PATH, 'ingest_manifest.json'))
+    # Case chunks per chat prompt, the cosine distance beyond which a chunk is too weak to use
+    # (2 keeps everything) and the MMR relevance/novelty trade-off (1 turns diversification off)
+    CASE_CONTEXT_CHUNKS = int(os.getenv('CASE_CONTEXT_CHUNKS', 4))
+    RETRIEVAL_MAX_DISTANCE = float(os.getenv('RETRIEVAL_MAX_DISTANCE', 0.8))
+    RETRIEVAL_MMR_LAMBDA = float(os.getenv('RETRIEVAL_MMR_LAMBDA', 0.7))
+    # Largest page of search hits a client may ask for, and queries per /api/search/batch call
+    SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', 20))
+    SEARCH_BATCH_MAX_QUERIES = int(os.getenv('SEARCH_BATCH_MAX_QUERIES', 20))
+    # Case catalog (titles, sizes, word/chunk counts, byte offsets), rescanned at most every
+    # CASE_CATALOG_REFRESH_INTERVAL seconds; case text is served in pages of CASE_CONTENT_PAGE_SIZE characters
+    CASE_CATALOG_PATH = os.getenv('CASE_CATALOG_PATH', os.path.join(CHROMA_DB_PATH, 'case_catalog.json'))
+    CASE_CATALOG_REFRESH_INTERVAL = float(os.getenv('CASE_CATALOG_REFRESH_INTERVAL', 10.0))
+    CASE_CONTENT_PAGE_SIZE = int(os.getenv('CASE_CONTENT_PAGE_SIZE', 10000))
+    CASE_CONTENT_MAX_LENGTH = int(os.getenv('CASE_CONTENT_MAX_LENGTH', 100000))
+    # Hybrid retrieval: BM25 keyword index fused with vector search
+    HYBRID_SEARCH_ENABLED = os.getenv('HYBRID_SEARCH_ENABLED', 'True').lower() == 'true'
+    BM25_INDEX_PATH = os.getenv('BM25_INDEX_PATH', os.path.join(CHROMA_DB_PATH, 'bm25'))
+    # Chunking (whitespace tokens per window and overlap between windows)
+    CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', 200))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', 40))
+    # Set to False when the index is built offline with ingest.py --in-place
+    INGEST_ON_STARTUP = os.getenv('INGEST_ON_STARTUP', 'True').lower() == 'true'
+    # Prebuilt case index snapshots (see ingest.py); 'current' follows SNAPSHOT_ROOT/CURRENT
+    SNAPSHOT_ROOT = os.getenv('SNAPSHOT_ROOT', 'snapshots')
+    CASE_INDEX_SNAPSHOT = os.getenv('CASE_INDEX_SNAPSHOT')
+    INGEST_READ_WORKERS = int(os.getenv('INGEST_READ_WORKERS', os.cpu_count() or 4))
+    INGEST_MAX_INFLIGHT_FILES = int(os.getenv('INGEST_MAX_INFLIGHT_FILES', 8))
+    
+    # Case index backend: 'chroma', or 'quantized' to serve cases from a read-only
+    # memory-mapped file built by ingest.py (QUANTIZED_INDEX_PATH when no snapshot is mounted)
+    CASE_INDEX_BACKEND = os.getenv('CASE_INDEX_BACKEND', 'chroma').lower()
+    QUANTIZED_INDEX_PATH = os.getenv('QUANTIZED_INDEX_PATH', os.path.join(CHROMA_DB_PATH, 'case_index.bin'))
+    # Vector type of the quantized index: int8 or float16
+    QUANTIZED_INDEX_DTYPE = os.getenv('QUANTIZED_INDEX_DTYPE', 'int8').lower()
     
     # Memory settings
     MAX_MEMORY_ITEMS = int(os.getenv('MAX_MEMORY_ITEMS', 100))
     MEMORY_RETRIEVAL_LIMIT = int(os.getenv('MEMORY_RETRIEVAL_LIMIT', 5))
+    # Where turns and session records live: 'chroma' (SQLite turn log + session_data
+    # collection), 'redis' (shared by all workers) or 'memory' (tests). 'chroma' is the
+    # default because it needs no extra server and keeps existing session records
+    SESSION_STORE = os.getenv('SESSION_STORE', 'chroma')
+    # SQLite log of every turn, ordered per session (recent turns and history)
+    TURN_LOG_PATH = os.getenv('TURN_LOG_PATH', os.path.join(CHROMA_DB_PATH, 'turn_log.sqlite3'))
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    REDIS_KEY_PREFIX = os.getenv('REDIS_KEY_PREFIX', 'sherlock')
+    # /api/chat/history page size (default and server-side maximum)
+    HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', 50))
+    HISTORY_MAX_PAGE_SIZE = int(os.getenv('HISTORY_MAX_PAGE_SIZE', 200))
+    # Sessions idle longer than SESSION_TTL_DAYS are deleted every RETENTION_INTERVAL seconds
+    RETENTION_ENABLED = os.getenv('RETENTION_ENABLED', 'True').lower() == 'true'
+    SESSION_TTL_DAYS = int(os.getenv('SESSION_TTL_DAYS', 30))
+    RETENTION_INTERVAL = float(os.getenv('RETENTION_INTERVAL', 3600))
+    RETENTION_BATCH_SIZE = int(os.getenv('RETENTION_BATCH_SIZE', 100))
+    # Share of the turn log that must be free pages before a retention run VACUUMs it
+    RETENTION_COMPACT_FREE_RATIO = float(os.getenv('RETENTION_COMPACT_FREE_RATIO', 0.25))
+    
+    # Prompt template, compiled at startup and re-read when the file changes
+    # (checked every PROMPT_TEMPLATE_RELOAD_INTERVAL seconds; 0 disables reloading)
+    PROMPT_TEMPLATE_PATH = os.getenv(
+        'PROMPT_TEMPLATE_PATH',
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates', 'sherlock_prompt.txt')
+    )
+    PROMPT_TEMPLATE_RELOAD_INTERVAL = float(os.getenv('PROMPT_TEMPLATE_RELOAD_INTERVAL', 2.0))
+    
+    # Prompt assembly: approximate token budget for the whole prompt, cap on each
+    # quoted previous answer, and shingle overlap above which passages count as duplicates
+    PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 2048))
+    PROMPT_MEMORY_RESPONSE_TOKENS = int(os.getenv('PROMPT_MEMORY_RESPONSE_TOKENS', 150))
+    PROMPT_DEDUP_THRESHOLD = float(os.getenv('PROMPT_DEDUP_THRESHOLD', 0.8))
+    
+    # Rolling summary of turns older than the last MEMORY_RETRIEVAL_LIMIT, built in the background
+    SUMMARY_ENABLED = os.getenv('SUMMARY_ENABLED', 'True').lower() == 'true'
+    SUMMARY_MIN_TURNS = int(os.getenv('SUMMARY_MIN_TURNS', 4))
+    SUMMARY_MAX_TOKENS = int(os.getenv('SUMMARY_MAX_TOKENS', 300))
+    
+    # Concurrency settings
+    RETRIEVAL_WORKERS = int(os.getenv('RETRIEVAL_WORKERS', 8))
+    
+    # Response cache (exact + semantic tiers)
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+    RESPONSE_CACHE_THRESHOLD = float(os.getenv('RESPONSE_CACHE_THRESHOLD', 0.95))
+    RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', 3600))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 2000))
+    
+    # Write-behind persistence of conversation turns
+    WRITE_BEHIND_ENABLED = os.getenv('WRITE_BEHIND_ENABLED', 'True').lower() == 'true'
+    WRITE_BEHIND_MAX_SIZE = int(os.getenv('WRITE_BEHIND_MAX_SIZE', 1000))
+    WRITE_BEHIND_BATCH_SIZE = int(os.getenv('WRITE_BEHIND_BATCH_SIZE', 64))
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv('WRITE_BEHIND_FLUSH_INTERVAL', 0.5))
     
     # Embedding settings
     EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
     EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 100))
+    # 'sentence-transformers', 'onnx' (Chroma's bundled MiniLM) or 'auto'
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'auto')
+    QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 4096))
+    
+    # Short-lived cache of case retrieval results, cleared when ingestion changes the index
+    RETRIEVAL_CACHE_SIZE = int(os.getenv('RETRIEVAL_CACHE_SIZE', 1024))
+    RETRIEVAL_CACHE_TTL = float(os.getenv('RETRIEVAL_CACHE_TTL', 60))
     
     # Logging settings
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = os.getenv('LOG_FILE', 'logs/app.log')
     
+    # Per-stage latency histograms and counters served at /metrics; chats slower than
+    # METRICS_SLOW_CHAT_SECONDS log their stage breakdown (0 logs every chat)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'
+    METRICS_SLOW_CHAT_SECONDS = float(os.getenv('METRICS_SLOW_CHAT_SECONDS', 5.0))
+    
     # Rate limiting
     RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'True').lower() == 'true'
     
@@ -49,7 +170,7 @@ class Config:
     @staticmethod
     def validate_config():
         """Validate that required configuration values are present."""
-        required_vars = ['GOOGLE_API_KEY']
+        required_vars = ['GOOGLE_API_KEY'] if Config.LLM_PROVIDER != 'fake' else []
         missing_vars = []
         
         for var in required_vars:
@@ -0,0 +1,284 @@
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from utils.config import Config
+
+# Seconds; spans a cache hit (milliseconds) up to a slow LLM call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (name, type, help, [(labels, value), ...]) as returned by collectors
+Family = Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{name}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple:
+        return tuple(labels[name] for name in self.labelnames)
+
+    def _labels(self, key: Tuple) -> Dict[str, Any]:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, per label set."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that goes up and down (e.g. calls in flight)."""
+
+    type = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values, with their sum and count."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        samples = []
+        for key, counts, total in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**labels, 'le': _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class MetricsRegistry:
+    """Metrics of this process, rendered in the Prometheus text exposition format.
+
+    Metrics are created once (asking again for a name returns the same
+    object). Collectors are called at scrape time, so statistics the
+    services already keep (cache hit counts, queue depths) are exported
+    without touching the request path.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[Family]]):
+        """Add a callable returning (name, type, help, [(labels, value), ...]) families."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}"
+                         for name, labels, value in metric.samples())
+        for collector in collectors:
+            for name, metric_type, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+    def _register(self, cls, name, help, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError(f"Metric {name} is already registered as a {metric.type}")
+            return metric
+
+
+registry = MetricsRegistry(enabled=Config.METRICS_ENABLED)
+
+STAGE_SECONDS = registry.histogram(
+    "sherlock_stage_duration_seconds", "Time spent in each stage of serving a chat", ("stage",)
+)
+STAGE_IN_FLIGHT = registry.gauge("sherlock_stage_in_flight", "Stage executions currently running", ("stage",))
+STAGE_ERRORS = registry.counter("sherlock_stage_errors_total", "Stage executions that raised", ("stage",))
+
+_current_trace = contextvars.ContextVar("sherlock_trace", default=None)
+
+
+class Trace:
+    """Stage timings of one request, gathered from every thread working on it."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: List[Tuple[str, float]] = []
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> str:
+        """'stage=seconds' pairs, longest first."""
+        totals: Dict[str, float] = {}
+        for stage, seconds in self.stages:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        return " ".join(f"{stage}={seconds:.3f}s" for stage, seconds in
+                        sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+class _NoTrace:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class _Tracing:
+    __slots__ = ("trace", "token")
+
+    def __enter__(self) -> Trace:
+        self.trace = Trace()
+        self.token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc_info):
+        _current_trace.reset(self.token)
+        return False
+
+
+class _Stage:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        STAGE_IN_FLIGHT.inc(stage=self.name)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        STAGE_IN_FLIGHT.dec(stage=self.name)
+        observe_stage(self.name, seconds, error=exc_type is not None)
+        return False
+
+
+_NO_TRACE = _NoTrace()
+
+
+def trace():
+    """Context manager collecting this request's stage timings; yields None when metrics are off."""
+    return _Tracing() if registry.enabled else _NO_TRACE
+
+
+def timed(stage: str):
+    """Context manager recording how long a block takes as one execution of stage."""
+    return _Stage(stage) if registry.enabled else _NO_TRACE
+
+
+def traced(stage: str):
+    """Decorator timing every call of a function as stage.
+
+    With metrics disabled the function is returned unwrapped, so it costs nothing.
+    """
+    def decorate(fn):
+        if not registry.enabled:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Stage(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def observe_stage(stage: str, seconds: float, error: bool = False):
+    """Record a stage timed by hand (e.g. across the chunks of a stream)."""
+    if not registry.enabled:
+        return
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if error:
+        STAGE_ERRORS.inc(stage=stage)
+    current = _current_trace.get()
+    if current is not None:
+        current.stages.append((stage, seconds))
+
+
+def in_context(fn: Callable) -> Callable:
+    """fn bound to a copy of the caller's context, so stages it runs on a pool thread join the caller's trace."""
+    if not registry.enabled:
+        return fn
+    return functools.partial(contextvars.copy_context().run, fn)
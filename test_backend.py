@@ -87,6 +87,38 @@ def test_backend():
     except Exception as e:
         print(f"❌ Search test failed: {str(e)}")
     
+    # Test streaming chat endpoint
+    print("\n5. Testing streaming chat endpoint...")
+    try:
+        stream_data = {
+            "message": "Hello, Sherlock! How do you deduce?",
+            "session_id": "test_session_002"
+        }
+        
+        start = time.perf_counter()
+        response = requests.post(
+            f"{base_url}/api/chat/stream",
+            json=stream_data,
+            headers={"Content-Type": "application/json"},
+            stream=True
+        )
+        
+        if response.status_code == 200:
+            first_byte = None
+            chunks = 0
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data:"):
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - start
+                    chunks += 1
+            total = time.perf_counter() - start
+            print("✅ Streaming endpoint working")
+            print(f"   Time to first byte: {first_byte or 0:.3f}s, total: {total:.3f}s, events: {chunks}")
+        else:
+            print(f"❌ Streaming endpoint failed: {response.status_code}")
+    except Exception as e:
+        print(f"❌ Streaming test failed: {str(e)}")
+    
     print("\n" + "=" * 50)
     print("🎉 Backend testing completed!")
     
@@ -0,0 +1,304 @@
+import hashlib
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Services import each other as top-level packages from src/
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from services.embedding_provider import EmbeddingProvider  # noqa: E402
+
+
+def _matches(metadata, where):
+    """Subset of Chroma's where filter used by the services ($eq, $ne, $in, $and, $or)."""
+    if not where:
+        return True
+    if "$and" in where:
+        return all(_matches(metadata, clause) for clause in where["$and"])
+    if "$or" in where:
+        return any(_matches(metadata, clause) for clause in where["$or"])
+    for field, condition in where.items():
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        (operator, expected), = condition.items()
+        if operator == "$eq" and value != expected:
+            return False
+        if operator == "$ne" and value == expected:
+            return False
+        if operator == "$in" and value not in expected:
+            return False
+    return True
+
+
+class FakeEmbeddingProvider(EmbeddingProvider):
+    """Hashed bag-of-words vectors: texts sharing words point the same way."""
+
+    model_id = "fake-bag-of-words"
+
+    def __init__(self, dim: int = 64, batch_size: int = 100):
+        super().__init__(batch_size)
+        self.dim = dim
+        self.batches = []
+
+    def _encode(self, texts):
+        self.batches.append(len(texts))
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"[a-z0-9']+", text.lower()):
+                vectors[row, int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+        return vectors
+
+
+class FakeCollection:
+    """In-process stand-in for the Chroma collection calls the services make.
+
+    Vectors are compared in the collection's hnsw:space ('l2' distances are
+    squared, as in Chroma); documents added without embeddings are embedded
+    with the shared provider when a query first needs them.
+    """
+
+    def __init__(self, name="chat_memory", metadata=None):
+        self.name = name
+        self.metadata = metadata
+        self.records = {}
+        self.documents = {}
+        self.embeddings = {}
+
+    def add(self, ids, documents=None, metadatas=None, embeddings=None):
+        for i, record_id in enumerate(ids):
+            self.records[record_id] = dict(metadatas[i]) if metadatas else {}
+            if documents:
+                self.documents[record_id] = documents[i]
+            if embeddings is not None:
+                self.embeddings[record_id] = np.asarray(embeddings[i], dtype=np.float32)
+            else:
+                self.embeddings.pop(record_id, None)
+
+    upsert = add
+
+    def update(self, ids, metadatas=None, documents=None, embeddings=None):
+        for i, record_id in enumerate(ids):
+            if metadatas:
+                self.records[record_id] = dict(metadatas[i])
+            if documents:
+                self.documents[record_id] = documents[i]
+            if embeddings is not None:
+                self.embeddings[record_id] = np.asarray(embeddings[i], dtype=np.float32)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None):
+        selected = [record_id for record_id, metadata in self.records.items()
+                    if (ids is None or record_id in ids) and _matches(metadata, where)]
+        start = offset or 0
+        selected = selected[start:None if limit is None else start + limit]
+        result = {'ids': selected, 'metadatas': [self.records[record_id] for record_id in selected]}
+        if include and "embeddings" in include:
+            result['embeddings'] = [self._embedding(record_id).tolist() for record_id in selected]
+        return result
+
+    def query(self, query_embeddings=None, query_texts=None, n_results=10, where=None, include=None):
+        from services.embedding_provider import get_embedding_provider
+
+        if query_embeddings is None:
+            query_embeddings = get_embedding_provider().embed(list(query_texts))
+        include = include if include is not None else ["metadatas", "distances"]
+        space = (self.metadata or {}).get("hnsw:space", "l2")
+        candidates = self.get(where=where)['ids']
+        result = {'ids': [], 'metadatas': [], 'distances': [], 'embeddings': []}
+        for query in np.asarray(query_embeddings, dtype=np.float32):
+            scored = []
+            for record_id in candidates:
+                vector = self._embedding(record_id)
+                if space == "l2":
+                    distance = float(np.sum((vector - query) ** 2))
+                else:
+                    distance = 1.0 - float(vector @ query) / float(np.linalg.norm(vector) * np.linalg.norm(query) or 1.0)
+                scored.append((distance, record_id))
+            scored.sort()
+            top = [record_id for _, record_id in scored[:n_results]]
+            result['ids'].append(top)
+            result['distances'].append([distance for distance, _ in scored[:n_results]])
+            result['metadatas'].append([self.records[record_id] for record_id in top])
+            result['embeddings'].append([self._embedding(record_id).tolist() for record_id in top])
+        return {key: value if key == 'ids' or key in include else None for key, value in result.items()}
+
+    def delete(self, ids=None, where=None):
+        for record_id in self.get(ids=ids, where=where)['ids']:
+            del self.records[record_id]
+            self.documents.pop(record_id, None)
+            self.embeddings.pop(record_id, None)
+
+    def count(self):
+        return len(self.records)
+
+    def _embedding(self, record_id):
+        if record_id not in self.embeddings:
+            from services.embedding_provider import get_embedding_provider
+
+            text = self.documents.get(record_id) or self.records[record_id].get('text', '')
+            self.embeddings[record_id] = get_embedding_provider().embed([text])[0]
+        return self.embeddings[record_id]
+
+
+class FakeChromaClient:
+    """The client calls ChromaRegistry makes, over FakeCollections."""
+
+    def __init__(self, key=None):
+        self.key = key
+        self.collections = {}
+        self.calls = []
+
+    def get_or_create_collection(self, name, **kwargs):
+        self.calls.append(('get_or_create_collection', name, kwargs))
+        return self.collections.setdefault(name, FakeCollection(name, kwargs.get('metadata')))
+
+    def get_collection(self, name, **kwargs):
+        self.calls.append(('get_collection', name, kwargs))
+        if name not in self.collections:
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.collections[name]
+
+
+class FakeRegistry:
+    def __init__(self):
+        self.collections = {}
+
+    def get_collection(self, name, path=None, embedding_function=None, read_only=False):
+        from services.chroma_registry import COLLECTION_METADATA, ReadOnlyCollection
+
+        key = (path, name)
+        if key not in self.collections:
+            if read_only:
+                raise ValueError(f"Collection {name} does not exist.")
+            self.collections[key] = FakeCollection(name, COLLECTION_METADATA.get(name))
+        return ReadOnlyCollection(self.collections[key]) if read_only else self.collections[key]
+
+
+@pytest.fixture
+def registry():
+    return FakeRegistry()
+
+
+@pytest.fixture
+def chroma_registry(embedder, monkeypatch):
+    """A real ChromaRegistry whose clients are FakeChromaClients (one per client key)."""
+    from services.chroma_registry import ChromaRegistry
+
+    registry = ChromaRegistry()
+    registry.created = []
+
+    def create_client(key):
+        registry.created.append(key)
+        return FakeChromaClient(key)
+
+    monkeypatch.setattr(registry, "_create_client", create_client)
+    return registry
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    """Keep files services write next to the Chroma data (markers, turn logs) out of the tree."""
+    from utils.config import Config
+
+    monkeypatch.setattr(Config, "CHROMA_DB_PATH", str(tmp_path))
+    return tmp_path
+
+
+@pytest.fixture
+def embedder(monkeypatch):
+    """FakeEmbeddingProvider installed as the process-wide provider, with an empty query cache."""
+    from services import embedding_provider
+
+    provider = FakeEmbeddingProvider()
+    monkeypatch.setattr(embedding_provider, "_provider", provider)
+    embedding_provider.query_embedding_cache.clear()
+    yield provider
+    embedding_provider.query_embedding_cache.clear()
+
+
+@pytest.fixture
+def cases_dir(data_dir):
+    """A case directory with two short stories."""
+    path = data_dir / "cases"
+    path.mkdir()
+    (path / "the_red_headed_league.txt").write_text(
+        "Mr. Jabez Wilson, a pawnbroker with fiery red hair, answered an advertisement "
+        "from the League of Red-Headed Men and copied the encyclopaedia every morning.",
+        encoding="utf-8"
+    )
+    (path / "silver_blaze.txt").write_text(
+        "The racehorse Silver Blaze vanished from the stables on Dartmoor and its trainer "
+        "was found dead. The curious incident was that the dog did nothing in the night-time.",
+        encoding="utf-8"
+    )
+    return path
+
+
+@pytest.fixture
+def offline_config(data_dir, cases_dir, monkeypatch):
+    """Config for running the services offline: FakeLLM, in-memory sessions, files under data_dir."""
+    from utils.config import Config
+
+    settings = {
+        'LLM_PROVIDER': 'fake',
+        'LLM_MAX_RETRIES': 0,
+        'SESSION_STORE': 'memory',
+        'WRITE_BEHIND_ENABLED': False,
+        'SUMMARY_ENABLED': False,
+        'RETENTION_ENABLED': False,
+        'INGEST_ON_STARTUP': False,
+        'CASE_INDEX_SNAPSHOT': None,
+        'CASE_INDEX_BACKEND': 'chroma',
+        'CASES_DIR': str(cases_dir),
+        'INGEST_MANIFEST_PATH': str(data_dir / "ingest_manifest.json"),
+        'CASE_CATALOG_PATH': str(data_dir / "case_catalog.json"),
+        'BM25_INDEX_PATH': str(data_dir / "bm25"),
+        'TURN_LOG_PATH': str(data_dir / "turn_log.sqlite3"),
+    }
+    for name, value in settings.items():
+        monkeypatch.setattr(Config, name, value)
+    return Config
+
+
+@pytest.fixture
+def chat_service(offline_config, registry, embedder):
+    from services.chat_service import ChatService
+
+    return ChatService(registry=registry)
+
+
+@pytest.fixture
+def flask_app(offline_config, data_dir, registry, embedder, monkeypatch):
+    """A freshly imported app module wired to the fakes and the offline FakeLLM."""
+    from services import chroma_registry
+    from utils.metrics import registry as metrics
+
+    monkeypatch.setattr(chroma_registry, "_registry", registry)
+    # Each import registers its collector again; drop them with the module
+    monkeypatch.setattr(metrics, "_collectors", list(metrics._collectors))
+    # setup_logger writes to ./logs
+    monkeypatch.chdir(data_dir)
+    monkeypatch.delitem(sys.modules, "app", raising=False)
+
+    import app
+    yield app
+    sys.modules.pop("app", None)
+
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.app.test_client()
+
+
+def sse_events(response):
+    """(event, data) pairs of a text/event-stream response body."""
+    import json
+
+    events = []
+    for block in response.get_data(as_text=True).strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields['event'], json.loads(fields['data'])))
+    return events
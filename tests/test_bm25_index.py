@@ -0,0 +1,118 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from conftest import FakeCollection
+from services.bm25_index import BM25Index, build_from_collection, tokenize
+from services.retrieval import invalidate_retrieval_cache, reciprocal_rank_scores, retrieve_chunks
+
+DOCUMENTS = [
+    ("c1", "Irene Adler outwitted Sherlock Holmes over the photograph."),
+    ("c2", "Holmes and Watson waited at Briony Lodge for the photograph."),
+    ("c3", "The hound of the Baskervilles howled on the moor."),
+    ("c4", "Holmes smoked his pipe. Holmes played the violin. Holmes slept."),
+]
+
+
+@pytest.fixture
+def index():
+    return BM25Index.build(DOCUMENTS)
+
+
+def test_tokenize_drops_stopwords_and_keeps_possessives():
+    assert tokenize("The Engineer's THUMB was in it") == ["engineer's", "thumb"]
+
+
+def test_search_ranks_rare_terms_first(index):
+    hits = index.search("Irene Adler photograph", k=4)
+
+    assert [doc_id for doc_id, _ in hits] == ["c1", "c2"]
+    assert hits[0][1] > hits[1][1] > 0
+
+
+def test_search_without_known_terms(index):
+    assert index.search("the of and") == []
+    assert index.search("Moriarty") == []
+    assert BM25Index.build([]).search("Holmes") == []
+
+
+def test_term_frequency_saturates_and_length_normalizes(index):
+    scores = dict(index.search("Holmes", k=4))
+
+    assert set(scores) == {"c1", "c2", "c4"}
+    assert scores["c4"] > scores["c1"]
+    assert scores["c4"] < 3 * scores["c1"]
+
+
+def test_save_and_load_memory_mapped(index, tmp_path):
+    path = str(tmp_path / "bm25")
+    index.save(path)
+    loaded = BM25Index.load(path)
+
+    assert isinstance(loaded.postings_docs, np.memmap)
+    assert loaded.search("photograph Holmes", k=4) == index.search("photograph Holmes", k=4)
+
+
+def test_save_replaces_existing_index_and_leaves_no_scratch(index, tmp_path):
+    path = str(tmp_path / "bm25")
+    index.save(path)
+    BM25Index.build(DOCUMENTS[:1]).save(path)
+
+    assert len(BM25Index.load(path)) == 1
+    assert os.listdir(tmp_path) == ["bm25"]
+
+
+def test_load_missing_or_other_version(index, tmp_path):
+    assert BM25Index.load(str(tmp_path / "missing")) is None
+
+    path = str(tmp_path / "bm25")
+    index.save(path)
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as file:
+        json.dump({'version': 0}, file)
+    assert BM25Index.load(path) is None
+
+
+def test_build_from_collection_pages_through_chunks(tmp_path):
+    collection = FakeCollection("case_data")
+    collection.add(ids=[doc_id for doc_id, _ in DOCUMENTS],
+                   metadatas=[{'text': text} for _, text in DOCUMENTS])
+
+    index = build_from_collection(collection, str(tmp_path / "bm25"), page_size=3)
+
+    assert index.doc_ids == [doc_id for doc_id, _ in DOCUMENTS]
+    assert len(BM25Index.load(str(tmp_path / "bm25"))) == 4
+
+
+def test_reciprocal_rank_scores():
+    scores = reciprocal_rank_scores([["a", "b"], ["b", "c"]], k=60)
+
+    assert scores["b"] == pytest.approx(1 / 62 + 1 / 61)
+    assert scores["a"] == pytest.approx(1 / 61)
+    assert scores["c"] == pytest.approx(1 / 62)
+    assert sorted(scores, key=scores.get, reverse=True) == ["b", "a", "c"]
+
+
+def test_hybrid_retrieval_adds_keyword_only_hits(index, embedder):
+    invalidate_retrieval_cache()
+    query = "Irene Adler"
+    query_vector = embedder.embed_query(query)
+    elsewhere = np.roll(query_vector, 1)
+    collection = FakeCollection("case_data", {"hnsw:space": "cosine"})
+    collection.add(
+        ids=[doc_id for doc_id, _ in DOCUMENTS],
+        metadatas=[{'text': text, 'filename': "scandal.txt"} for _, text in DOCUMENTS],
+        embeddings=[-query_vector, query_vector, elsewhere, elsewhere]
+    )
+
+    vector_only = retrieve_chunks(collection, query, k=2, candidates=2)
+    hybrid = retrieve_chunks(collection, query, k=2, keyword_index=index, candidates=2)
+
+    # c1 is the worst vector match but the only one naming Irene Adler
+    assert [hit['id'] for hit in vector_only] == ["c2", "c3"]
+    # Each tops one ranking; c3 is only second in the vector one
+    assert sorted(hit['id'] for hit in hybrid) == ["c1", "c2"]
+    assert [hit['score'] for hit in hybrid] == pytest.approx([1 / 61, 1 / 61], abs=1e-6)
+    assert next(hit for hit in hybrid if hit['id'] == "c1")['distance'] == pytest.approx(2.0)
+    assert next(hit for hit in hybrid if hit['id'] == "c1")['text'] == DOCUMENTS[0][1]
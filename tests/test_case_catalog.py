@@ -0,0 +1,111 @@
+import pytest
+
+from services import case_catalog as case_catalog_module
+from services.case_catalog import CHECKPOINT_CHARS, CaseCatalog, case_title
+
+
+@pytest.fixture
+def catalog(cases_dir, data_dir, embedder):
+    return CaseCatalog(str(cases_dir), str(data_dir / "case_catalog.json"), refresh_interval=0)
+
+
+def test_case_title_joins_a_split_heading():
+    text = "THE ADVENTURE OF THE\n\nBRUCE-PARTINGTON PLANS\n\nIn the third week of November..."
+
+    assert case_title(text, "bruc.txt") == "The Adventure of the Bruce-Partington Plans"
+    assert case_title("It was a dark night.", "the_red_headed_league.txt") == "The Red Headed League"
+
+
+def test_cases_list_public_fields(catalog):
+    cases = catalog.cases()
+
+    assert [case['filename'] for case in cases] == ["silver_blaze.txt", "the_red_headed_league.txt"]
+    assert set(cases[0]) == {'filename', 'title', 'size', 'characters', 'word_count', 'chunk_count'}
+    assert cases[0]['chunk_count'] >= 1
+
+
+def test_ranged_reads_of_non_ascii_text_match_slices(catalog, cases_dir):
+    text = "".join(f"Irène Adler {n} — café crème. " for n in range(1000))
+    (cases_dir / "scandal.txt").write_text(text, encoding="utf-8")
+    catalog.refresh()
+
+    assert len(text) > 3 * CHECKPOINT_CHARS
+    for offset, length in [(0, 10), (CHECKPOINT_CHARS - 3, 7), (2 * CHECKPOINT_CHARS + 5, 5000),
+                           (len(text) - 4, 100), (len(text) + 10, 5)]:
+        assert catalog.read("scandal.txt", offset, length) == text[offset:offset + length]
+    assert catalog.read("scandal.txt", 5) == text[5:]
+
+
+def test_crlf_files_are_read_as_text(catalog, cases_dir):
+    (cases_dir / "windows.txt").write_bytes(b"line one\r\nline two\r\n")
+    catalog.refresh()
+
+    assert catalog.read("windows.txt", 5, 8) == "one\nline"
+
+
+def test_missing_case_raises(catalog):
+    with pytest.raises(FileNotFoundError):
+        catalog.read("hound.txt")
+
+
+def test_unchanged_files_are_not_reread(catalog, cases_dir, data_dir, monkeypatch):
+    catalog.cases()
+    built = []
+    original = CaseCatalog._build_entry
+    monkeypatch.setattr(CaseCatalog, "_build_entry",
+                        lambda self, path, name, *args: built.append(name) or original(self, path, name, *args))
+
+    reopened = CaseCatalog(str(cases_dir), str(data_dir / "case_catalog.json"), refresh_interval=0)
+    etag = catalog.etag()
+    assert reopened.etag() == etag and built == []
+
+    (cases_dir / "silver_blaze.txt").write_text("Silver Blaze, edited.", encoding="utf-8")
+    assert reopened.refresh()
+    assert built == ["silver_blaze.txt"]
+    assert reopened.etag() != etag
+    assert reopened.read("silver_blaze.txt") == "Silver Blaze, edited."
+
+
+def test_rescans_wait_for_the_refresh_interval(cases_dir, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(case_catalog_module.time, "monotonic", lambda: now[0])
+    catalog = CaseCatalog(str(cases_dir), refresh_interval=10)
+    catalog.cases()
+    (cases_dir / "hound.txt").write_text("The hound of the Baskervilles.", encoding="utf-8")
+
+    assert len(catalog.cases()) == 2
+    now[0] += 10
+    assert len(catalog.cases()) == 3
+
+
+def test_case_list_is_served_with_an_etag(client):
+    response = client.get('/api/cases')
+    cached = client.get('/api/cases', headers={'If-None-Match': response.headers['ETag']})
+
+    assert response.status_code == 200 and response.get_json()['count'] == 2
+    assert cached.status_code == 304 and cached.get_data() == b""
+
+
+def test_case_content_is_paged(client, cases_dir):
+    text = (cases_dir / "silver_blaze.txt").read_text(encoding="utf-8")
+
+    first = client.get('/api/cases/silver_blaze', query_string={'length': 40}).get_json()
+    second = client.get('/api/cases/silver_blaze.txt',
+                        query_string={'offset': first['next_offset'], 'length': 1000}).get_json()
+
+    assert first['content'] == text[:40] and first['next_offset'] == 40
+    assert second['content'] == text[40:] and second['next_offset'] is None
+    assert second['full_length'] == len(text)
+
+
+def test_case_content_etag_and_errors(client):
+    response = client.get('/api/cases/silver_blaze', query_string={'length': 40})
+    cached = client.get('/api/cases/silver_blaze', query_string={'length': 40},
+                        headers={'If-None-Match': response.headers['ETag']})
+    other_page = client.get('/api/cases/silver_blaze', query_string={'offset': 40, 'length': 40},
+                            headers={'If-None-Match': response.headers['ETag']})
+
+    assert cached.status_code == 304
+    assert other_page.status_code == 200
+    assert client.get('/api/cases/hound').status_code == 404
+    assert client.get('/api/cases/silver_blaze', query_string={'offset': "x"}).status_code == 400
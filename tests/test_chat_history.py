@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from services.fake_llm import FakeLLM
+
+
+def add_turns(memory_service, session_id, count):
+    for n in range(1, count + 1):
+        memory_service.store_conversation(session_id, f"question {n}", f"answer {n}",
+                                          context={'case_chunk_ids': [f"chunk_{n}"]})
+
+
+def history(client, session_id="s1", **params):
+    return client.get(f'/api/chat/history/{session_id}', query_string=params)
+
+
+def test_history_pages_follow_the_cursor(client, flask_app):
+    add_turns(flask_app.memory_service, "s1", 5)
+
+    first = history(client, limit=2).get_json()
+    second = history(client, limit=2, cursor=first['next_cursor']).get_json()
+    last = history(client, limit=2, cursor=second['next_cursor']).get_json()
+
+    assert [item['user_message'] for item in first['history']] == ["question 5", "question 4"]
+    assert [item['user_message'] for item in second['history']] == ["question 3", "question 2"]
+    assert [item['user_message'] for item in last['history']] == ["question 1"]
+    assert last['next_cursor'] is None
+
+
+def test_history_leaves_context_out_unless_asked(client, flask_app):
+    add_turns(flask_app.memory_service, "s1", 1)
+
+    default = history(client).get_json()['history'][0]
+    projected = history(client, fields="user_message,context").get_json()['history'][0]
+
+    assert set(default) == {'seq', 'user_message', 'assistant_response', 'timestamp'}
+    assert projected == {'seq': 1, 'user_message': "question 1", 'context': {'case_chunk_ids': ["chunk_1"]}}
+
+
+@pytest.mark.parametrize("params", [{'limit': "ten"}, {'cursor': "abc"}, {'fields': "user_message,embedding"}])
+def test_bad_history_parameters_are_rejected(client, params):
+    response = history(client, **params)
+
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_page_size_is_capped(client, flask_app, offline_config, monkeypatch):
+    monkeypatch.setattr(offline_config, "HISTORY_MAX_PAGE_SIZE", 3)
+    add_turns(flask_app.memory_service, "s1", 5)
+
+    page = history(client, limit=100).get_json()
+
+    assert len(page['history']) == 3
+    assert page['next_cursor'] == "3"
+
+
+def test_stored_turns_keep_chunk_ids_not_passages(chat_service):
+    cases = chat_service.get_case_collection()
+    cases.add(ids=["silver_blaze_0"], documents=["The dog did nothing in the night-time."],
+              metadatas=[{'filename': "silver_blaze.txt", 'story': "Silver Blaze",
+                          'text': "The dog did nothing in the night-time."}])
+    chat_service.llm.provider = FakeLLM(reply="The curious incident of the dog.")
+
+    chat_service.process_message("What did the dog do in the night-time?", "s1")
+
+    context = chat_service.memory_service.get_chat_history("s1", fields=["context"])[0]['context']
+    assert context['case_chunk_ids'] == ["silver_blaze_0"]
+    assert "night-time" not in json.dumps(context)
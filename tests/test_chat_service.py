@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+from services.fake_llm import FakeLLM
+
+
+def test_retrievals_run_concurrently(chat_service, monkeypatch):
+    # Each retrieval waits for the other two; run one after another they would time out
+    barrier = threading.Barrier(3, timeout=2)
+
+    def waiting(result):
+        def retrieve(*args):
+            barrier.wait()
+            return result
+        return retrieve
+
+    monkeypatch.setattr(chat_service, "_get_similar_memory", waiting([]))
+    monkeypatch.setattr(chat_service, "_get_case_context", waiting([]))
+    monkeypatch.setattr(chat_service, "_get_conversation_summary", waiting(("", 0)))
+
+    build = chat_service._prepare_prompt("Who stole the horse?", "s1", {}, [])
+
+    assert "Who stole the horse?" in build.prompt
+    assert barrier.n_waiting == 0 and not barrier.broken
+
+
+def test_process_message_answers_and_stores_turn(chat_service):
+    chat_service.llm.provider = FakeLLM(reply="The dog did nothing in the night-time.")
+
+    answer = chat_service.process_message("What was curious?", "s1", {'name': "Watson"})
+
+    assert answer == "The dog did nothing in the night-time."
+    turns = chat_service.memory_service.get_recent_conversations("s1")
+    assert [(turn['user_message'], turn['assistant_response']) for turn in turns] == [
+        ("What was curious?", "The dog did nothing in the night-time.")
+    ]
+
+
+def test_failing_retrieval_fails_the_message(chat_service, monkeypatch):
+    def broken(*args):
+        raise RuntimeError("memory unavailable")
+
+    monkeypatch.setattr(chat_service, "_get_similar_memory", broken)
+
+    with pytest.raises(RuntimeError, match="memory unavailable"):
+        chat_service.process_message("Hello", "s1")
+    assert chat_service.memory_service.get_recent_conversations("s1") == []
@@ -0,0 +1,55 @@
+from services.fake_llm import FakeLLM
+from conftest import sse_events
+
+
+def stream(client, message="What do you make of the red-headed league?", **body):
+    return client.post('/api/chat/stream', json={'message': message, **body})
+
+
+def test_stream_sends_chunks_then_done(client, flask_app):
+    flask_app.chat_service.llm.provider = FakeLLM(reply="You have been in Afghanistan, I perceive.", chunk_words=2)
+
+    response = stream(client, session_id="s1")
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    events = sse_events(response)
+    assert [event for event, _ in events] == ['chunk'] * 4 + ['done']
+    assert "".join(data['text'] for _, data in events[:-1]) == "You have been in Afghanistan, I perceive."
+    assert events[-1][1]['session_id'] == "s1"
+
+
+def test_streamed_turn_is_stored(client, flask_app):
+    stream(client, session_id="s1").get_data()
+
+    turns = flask_app.memory_service.get_recent_conversations("s1", limit=5)
+    assert [turn['user_message'] for turn in turns] == ["What do you make of the red-headed league?"]
+
+
+def test_llm_unavailable_sends_error_event(client, flask_app):
+    flask_app.chat_service.llm.provider.failure_rate = 1.0
+
+    events = sse_events(stream(client))
+
+    assert [event for event, _ in events] == ['error']
+    assert events[0][1]['error'] == 'Service temporarily unavailable'
+    assert events[0][1]['retry_after'] >= 1
+
+
+def test_failure_mid_stream_ends_with_error_event(client, flask_app, monkeypatch):
+    def broken_stream(message, session_id, user_context=None):
+        yield "Data! Data! "
+        raise RuntimeError("index went away")
+
+    monkeypatch.setattr(flask_app.chat_service, "stream_message", broken_stream)
+
+    events = sse_events(stream(client))
+
+    assert events == [('chunk', {'text': "Data! Data! "}), ('error', {'error': 'Internal server error'})]
+
+
+def test_empty_message_is_rejected(client):
+    response = stream(client, message="   ")
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Message cannot be empty'}
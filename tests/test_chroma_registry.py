@@ -0,0 +1,81 @@
+import threading
+
+from services import chroma_registry as registry_module
+from services.chroma_registry import COLLECTION_METADATA, ChromaRegistry
+from services.memory_service import MemoryService
+from services.session_store import create_session_store
+from utils.config import Config
+
+
+def test_one_client_and_collection_per_name(chroma_registry):
+    memory = chroma_registry.get_collection("chat_memory")
+
+    assert chroma_registry.get_collection("chat_memory") is memory
+    assert chroma_registry.get_collection("case_data") is not memory
+    assert chroma_registry.created == [('path', Config.CHROMA_DB_PATH)]
+
+
+def test_services_share_the_registry_collections(chroma_registry, monkeypatch):
+    monkeypatch.setattr(Config, "WRITE_BEHIND_ENABLED", False)
+    store = create_session_store(Config, chroma_registry)
+    memory = MemoryService(registry=chroma_registry, session_store=store)
+
+    assert memory.memory_collection is chroma_registry.get_collection("chat_memory")
+    assert store.session_collection is chroma_registry.get_collection("session_data")
+    assert len(chroma_registry.created) == 1
+
+
+def test_collections_get_fixed_metadata_and_the_shared_embedder(chroma_registry, embedder):
+    for name in ("case_data", "chat_memory", "session_data"):
+        chroma_registry.get_collection(name)
+    client = chroma_registry.get_client()
+    kwargs = {name: options for _, name, options in client.calls}
+
+    assert kwargs["case_data"] == {'embedding_function': embedder}
+    assert kwargs["chat_memory"] == {'metadata': COLLECTION_METADATA["chat_memory"], 'embedding_function': embedder}
+    assert kwargs["session_data"] == {'metadata': COLLECTION_METADATA["session_data"]}
+
+
+def test_server_host_shares_a_remote_client_but_paths_stay_local(chroma_registry, monkeypatch):
+    monkeypatch.setattr(Config, "CHROMA_SERVER_HOST", "chroma.internal")
+    monkeypatch.setattr(Config, "CHROMA_SERVER_PORT", 8000)
+
+    chroma_registry.get_collection("chat_memory")
+    chroma_registry.get_collection("case_data", path="snapshots/v1")
+
+    assert chroma_registry.created == [('http', "chroma.internal", 8000), ('path', "snapshots/v1")]
+
+
+def test_concurrent_first_use_opens_one_client(chroma_registry):
+    barrier = threading.Barrier(8)
+    collections = []
+
+    def open_collection():
+        barrier.wait()
+        collections.append(chroma_registry.get_collection("chat_memory"))
+
+    threads = [threading.Thread(target=open_collection) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(chroma_registry.created) == 1
+    assert all(collection is collections[0] for collection in collections)
+
+
+def test_reset_reopens(chroma_registry):
+    first = chroma_registry.get_collection("chat_memory")
+    chroma_registry.reset()
+
+    assert chroma_registry.get_collection("chat_memory") is not first
+    assert len(chroma_registry.created) == 2
+
+
+def test_get_registry_is_process_wide(monkeypatch):
+    monkeypatch.setattr(registry_module, "_registry", None)
+
+    registry = registry_module.get_registry()
+
+    assert isinstance(registry, ChromaRegistry)
+    assert registry_module.get_registry() is registry
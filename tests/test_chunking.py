@@ -0,0 +1,80 @@
+import pytest
+
+from services.chunking import Chunker, title_case
+
+
+def words(count, prefix="w"):
+    return " ".join(f"{prefix}{n}" for n in range(count))
+
+
+def test_title_case():
+    assert title_case("THE ENGINEER'S THUMB") == "The Engineer's Thumb"
+    assert title_case("THE ADVENTURE OF THE BLUE CARBUNCLE") == "The Adventure of the Blue Carbuncle"
+    assert title_case("THE RED-HEADED LEAGUE") == "The Red-Headed League"
+    assert title_case("A SCANDAL IN BOHEMIA") == "A Scandal in Bohemia"
+
+
+def test_overlap_must_be_smaller_than_window():
+    with pytest.raises(ValueError):
+        Chunker(max_tokens=10, overlap_tokens=10)
+
+
+def test_windows_are_bounded_and_overlap():
+    text = words(50)
+    chunks = Chunker(max_tokens=20, overlap_tokens=5).chunk(text)
+
+    assert [chunk.token_count for chunk in chunks] == [20, 20, 20]
+    assert chunks[0].text.split()[-5:] == chunks[1].text.split()[:5]
+    assert chunks[-1].text.split()[-1] == "w49"
+    assert [chunk.index for chunk in chunks] == [0, 1, 2]
+
+
+def test_offsets_point_into_the_text():
+    text = "Preface.\n\n" + words(30) + "\n\n" + words(30, "v")
+    for chunk in Chunker(max_tokens=16, overlap_tokens=4).chunk(text):
+        assert text[chunk.start:chunk.end] == chunk.text
+
+
+def test_window_end_snaps_to_paragraph_break():
+    text = words(12) + "\n\n" + words(12, "v")
+    chunks = Chunker(max_tokens=16, overlap_tokens=0).chunk(text)
+
+    assert chunks[0].text == words(12)
+    assert chunks[1].text == words(12, "v")
+
+
+def test_window_end_snaps_to_sentence_end():
+    text = words(10) + ". " + words(10, "v")
+    chunks = Chunker(max_tokens=16, overlap_tokens=0).chunk(text)
+
+    assert chunks[0].text.endswith("w9.")
+
+
+def test_headings_split_sections_and_label_chunks():
+    text = (
+        "                    THE ADVENTURE OF THE\n"
+        "                    BRUCE-PARTINGTON PLANS\n\n"
+        "Fog lay over London.\n\n"
+        "CHAPTER I.\n\n"
+        "Mycroft came to Baker Street.\n\n"
+        "CHAPTER II\n\n"
+        "The plans were missing.\n"
+    )
+    chunks = Chunker(max_tokens=50, overlap_tokens=10).chunk(text)
+
+    assert [(chunk.text, chunk.story, chunk.chapter) for chunk in chunks] == [
+        ("Fog lay over London.", "The Adventure of the Bruce-Partington Plans", None),
+        ("Mycroft came to Baker Street.", "The Adventure of the Bruce-Partington Plans", "CHAPTER I."),
+        ("The plans were missing.", "The Adventure of the Bruce-Partington Plans", "CHAPTER II"),
+    ]
+
+
+def test_metadata_has_no_none_values():
+    metadata = Chunker().chunk("Elementary, my dear Watson.")[0].metadata()
+
+    assert metadata == {"chunk_index": 0, "start": 0, "end": 27, "story": "", "chapter": "",
+                        "token_count": 4}
+
+
+def test_version_names_the_window_settings():
+    assert Chunker(200, 40).version != Chunker(100, 40).version
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from services.embedding_provider import EmbeddingProvider, query_embedding_cache
+from conftest import FakeEmbeddingProvider
+
+
+def test_provider_without_encode_cannot_be_instantiated():
+    class Incomplete(EmbeddingProvider):
+        model_id = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_embed_batches_and_normalizes():
+    provider = FakeEmbeddingProvider(batch_size=2)
+
+    vectors = provider.embed(["alpha", "beta", "gamma", "delta", "alpha beta"])
+
+    assert provider.batches == [2, 2, 1]
+    assert vectors.shape == (5, provider.dim)
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+
+
+def test_embed_empty_list():
+    assert FakeEmbeddingProvider().embed([]).shape == (0, 0)
+
+
+def test_query_vectors_are_cached_by_normalized_text(embedder):
+    first = embedder.embed_query("who  wrote the\tfox story")
+    second = embedder.embed_query("who wrote the fox story")
+
+    assert embedder.batches == [1]
+    assert np.array_equal(first, second)
+    assert not second.flags.writeable
+    assert query_embedding_cache.get((embedder.model_id, "who wrote the fox story")) is not None
+
+
+def test_embed_queries_encodes_only_misses_once(embedder):
+    embedder.embed_query("fox")
+
+    vectors = embedder.embed_queries(["fox", "hen", "hen", "owl"])
+
+    assert embedder.batches == [1, 2]
+    assert vectors.shape == (4, embedder.dim)
+    assert np.array_equal(vectors[1], vectors[2])
+
+
+def test_call_matches_chroma_embedding_function(embedder):
+    rows = embedder(["fox", "hen"])
+
+    assert isinstance(rows, list) and isinstance(rows[0], list)
+    assert np.allclose(rows, embedder.embed(["fox", "hen"]))
@@ -0,0 +1,201 @@
+import os
+
+import pytest
+
+from conftest import FakeCollection, FakeEmbeddingProvider
+from services import ingestion
+from services.chunking import Chunker
+from services.ingestion import IngestionManifest, chunk_ids, ingest_cases
+
+
+def paragraphs(*texts):
+    return "\n\n".join(texts)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """Two cases whose eight-word paragraphs each make one chunk."""
+    path = tmp_path / "cases"
+    path.mkdir()
+    (path / "silver_blaze.txt").write_text(paragraphs(
+        "The racehorse Silver Blaze vanished from King's Pyland.",
+        "Its trainer John Straker was found dead outside.",
+        "The dog did nothing in the night-time, Holmes."
+    ), encoding="utf-8")
+    (path / "the_red_headed_league.txt").write_text(paragraphs(
+        "Jabez Wilson answered the advertisement in the Chronicle.",
+        "The League of Red-Headed Men was dissolved today."
+    ), encoding="utf-8")
+    (path / "notes.md").write_text("not a case", encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def ingest(corpus, tmp_path):
+    collection = FakeCollection("case_data")
+    manifest_path = str(tmp_path / "index" / "ingest_manifest.json")
+
+    def run(provider=None, chunker=None, **options):
+        provider = provider or FakeEmbeddingProvider()
+        stats = ingest_cases(collection, str(corpus), manifest_path, provider=provider,
+                             chunker=chunker or Chunker(max_tokens=10, overlap_tokens=0), **options)
+        return stats, provider
+
+    run.collection = collection
+    run.manifest_path = manifest_path
+    return run
+
+
+def test_chunk_ids_are_content_addressed():
+    ids = chunk_ids("a.txt", ["same", "other", "same"])
+
+    assert ids[0] != ids[1]
+    assert ids[2] == ids[0] + "_1"
+    assert chunk_ids("a.txt", ["same"]) == ids[:1]
+
+
+def test_first_run_embeds_every_chunk(ingest):
+    stats, provider = ingest()
+
+    assert stats['files_seen'] == 2 and stats['files_changed'] == 2
+    assert stats['chunks_added'] == ingest.collection.count() == sum(provider.batches)
+    manifest = IngestionManifest(ingest.manifest_path)
+    assert sorted(manifest.files) == ["silver_blaze.txt", "the_red_headed_league.txt"]
+    assert sorted(id for entry in manifest.files.values() for id in entry['chunks']) == sorted(ingest.collection.records)
+    metadata = next(iter(ingest.collection.records.values()))
+    assert metadata['embedding_model'] == FakeEmbeddingProvider.model_id
+    assert metadata['chunker_version'] == Chunker(10, 0).version
+
+
+def test_unchanged_corpus_embeds_nothing(ingest):
+    first, _ = ingest()
+    stats, provider = ingest()
+
+    assert provider.batches == []
+    assert stats['files_changed'] == 0
+    assert stats['chunks_kept'] == first['chunks_added']
+
+
+def test_touched_file_is_rehashed_but_not_reembedded(ingest, corpus):
+    ingest()
+    path = corpus / "silver_blaze.txt"
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 10 ** 9))
+
+    stats, provider = ingest()
+
+    assert provider.batches == []
+    assert stats['files_changed'] == 1 and stats['chunks_added'] == 0
+    assert IngestionManifest(ingest.manifest_path).files["silver_blaze.txt"]['mtime_ns'] == path.stat().st_mtime_ns
+
+
+def test_edited_file_embeds_only_new_chunks(ingest, corpus):
+    ingest()
+    before = set(ingest.collection.records)
+    (corpus / "silver_blaze.txt").write_text(paragraphs(
+        "The racehorse Silver Blaze vanished from King's Pyland.",
+        "Its trainer John Straker was found dead outside.",
+        "Holmes noticed the curried mutton served that night."
+    ), encoding="utf-8")
+
+    stats, provider = ingest()
+
+    assert stats['chunks_added'] == sum(provider.batches) == 1
+    assert stats['chunks_deleted'] == 1
+    after = set(ingest.collection.records)
+    assert len(after - before) == 1 and len(before - after) == 1
+
+
+def test_removed_file_loses_its_chunks(ingest, corpus):
+    ingest()
+    (corpus / "the_red_headed_league.txt").unlink()
+
+    stats, _ = ingest()
+
+    assert stats['files_removed'] == 1
+    assert {metadata['filename'] for metadata in ingest.collection.records.values()} == {"silver_blaze.txt"}
+    assert list(IngestionManifest(ingest.manifest_path).files) == ["silver_blaze.txt"]
+
+
+def test_new_embedding_model_reembeds_everything(ingest):
+    first, _ = ingest()
+
+    class OtherModel(FakeEmbeddingProvider):
+        model_id = "another-model"
+
+    stats, provider = ingest(provider=OtherModel())
+
+    assert stats['chunks_added'] == first['chunks_added'] == sum(provider.batches)
+    assert stats['chunks_deleted'] == first['chunks_added']
+    assert {metadata['embedding_model'] for metadata in ingest.collection.records.values()} == {"another-model"}
+
+
+def test_interrupted_run_reingests_the_file_next_time(ingest, monkeypatch):
+    def failing_store(*args, **kwargs):
+        raise RuntimeError("embedding server went away")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(ingestion, "store_chunks", failing_store)
+        with pytest.raises(RuntimeError):
+            ingest()
+
+    stats, _ = ingest()
+
+    assert stats['files_changed'] == 2
+    assert stats['chunks_added'] == ingest.collection.count()
+
+
+def test_unreadable_manifest_starts_over(ingest):
+    ingest()
+    with open(ingest.manifest_path, "w", encoding="utf-8") as file:
+        file.write("{not json")
+
+    stats, _ = ingest()
+
+    assert stats['files_changed'] == 2
+
+
+@pytest.fixture
+def many_files(corpus):
+    for n in range(20):
+        (corpus / f"case_{n:02d}.txt").write_text(f"Case number {n} was solved by deduction.", encoding="utf-8")
+    return corpus
+
+
+def test_chunks_from_several_files_share_batches(ingest, many_files):
+    stats, provider = ingest(batch_size=8)
+
+    assert stats['chunks_added'] == 25
+    assert provider.batches == [8, 8, 8, 1]
+
+
+def test_files_in_memory_are_bounded(ingest, many_files, monkeypatch):
+    planned, applied, outstanding = [], [], []
+    plan_file, apply_plan = ingestion._plan_file, ingestion._apply_plan
+
+    def tracked_plan(filename, *args):
+        planned.append(filename)
+        return plan_file(filename, *args)
+
+    def tracked_apply(collection, manifest, plan, *args):
+        outstanding.append(len(planned) - len(applied))
+        applied.append(plan['filename'])
+        return apply_plan(collection, manifest, plan, *args)
+
+    monkeypatch.setattr(ingestion, "_plan_file", tracked_plan)
+    monkeypatch.setattr(ingestion, "_apply_plan", tracked_apply)
+
+    ingest(read_workers=4, max_inflight_files=3)
+
+    assert sorted(applied) == sorted(planned) and len(applied) == 22
+    assert max(outstanding) <= 3
+
+
+def test_parallel_readers_store_the_same_index(ingest, many_files, tmp_path):
+    ingest(read_workers=1, max_inflight_files=1)
+    serial = {id: metadata['text'] for id, metadata in ingest.collection.records.items()}
+
+    parallel = FakeCollection("case_data")
+    ingest_cases(parallel, str(many_files), str(tmp_path / "parallel.json"), provider=FakeEmbeddingProvider(),
+                 chunker=Chunker(max_tokens=10, overlap_tokens=0), read_workers=8, max_inflight_files=8)
+
+    assert {id: metadata['text'] for id, metadata in parallel.records.items()} == serial
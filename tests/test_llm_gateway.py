@@ -0,0 +1,216 @@
+import threading
+import time
+
+import pytest
+
+from services.fake_llm import FakeChunk, FakeLLM, FakeLLMError
+from services.llm_gateway import CircuitBreaker, LLMGateway, LLMTimeoutError, LLMUnavailableError, is_transient
+
+
+class ScriptedLLM:
+    """Provider that raises or answers according to a script, one entry per call."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+
+    def generate_content(self, prompt, stream=False):
+        self.calls += 1
+        outcome = self.script.pop(0) if self.script else "ok"
+        if isinstance(outcome, Exception):
+            raise outcome
+        if stream:
+            return iter(outcome)
+        return outcome
+
+
+class BrokenStream:
+    """Stream that yields chunks and then fails with error."""
+
+    def __init__(self, chunks, error):
+        self.chunks = chunks
+        self.error = error
+
+    def generate_content(self, prompt, stream=False):
+        def chunks():
+            yield from self.chunks
+            raise self.error
+        return chunks()
+
+
+def gateway(provider, **options):
+    options.setdefault('backoff', 0.0)
+    options.setdefault('breaker', CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    return LLMGateway(provider, **options)
+
+
+def test_transient_errors():
+    assert is_transient(ConnectionError())
+    assert is_transient(LLMTimeoutError("slow"))
+    assert not is_transient(LLMUnavailableError("busy"))
+    assert not is_transient(ValueError("bad prompt"))
+
+
+def test_transient_failure_is_retried():
+    provider = ScriptedLLM(FakeLLMError("dropped"), "answer")
+    llm = gateway(provider, max_retries=2)
+
+    assert llm.generate_content("prompt") == "answer"
+    assert provider.calls == 2
+    assert llm.stats()['retries'] == 1
+    assert llm.stats()['circuit']['consecutive_failures'] == 0
+
+
+def test_retries_exhausted_raise_unavailable():
+    llm = gateway(ScriptedLLM(*[FakeLLMError("dropped")] * 3), max_retries=1)
+
+    with pytest.raises(LLMUnavailableError):
+        llm.generate_content("prompt")
+    assert llm.stats()['failures'] == 1
+
+
+def test_breaker_opens_and_short_circuits():
+    provider = ScriptedLLM(*[FakeLLMError("dropped")] * 2)
+    llm = gateway(provider, max_retries=0)
+
+    for _ in range(2):
+        with pytest.raises(LLMUnavailableError):
+            llm.generate_content("prompt")
+    with pytest.raises(LLMUnavailableError) as raised:
+        llm.generate_content("prompt")
+
+    assert provider.calls == 2
+    assert raised.value.retry_after > 0
+    assert llm.stats()['short_circuited'] == 1
+    assert llm.stats()['circuit']['state'] == 'open'
+
+
+def test_half_open_trial_closes_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    llm = gateway(ScriptedLLM(FakeLLMError("dropped"), "answer"), max_retries=0, breaker=breaker)
+
+    with pytest.raises(LLMUnavailableError):
+        llm.generate_content("prompt")
+    assert breaker.state == 'half-open'
+    assert llm.generate_content("prompt") == "answer"
+    assert breaker.state == 'closed'
+
+
+def test_bad_request_is_not_retried_and_leaves_failure_count():
+    provider = ScriptedLLM(FakeLLMError("dropped"), ValueError("bad prompt"))
+    llm = gateway(provider, max_retries=0)
+
+    with pytest.raises(LLMUnavailableError):
+        llm.generate_content("prompt")
+    with pytest.raises(ValueError):
+        llm.generate_content("prompt")
+
+    assert provider.calls == 2
+    assert llm.stats()['circuit']['consecutive_failures'] == 1
+
+
+def test_bad_request_does_not_close_half_open_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    llm = gateway(ScriptedLLM(FakeLLMError("dropped"), ValueError("bad prompt")), max_retries=0, breaker=breaker)
+
+    with pytest.raises(LLMUnavailableError):
+        llm.generate_content("prompt")
+    with pytest.raises(ValueError):
+        llm.generate_content("prompt")
+
+    # The trial slot is given back, but the circuit stays half-open
+    assert breaker.state == 'half-open'
+    breaker.allow()
+
+
+def test_slow_call_times_out():
+    llm = gateway(FakeLLM(first_token_delay=0.5), timeout=0.05, max_retries=0)
+
+    with pytest.raises(LLMTimeoutError):
+        llm.generate_content("prompt")
+    assert llm.stats()['timeouts'] == 1
+
+
+def test_deadline_bounds_retries():
+    llm = gateway(FakeLLM(first_token_delay=0.3), timeout=0.05, deadline=0.12, max_retries=10)
+
+    started = time.monotonic()
+    with pytest.raises(LLMUnavailableError):
+        llm.generate_content("prompt")
+    assert time.monotonic() - started < 0.3
+
+
+def test_concurrency_limit_rejects_when_slots_stay_busy():
+    release = threading.Event()
+
+    class Blocking:
+        def generate_content(self, prompt, stream=False):
+            release.wait(2)
+            return "answer"
+
+    llm = gateway(Blocking(), max_concurrency=1, queue_timeout=0.05, max_retries=0)
+    first = threading.Thread(target=llm.generate_content, args=("prompt",))
+    first.start()
+    time.sleep(0.05)
+    try:
+        with pytest.raises(LLMUnavailableError):
+            llm.generate_content("prompt")
+        assert llm.stats()['rejected'] == 1
+    finally:
+        release.set()
+        first.join()
+    assert llm.stats()['in_flight'] == 0
+
+
+def test_stream_yields_all_chunks_and_frees_slot():
+    llm = gateway(FakeLLM(reply="one two three four", chunk_words=1), max_concurrency=1)
+
+    chunks = [chunk.text for chunk in llm.generate_content("prompt", stream=True)]
+
+    assert chunks == ["one ", "two ", "three ", "four"]
+    assert llm.stats()['in_flight'] == 0
+
+
+def test_stream_retries_before_first_chunk():
+    provider = ScriptedLLM(FakeLLMError("dropped"), [FakeChunk("Elementary")])
+    llm = gateway(provider, max_retries=1)
+
+    assert [chunk.text for chunk in llm.generate_content("prompt", stream=True)] == ["Elementary"]
+    assert provider.calls == 2
+
+
+def test_stream_failure_after_first_chunk_counts_against_breaker():
+    llm = gateway(BrokenStream([FakeChunk("Data! ")], FakeLLMError("dropped")), max_concurrency=1)
+
+    for _ in range(2):
+        received = []
+        with pytest.raises(FakeLLMError):
+            for chunk in llm.generate_content("prompt", stream=True):
+                received.append(chunk.text)
+        assert received == ["Data! "]
+
+    stats = llm.stats()
+    assert stats['failures'] == 2
+    assert stats['circuit']['state'] == 'open'
+    assert stats['in_flight'] == 0
+
+
+def test_stream_stall_between_chunks_times_out():
+    llm = gateway(FakeLLM(reply="one two", chunk_words=1, chunk_delay=0.5), timeout=0.05)
+
+    stream = llm.generate_content("prompt", stream=True)
+    assert next(stream).text == "one "
+    with pytest.raises(LLMTimeoutError):
+        next(stream)
+    assert llm.stats()['failures'] == 1
+
+
+def test_abandoned_stream_is_not_a_failure():
+    llm = gateway(FakeLLM(reply="one two three", chunk_words=1))
+
+    stream = llm.generate_content("prompt", stream=True)
+    next(stream)
+    stream.close()
+
+    assert llm.stats()['failures'] == 0
+    assert llm.stats()['circuit']['consecutive_failures'] == 0
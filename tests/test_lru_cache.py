@@ -0,0 +1,94 @@
+import pytest
+
+from conftest import FakeCollection
+from services import retrieval
+from services.retrieval import invalidate_retrieval_cache, retrieval_cache_stats, retrieve_chunks
+from utils.lru_cache import LRUCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("utils.lru_cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(max_size=2, ttl=10)
+    cache.put("a", 1)
+
+    now[0] += 9
+    assert cache.get("a") == 1
+    now[0] += 2
+    assert cache.get("a", "gone") == "gone"
+    assert len(cache) == 0
+
+
+def test_stats_and_clear():
+    cache = LRUCache(max_size=4)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("b")
+    cache.clear()
+
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 0, 'capacity': 4}
+
+
+class CountingCollection(FakeCollection):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.queries = 0
+
+    def query(self, **kwargs):
+        self.queries += 1
+        return super().query(**kwargs)
+
+
+@pytest.fixture
+def collection(embedder):
+    invalidate_retrieval_cache()
+    collection = CountingCollection("case_data", {"hnsw:space": "cosine"})
+    collection.add(ids=["c1", "c2"], metadatas=[{'text': "The speckled band was a swamp adder."},
+                                               {'text': "The hound was painted with phosphorus."}])
+    yield collection
+    invalidate_retrieval_cache()
+
+
+def test_repeated_retrieval_is_served_from_cache(collection):
+    first = retrieve_chunks(collection, "what was the speckled band", k=1)
+    first[0]['text'] = "changed by the caller"
+    second = retrieve_chunks(collection, "what was  the speckled band", k=1)
+
+    assert collection.queries == 1
+    assert second[0]['id'] == "c1" and second[0]['text'] == "The speckled band was a swamp adder."
+    assert retrieval_cache_stats()['hits'] == 1
+
+
+def test_cache_is_keyed_by_options_and_cleared_on_invalidate(collection):
+    retrieve_chunks(collection, "hound", k=1)
+    retrieve_chunks(collection, "hound", k=2)
+    retrieve_chunks(collection, "hound", k=1, where={"filename": "houn.txt"})
+    assert collection.queries == 3
+
+    invalidate_retrieval_cache()
+    retrieve_chunks(collection, "hound", k=1)
+    assert collection.queries == 4
+
+
+def test_retrieval_errors_are_not_cached(collection, monkeypatch):
+    def broken(*args, **kwargs):
+        raise ValueError("index corrupt")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(retrieval, "_search", broken)
+        with pytest.raises(RuntimeError):
+            retrieve_chunks(collection, "hound", k=1)
+
+    assert retrieve_chunks(collection, "hound", k=1)[0]['id'] == "c2"
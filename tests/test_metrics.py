@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils import metrics
+from utils.metrics import MetricsRegistry, STAGE_ERRORS, STAGE_SECONDS, in_context, timed, trace, traced
+
+
+def sample(metric, name, **labels):
+    """Value of one sample of a metric, or None."""
+    for sample_name, sample_labels, value in metric.samples():
+        if sample_name == name and sample_labels == labels:
+            return value
+    return None
+
+
+def test_render_uses_the_prometheus_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests served", ("route",))
+    registry.gauge("in_flight", "Requests running").set(3)
+    latency = registry.histogram("latency_seconds", "Request latency", buckets=(0.1, 1.0))
+    requests.inc(route='/api/chat')
+    requests.inc(2, route='/api/chat')
+    requests.inc(route='say "hi"\n')
+    for seconds in (0.05, 0.5, 5.0):
+        latency.observe(seconds)
+
+    lines = registry.render().splitlines()
+
+    assert lines[:2] == ["# HELP requests_total Requests served", "# TYPE requests_total counter"]
+    assert 'requests_total{route="/api/chat"} 3.0' in lines
+    assert 'requests_total{route="say \\"hi\\"\\n"} 1.0' in lines
+    assert "in_flight 3.0" in lines
+    assert [line for line in lines if line.startswith("latency_seconds")] == [
+        'latency_seconds_bucket{le="0.1"} 1.0', 'latency_seconds_bucket{le="1.0"} 2.0',
+        'latency_seconds_bucket{le="+Inf"} 3.0', "latency_seconds_sum 5.55", "latency_seconds_count 3.0",
+    ]
+
+
+def test_metrics_are_registered_once_per_name():
+    registry = MetricsRegistry()
+
+    assert registry.counter("events_total", "Events") is registry.counter("events_total", "Events")
+    with pytest.raises(ValueError):
+        registry.gauge("events_total", "Events")
+
+
+def test_collectors_are_read_at_render_time():
+    registry = MetricsRegistry()
+    depth = [1]
+    registry.register_collector(lambda: [("queue_depth", "gauge", "Queued items", [({'queue': "jobs"}, depth[0])])])
+
+    depth[0] = 7
+
+    assert 'queue_depth{queue="jobs"} 7.0' in registry.render().splitlines()
+
+
+def test_timed_and_traced_record_stages_and_errors():
+    @traced("test.traced")
+    def work(fail=False):
+        if fail:
+            raise RuntimeError("boom")
+        return "done"
+
+    with timed("test.timed"):
+        pass
+    assert work() == "done"
+    with pytest.raises(RuntimeError):
+        work(fail=True)
+
+    assert sample(STAGE_SECONDS, "sherlock_stage_duration_seconds_count", stage="test.timed") >= 1
+    assert sample(STAGE_SECONDS, "sherlock_stage_duration_seconds_count", stage="test.traced") >= 2
+    assert sample(STAGE_ERRORS, "sherlock_stage_errors_total", stage="test.traced") >= 1
+    assert work.__name__ == "work"
+
+
+def test_trace_gathers_stages_from_pool_threads():
+    def retrieve():
+        with timed("test.retrieve"):
+            pass
+
+    with ThreadPoolExecutor(max_workers=2) as executor, trace() as request_trace:
+        with timed("test.request"):
+            executor.submit(in_context(retrieve)).result()
+            # Without in_context the pool thread does not see the request's trace
+            executor.submit(retrieve).result()
+
+    assert sorted(stage for stage, _ in request_trace.stages) == ["test.request", "test.retrieve"]
+    assert "test.request=" in request_trace.summary()
+
+
+def test_disabled_metrics_leave_functions_unwrapped(monkeypatch):
+    monkeypatch.setattr(metrics.registry, "enabled", False)
+
+    def work():
+        return "done"
+
+    assert traced("test.disabled")(work) is work
+    assert in_context(work) is work
+    with trace() as request_trace, timed("test.disabled"):
+        pass
+    assert request_trace is None
+    assert sample(STAGE_SECONDS, "sherlock_stage_duration_seconds_count", stage="test.disabled") is None
+
+
+def test_metrics_endpoint_exports_stages_and_service_stats(client):
+    client.post('/api/chat', json={'message': "What of the speckled band?", 'session_id': "s1"})
+
+    response = client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    body = response.get_data(as_text=True)
+    assert 'sherlock_stage_duration_seconds_count{stage="chat.process_message"}' in body
+    assert 'sherlock_cache_misses_total{cache="retrieval"}' in body
+    assert 'sherlock_llm_circuit_state{state="closed"} 1.0' in body
+
+
+def test_metrics_endpoint_is_off_when_disabled(client, flask_app, monkeypatch):
+    monkeypatch.setattr(flask_app.metrics, "enabled", False)
+
+    assert client.get('/metrics').status_code == 404
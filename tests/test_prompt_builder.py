@@ -0,0 +1,79 @@
+from services.prompt_builder import PromptBuilder, count_tokens, truncate_tokens
+
+
+def render(query, memory_context, case_context, session_context):
+    return (f"Context: {session_context}\nMemory:\n{memory_context}\n"
+            f"Cases:\n{case_context}\nQuestion: {query}")
+
+
+def chunk(chunk_id, text):
+    return {'id': chunk_id, 'text': text}
+
+
+def past_turn(turn_id, question, answer="Elementary."):
+    return {'turn_id': turn_id, 'user_message': question, 'assistant_response': answer}
+
+
+def test_truncate_tokens_cuts_at_a_word_and_marks_the_cut():
+    text = "the quick brown fox jumps over the lazy dog " * 10
+
+    cut = truncate_tokens(text, 5)
+
+    assert cut.endswith(" ...")
+    assert text.startswith(cut[:-4])
+    assert cut[:-4].endswith("fox")
+    assert truncate_tokens("short", 5) == "short"
+
+
+def test_prompt_stays_within_the_budget():
+    chunks = [chunk(f"c{n}", f"Passage {n} about the hound on the moor " * 5) for n in range(20)]
+    builder = PromptBuilder(render, budget=200)
+
+    build = builder.build("Who owned the hound?", "user: Watson", [], [], chunks)
+
+    assert count_tokens(build.prompt) <= 200
+    assert 0 < len(build.case_chunks) < 20
+    assert build.breakdown['dropped'] == 20 - len(build.case_chunks)
+    assert build.breakdown['total'] == count_tokens(build.prompt)
+
+
+def test_near_duplicate_passages_are_dropped():
+    text = "Mr. Jabez Wilson copied the encyclopaedia for the League of Red-Headed Men every morning"
+    chunks = [chunk("c1", text), chunk("c2", text + " at Pope's Court"), chunk("c3", "Silver Blaze vanished.")]
+
+    build = PromptBuilder(render).build("Who copied?", "", [], [], chunks)
+
+    assert [item['id'] for item in build.case_chunks] == ["c1", "c3"]
+    assert build.breakdown['deduplicated'] == 1
+
+
+def test_sections_share_the_budget_round_robin():
+    chunks = [chunk(f"c{n}", f"Case passage number {n} " + "word " * 30) for n in range(5)]
+    recent = [past_turn(f"t{n}", f"Earlier question {n} " + "word " * 30) for n in range(5)]
+    builder = PromptBuilder(render)
+    # Room for two items: the top case chunk and the newest turn
+    builder.budget = (count_tokens(render("q", "", "", "")) + count_tokens(chunks[0]['text'])
+                      + count_tokens(builder._format_turn("Previous conversation", recent[-1])) + 2)
+
+    build = builder.build("q", "", recent, [], chunks)
+
+    assert [item['id'] for item in build.case_chunks] == ["c0"]
+    assert build.memory_turn_ids == ["t4"]
+
+
+def test_memory_reads_oldest_first_with_summary_and_truncated_responses():
+    recent = [past_turn("t1", "first"), past_turn("t2", "second", "word " * 400)]
+    similar = [past_turn("other", "from another session")]
+
+    build = PromptBuilder(render, response_tokens=10).build(
+        "q", "", recent, similar, [], summary="Watson asked about the hound"
+    )
+
+    memory = build.prompt.split("Memory:\n")[1].split("\nCases:")[0].splitlines()
+    assert memory[0] == "Conversation so far: Watson asked about the hound"
+    assert [line.split(":")[0] for line in memory[1:]] == [
+        "Previous conversation", "Previous conversation", "Similar case"
+    ]
+    assert memory[2].endswith(" ...") and count_tokens(memory[2]) < 30
+    assert build.memory_turn_ids == ["t1", "t2", "other"]
+    assert build.breakdown['summary'] > 0
@@ -0,0 +1,76 @@
+import pytest
+
+from services.prompt_template import PromptTemplate, compile_template
+from utils.config import Config
+
+VARIABLES = ["query", "memory_context", "case_context", "session_context"]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("services.prompt_template.time.monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def template_file(tmp_path):
+    path = tmp_path / "prompt.txt"
+    path.write_text("Q: {query}\nCases: {case_context}", encoding="utf-8")
+    return path
+
+
+def test_compile_splits_literals_and_fields():
+    assert compile_template("{{json}} {query}!{case_context}", VARIABLES) == (
+        ("{json} ", "!", ""), ("query", "case_context")
+    )
+
+
+@pytest.mark.parametrize("text", ["{unknown}", "{query:>10}", "{query!r}", "{query"])
+def test_compile_rejects_bad_fields(text):
+    with pytest.raises(ValueError):
+        compile_template(text, VARIABLES)
+
+
+def test_format_matches_str_format(template_file):
+    template = PromptTemplate(str(template_file), VARIABLES, reload_interval=None)
+    values = {'query': "Who?", 'case_context': "{braces} stay", 'memory_context': "unused", 'session_context': ""}
+
+    assert template.format(**values) == template_file.read_text(encoding="utf-8").format(**values)
+
+
+def test_shipped_template_compiles():
+    template = PromptTemplate(Config.PROMPT_TEMPLATE_PATH, VARIABLES, reload_interval=None)
+
+    prompt = template.format(query="QUERY", memory_context="MEMORY", case_context="CASES", session_context="SESSION")
+
+    assert all(marker in prompt for marker in ("QUERY", "MEMORY", "CASES"))
+
+
+def test_edits_are_picked_up_after_the_reload_interval(template_file, clock):
+    template = PromptTemplate(str(template_file), VARIABLES, reload_interval=2.0)
+    template_file.write_text("Question: {query}", encoding="utf-8")
+
+    assert template.format(query="Who?", case_context="") == "Q: Who?\nCases: "
+    clock[0] += 2.0
+    assert template.format(query="Who?", case_context="") == "Question: Who?"
+
+
+def test_broken_edit_keeps_the_previous_template(template_file, clock):
+    template = PromptTemplate(str(template_file), VARIABLES, reload_interval=2.0)
+    template_file.write_text("Q: {query} {suspect}", encoding="utf-8")
+    clock[0] += 2.0
+
+    assert template.format(query="Who?", case_context="") == "Q: Who?\nCases: "
+
+    template_file.write_text("Fixed: {query}", encoding="utf-8")
+    clock[0] += 2.0
+    assert template.format(query="Who?", case_context="") == "Fixed: Who?"
+
+
+def test_no_reload_when_disabled(template_file, clock):
+    template = PromptTemplate(str(template_file), VARIABLES, reload_interval=None)
+    template_file.write_text("Question: {query}", encoding="utf-8")
+    clock[0] += 3600
+
+    assert template.format(query="Who?", case_context="") == "Q: Who?\nCases: "
@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+
+from conftest import FakeCollection
+from services import quantized_index
+from services.embedding_provider import normalize
+from services.quantized_index import QuantizedCaseIndex, build_quantized_index, quantize
+
+
+def random_unit_vectors(count, dim=32, seed=7):
+    return normalize(np.random.default_rng(seed).standard_normal((count, dim)))
+
+
+@pytest.fixture
+def collection():
+    collection = FakeCollection("case_data")
+    vectors = random_unit_vectors(50)
+    collection.add(
+        ids=[f"chunk_{n}" for n in range(50)],
+        metadatas=[{'filename': f"case_{n % 3}.txt", 'story': f"Story {n % 5}", 'start': n,
+                    'text': f"Passage {n} from Baker Street — “quoted”"} for n in range(50)],
+        embeddings=vectors
+    )
+    collection.vectors = vectors
+    return collection
+
+
+def build(collection, tmp_path, dtype="int8", **kwargs):
+    path = str(tmp_path / f"case_index_{dtype}.bin")
+    build_quantized_index(collection, path, dtype=dtype, embedding_model="fake-bag-of-words", page_size=16)
+    return QuantizedCaseIndex(path, **kwargs)
+
+
+@pytest.mark.parametrize("dtype, tolerance", [("int8", 0.02), ("float16", 1e-3)])
+def test_quantized_dot_products_approximate_cosines(dtype, tolerance):
+    vectors = random_unit_vectors(20)
+    queries = random_unit_vectors(5, seed=8)
+
+    stored, scales = quantize(vectors, dtype)
+
+    assert stored.dtype == np.dtype(dtype)
+    approx = (queries @ stored.astype(np.float32).T) * scales
+    np.testing.assert_allclose(approx, queries @ vectors.T, atol=tolerance)
+
+
+def test_quantize_rejects_unknown_dtypes():
+    with pytest.raises(ValueError):
+        quantize(random_unit_vectors(2), "int4")
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_round_trip_keeps_ids_metadata_and_texts(collection, tmp_path, dtype):
+    index = build(collection, tmp_path, dtype)
+
+    assert index.count() == 50 and index.dtype == dtype and index.dim == 32
+    assert index.metadata["hnsw:space"] == "cosine"
+    page = index.get(limit=2, offset=48, include=["metadatas", "embeddings"])
+    assert page['ids'] == ["chunk_48", "chunk_49"]
+    assert page['metadatas'][1] == collection.records["chunk_49"]
+    np.testing.assert_allclose(page['embeddings'], collection.vectors[48:], atol=0.02)
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_query_ranks_like_an_exact_scan(collection, tmp_path, monkeypatch, dtype):
+    # Several blocks per scan
+    monkeypatch.setattr(quantized_index, "BLOCK_ROWS", 16)
+    index = build(collection, tmp_path, dtype)
+    queries = collection.vectors[[3, 17]] * 0.9 + random_unit_vectors(2, seed=9) * 0.1
+
+    result = index.query(query_embeddings=queries, n_results=5)
+
+    exact = np.argmax(queries @ collection.vectors.T, axis=1)
+    assert [ids[0] for ids in result['ids']] == [f"chunk_{row}" for row in exact]
+    assert all(distances == sorted(distances) for distances in result['distances'])
+    assert result['embeddings'] is None
+
+
+def test_filters_select_rows(collection, tmp_path):
+    index = build(collection, tmp_path)
+
+    where = {"$and": [{"filename": "case_1.txt"}, {"story": {"$in": ["Story 1", "Story 2"]}}]}
+    expected = [chunk_id for chunk_id, metadata in collection.records.items()
+                if metadata['filename'] == "case_1.txt" and metadata['story'] in ("Story 1", "Story 2")]
+
+    assert index.get(where=where)['ids'] == expected
+    assert sorted(index.query(query_embeddings=collection.vectors[:1], n_results=50, where=where)['ids'][0]) == \
+        sorted(expected)
+    assert index.query(query_embeddings=collection.vectors[:1], where={"filename": "hound.txt"})['ids'] == [[]]
+    assert index.get(ids=["chunk_1", "chunk_2", "missing"], where={"filename": "case_1.txt"})['ids'] == ["chunk_1"]
+    with pytest.raises(ValueError):
+        index.get(where={"start": {"$gt": 3}})
+
+
+def test_index_built_with_another_model_is_refused(collection, tmp_path):
+    with pytest.raises(ValueError, match="rebuild"):
+        build(collection, tmp_path, embedding_model="all-MiniLM-L6-v2")
+
+    assert build(collection, tmp_path, embedding_model="fake-bag-of-words").count() == 50
+
+
+def test_writes_are_refused(collection, tmp_path):
+    index = build(collection, tmp_path)
+
+    for write in (index.add, index.update, index.upsert, index.delete):
+        with pytest.raises(RuntimeError):
+            write(ids=["chunk_0"])
+
+
+def test_other_files_are_not_opened(tmp_path):
+    path = tmp_path / "case_index.bin"
+    path.write_bytes(b"not an index" * 10)
+
+    with pytest.raises(ValueError):
+        QuantizedCaseIndex(str(path))
+
+
+def test_chat_service_serves_the_quantized_backend(offline_config, registry, embedder, tmp_path, monkeypatch):
+    from services.chat_service import ChatService
+
+    collection = FakeCollection("case_data")
+    collection.add(ids=["silver_blaze_0"], metadatas=[{'filename': "silver_blaze.txt", 'text': "The dog did nothing."}],
+                   embeddings=embedder.embed(["The dog did nothing."]))
+    path = str(tmp_path / "case_index.bin")
+    build_quantized_index(collection, path, embedding_model=embedder.model_id)
+    monkeypatch.setattr(offline_config, "CASE_INDEX_BACKEND", "quantized")
+    monkeypatch.setattr(offline_config, "QUANTIZED_INDEX_PATH", path)
+
+    service = ChatService(registry=registry)
+
+    assert isinstance(service.get_case_collection(), QuantizedCaseIndex)
+    assert service.get_case_collection().get(ids=["silver_blaze_0"])['metadatas'][0]['text'] == "The dog did nothing."
@@ -0,0 +1,96 @@
+import pytest
+
+from conftest import FakeEmbeddingProvider
+from services.response_cache import ResponseCache, normalize_query
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("services.response_cache.time.monotonic", clock)
+    return clock
+
+
+@pytest.fixture
+def cache(embedder):
+    return ResponseCache(embedder, threshold=0.8, ttl=60, max_entries=3)
+
+
+def test_normalize_query():
+    assert normalize_query("  Who is   MORIARTY?! ") == "who is moriarty"
+
+
+def test_exact_hit_ignores_case_and_punctuation(cache):
+    cache.put("Who is Moriarty?", "The Napoleon of crime.")
+
+    assert cache.get("who is moriarty") == "The Napoleon of crime."
+    assert cache.stats()['exact_hits'] == 1
+
+
+def test_semantic_hit_on_similar_question(cache):
+    cache.put("who is the napoleon of crime", "Professor Moriarty.")
+
+    assert cache.get("tell me who is the napoleon of crime") == "Professor Moriarty."
+    assert cache.get("what did the dog do in the night") is None
+    assert cache.stats()['semantic_hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_partitions_are_kept_apart(cache):
+    cache.put("who is moriarty", "Professor Moriarty.", partition="global")
+
+    assert cache.get("who is moriarty", partition="context:abc") is None
+
+
+def test_expired_best_match_does_not_hide_live_one(cache, clock):
+    cache.put("who is the napoleon of crime", "stale answer")
+    clock.now += 50
+    cache.put("who is the napoleon of crime today", "fresh answer")
+    clock.now += 20
+
+    # The stale entry is the closer match but has expired
+    assert cache.get("the napoleon of crime, who is he") == "fresh answer"
+    stats = cache.stats()
+    assert stats['semantic_hits'] == 1
+    assert stats['expirations'] == 1
+    assert stats['entries'] == 1
+
+
+def test_expired_entries_are_purged_before_evicting_live_ones(cache, clock):
+    cache.put("first question", "1")
+    cache.put("second question", "2")
+    clock.now += 30
+    cache.put("third question", "3")
+    clock.now += 40
+    cache.put("fourth question", "4")
+
+    assert cache.get("third question") == "3"
+    assert cache.stats()['evictions'] == 0
+    assert cache.stats()['expirations'] == 2
+
+
+def test_lru_eviction_beyond_max_entries(cache):
+    for n in ("one", "two", "three"):
+        cache.put(f"question {n}", n)
+    cache.get("question one")
+    cache.put("question four", "four")
+
+    assert cache.get("question two") is None
+    assert cache.get("question one") == "one"
+    assert cache.stats()['evictions'] == 1
+
+
+def test_clear(cache):
+    cache.put("who is moriarty", "Professor Moriarty.")
+    cache.clear()
+
+    assert cache.get("who is moriarty") is None
+    assert cache.stats()['entries'] == 0
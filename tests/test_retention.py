@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from conftest import FakeCollection
+from services.memory_service import MemoryService
+from services.quantized_index import QuantizedCaseIndex, build_quantized_index
+from services.retention import RetentionJob, _try_lock
+from services.retrieval import _chroma_where
+from services.session_store import ChromaSessionStore
+from services.turn_log import TurnLog
+from utils.config import Config
+
+
+@pytest.fixture
+def memory(registry, data_dir, monkeypatch):
+    monkeypatch.setattr(Config, "WRITE_BEHIND_ENABLED", False)
+    store = ChromaSessionStore(FakeCollection("session_data"), TurnLog(str(data_dir / "turns.sqlite3")))
+    return MemoryService(registry=registry, session_store=store)
+
+
+def add_session(memory, session_id, timestamp, turns=1, text="question"):
+    built = []
+    for n in range(turns):
+        turn = MemoryService._build_turn(session_id, f"{text} {n}", f"answer {n}")
+        turn['id'] = f"{session_id}_{n}"
+        turn['metadata']['timestamp'] = timestamp
+        built.append(turn)
+    memory.store.append_turns(built)
+    memory._index_conversations(built)
+
+
+def test_session_filter_avoids_in():
+    assert MemoryService._session_filter(["a"]) == {"session_id": "a"}
+    assert MemoryService._session_filter(["a", "b", "a"]) == {
+        "$or": [{"session_id": "a"}, {"session_id": "b"}]
+    }
+
+
+def test_case_filter_avoids_in():
+    assert _chroma_where({"filename": ["a.txt"]}) == {"filename": "a.txt"}
+    assert _chroma_where({"filename": ["a.txt", "b.txt"], "story": "Silver Blaze"}) == {"$and": [
+        {"$or": [{"filename": "a.txt"}, {"filename": "b.txt"}]},
+        {"story": "Silver Blaze"}
+    ]}
+
+
+def test_quantized_index_supports_or_filters(tmp_path):
+    collection = FakeCollection("case_data")
+    collection.add(
+        ids=["c1", "c2", "c3"],
+        metadatas=[{'filename': name, 'text': name} for name in ("a.txt", "b.txt", "c.txt")],
+        embeddings=np.eye(3, 4, dtype=np.float32)
+    )
+    build_quantized_index(collection, str(tmp_path / "case_index.bin"))
+    index = QuantizedCaseIndex(str(tmp_path / "case_index.bin"))
+
+    where = _chroma_where({"filename": ["a.txt", "c.txt"]})
+
+    assert index.get(where=where)['ids'] == ["c1", "c3"]
+    assert index.query(query_embeddings=[[0, 1, 0, 0]], n_results=3, where=where)['ids'] == [["c1", "c3"]]
+
+
+def test_delete_sessions_removes_memory_and_turns(memory):
+    for session_id in ("a", "b", "c"):
+        add_session(memory, session_id, "2026-01-01T00:00:00", turns=2)
+
+    assert memory.delete_sessions(["a", "b"]) == {'sessions': 2, 'turns': 4}
+
+    assert {metadata['session_id'] for metadata in memory.memory_collection.records.values()} == {"c"}
+    assert memory.store.count_turns() == 2
+
+
+def test_run_once_deletes_only_idle_sessions_in_batches(memory, data_dir):
+    for n in range(5):
+        add_session(memory, f"old{n}", "2000-01-01T00:00:00")
+    add_session(memory, "fresh", "2999-01-01T00:00:00")
+    job = RetentionJob(memory, ttl_days=30, batch_size=2, compact_free_ratio=2.0)
+
+    stats = job.run_once()
+
+    assert stats['sessions'] == 5 and stats['turns'] == 5
+    assert stats['rows'] == 15
+    assert stats['compacted'] is False
+    assert memory.store.expired_sessions("2999-12-31") == ["fresh"]
+    assert [metadata['session_id'] for metadata in memory.memory_collection.records.values()] == ["fresh"]
+    assert job.stats()['last_run'] is stats
+    assert job.run_once()['sessions'] == 0
+
+
+def test_compacts_once_enough_is_free(memory):
+    for n in range(40):
+        add_session(memory, f"old{n}", "2000-01-01T00:00:00", turns=5, text="x" * 2000)
+
+    assert RetentionJob(memory, compact_free_ratio=0.0).run_once()['compacted'] is True
+
+    for n in range(40):
+        add_session(memory, f"old{n}", "2000-01-01T00:00:00", turns=5, text="x" * 2000)
+    add_session(memory, "fresh", "2999-01-01T00:00:00", turns=400, text="y" * 2000)
+
+    assert RetentionJob(memory, compact_free_ratio=0.5).run_once()['compacted'] is False
+
+
+def test_run_is_skipped_while_another_process_holds_the_lock(memory, data_dir):
+    job = RetentionJob(memory)
+
+    with _try_lock(job.lock_path) as acquired:
+        assert acquired
+        assert job.run_once() is None
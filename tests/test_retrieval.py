@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from conftest import FakeCollection
+from services.retrieval import (invalidate_retrieval_cache, maximal_marginal_relevance, retrieve_chunks,
+                                retrieve_documents_batch)
+
+PASSAGES = {
+    "hound": ("hound.txt", "The Hound of the Baskervilles", "hound moor night baskerville"),
+    "hound_copy": ("hound.txt", "The Hound of the Baskervilles", "hound moor night baskerville hall"),
+    "mire": ("hound.txt", "The Hound of the Baskervilles", "hound moor grimpen mire"),
+    "blaze": ("silver_blaze.txt", "Silver Blaze", "racehorse stables dartmoor trainer"),
+}
+
+
+@pytest.fixture(autouse=True)
+def empty_result_cache():
+    # Cached hits are keyed by collection id, which a new collection may reuse
+    invalidate_retrieval_cache()
+    yield
+    invalidate_retrieval_cache()
+
+
+@pytest.fixture(params=["l2", "cosine"])
+def collection(request, embedder):
+    collection = FakeCollection("case_data", {"hnsw:space": request.param})
+    texts = [text for _, _, text in PASSAGES.values()]
+    collection.add(
+        ids=list(PASSAGES),
+        metadatas=[{'filename': filename, 'story': story, 'text': text}
+                   for filename, story, text in PASSAGES.values()],
+        embeddings=embedder.embed(texts)
+    )
+    return collection
+
+
+def test_mmr_trades_relevance_for_novelty():
+    vectors = np.array([[1.0, 0.0], [0.995, 0.0998], [0.6, 0.8]], dtype=np.float32)
+    similarity = np.array([0.9, 0.88, 0.5], dtype=np.float32)
+
+    assert maximal_marginal_relevance(similarity, vectors, 2, mmr_lambda=1.0) == [0, 1]
+    assert maximal_marginal_relevance(similarity, vectors, 2, mmr_lambda=0.5) == [0, 2]
+    assert maximal_marginal_relevance(similarity, vectors, 5, mmr_lambda=0.5) == [0, 2, 1]
+    assert maximal_marginal_relevance(similarity[:0], vectors[:0], 2) == []
+
+
+def test_hits_carry_ids_sources_and_cosine_scores(collection, embedder):
+    hits = retrieve_chunks(collection, "hound moor night baskerville", k=2)
+
+    assert [hit['id'] for hit in hits] == ["hound", "hound_copy"]
+    assert hits[0]['filename'] == "hound.txt" and hits[0]['story'] == "The Hound of the Baskervilles"
+    assert hits[0]['distance'] == pytest.approx(0.0, abs=1e-5)
+    query = embedder.embed(["hound moor night baskerville"])[0]
+    expected = float(embedder.embed([PASSAGES["hound_copy"][2]])[0] @ query)
+    assert hits[1]['score'] == pytest.approx(expected, abs=1e-5)
+    assert hits[1]['distance'] == pytest.approx(1.0 - expected, abs=1e-5)
+
+
+def test_mmr_skips_near_duplicate_passages(collection):
+    plain = retrieve_chunks(collection, "hound moor night baskerville grimpen", k=2)
+    diverse = retrieve_chunks(collection, "hound moor night baskerville grimpen", k=2, mmr_lambda=0.5)
+
+    assert [hit['id'] for hit in plain] == ["hound", "hound_copy"]
+    assert [hit['id'] for hit in diverse] == ["hound", "mire"]
+
+
+def test_max_distance_drops_weak_matches(collection):
+    hits = retrieve_chunks(collection, "hound moor night baskerville", k=4, max_distance=0.3)
+
+    assert [hit['id'] for hit in hits] == ["hound", "hound_copy"]
+    assert all(hit['distance'] <= 0.3 for hit in hits)
+
+
+def test_filters_restrict_hits(collection):
+    by_story = retrieve_chunks(collection, "hound", k=4, where={"story": "Silver Blaze"})
+    by_files = retrieve_chunks(collection, "hound", k=4, where={"filename": ["silver_blaze.txt", "hound.txt"]})
+
+    assert [hit['id'] for hit in by_story] == ["blaze"]
+    assert len(by_files) == 4
+
+
+def test_batch_results_are_per_query_and_in_order(collection, embedder):
+    results = retrieve_documents_batch(collection, ["racehorse trainer", "grimpen mire", "racehorse trainer"], k=1)
+
+    assert [[hit['id'] for hit in hits] for hits in results] == [["blaze"], ["mire"], ["blaze"]]
+    # Repeated queries are embedded once
+    assert embedder.batches[-1] == 2
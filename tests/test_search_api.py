@@ -0,0 +1,88 @@
+import pytest
+
+PASSAGES = {
+    "silver_blaze_0": ("silver_blaze.txt", "Silver Blaze",
+                       "The dog did nothing in the night-time, which was the curious incident."),
+    "silver_blaze_1": ("silver_blaze.txt", "Silver Blaze",
+                       "The racehorse vanished from the stables on Dartmoor."),
+    "red_headed_league_0": ("the_red_headed_league.txt", "The Red-Headed League",
+                            "Jabez Wilson copied the encyclopaedia for the League of Red-Headed Men."),
+}
+
+
+@pytest.fixture
+def cases(flask_app, embedder):
+    collection = flask_app.chat_service.get_case_collection()
+    texts = [text for _, _, text in PASSAGES.values()]
+    collection.add(
+        ids=list(PASSAGES),
+        documents=texts,
+        metadatas=[{'filename': filename, 'story': story, 'text': text}
+                   for filename, story, text in PASSAGES.values()],
+        embeddings=embedder.embed(texts)
+    )
+    embedder.batches.clear()
+    return collection
+
+
+def batch(client, queries, **body):
+    return client.post('/api/search/batch', json={'queries': queries, **body})
+
+
+def test_batch_returns_one_result_list_per_query_in_order(client, cases, embedder):
+    queries = ["the dog in the night-time", "who copied the encyclopaedia"]
+
+    response = batch(client, queries, limit=1)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['count'] == 2
+    assert [item['query'] for item in body['results']] == queries
+    assert [item['results'][0]['id'] for item in body['results']] == ["silver_blaze_0", "red_headed_league_0"]
+    # Both queries are embedded in one call
+    assert embedder.batches == [2]
+
+
+def test_batch_hits_match_single_searches(client, cases):
+    queries = ["the racehorse on Dartmoor", "red-headed men"]
+
+    batched = batch(client, queries, limit=2).get_json()['results']
+    single = [client.post('/api/search', json={'query': query, 'limit': 2}).get_json()['hits'] for query in queries]
+
+    assert [[hit['id'] for hit in item['results']] for item in batched] == [[hit['id'] for hit in hits]
+                                                                            for hits in single]
+
+
+def test_batch_filters_apply_to_every_query(client, cases):
+    results = batch(client, ["the dog", "the league"], limit=5, filename="silver_blaze.txt").get_json()['results']
+
+    assert {hit['filename'] for item in results for hit in item['results']} == {"silver_blaze.txt"}
+
+
+@pytest.mark.parametrize("body, error", [
+    ({}, 'queries must be a list of search queries'),
+    ({'queries': "the dog"}, 'queries must be a list of search queries'),
+    ({'queries': []}, 'At least one search query is required'),
+    ({'queries': ["the dog", "  "]}, 'Search queries must be non-empty strings'),
+    ({'queries': ["the dog", 7]}, 'Search queries must be non-empty strings'),
+    ({'queries': ["the dog"], 'limit': "5"}, 'limit must be an integer'),
+    ({'queries': ["the dog"], 'story': []}, 'story must be a non-empty string or list of strings'),
+    ({'queries': ["the dog"], 'mmr_lambda': 1.5}, 'mmr_lambda must be a number between 0 and 1'),
+])
+def test_invalid_batches_are_rejected(client, body, error):
+    response = client.post('/api/search/batch', json=body)
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
+
+
+def test_batch_size_and_limit_are_capped(client, cases, offline_config, monkeypatch):
+    monkeypatch.setattr(offline_config, "SEARCH_BATCH_MAX_QUERIES", 2)
+    monkeypatch.setattr(offline_config, "SEARCH_MAX_LIMIT", 1)
+
+    too_many = batch(client, ["a", "b", "c"])
+    capped = batch(client, ["the dog", "the league"], limit=50)
+
+    assert too_many.status_code == 400
+    assert too_many.get_json() == {'error': 'At most 2 queries per batch'}
+    assert [item['count'] for item in capped.get_json()['results']] == [1, 1]
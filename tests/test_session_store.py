@@ -0,0 +1,119 @@
+import threading
+
+import pytest
+
+from conftest import FakeCollection
+from services.memory_service import MemoryService
+from services.session_store import ChromaSessionStore, InMemorySessionStore, RedisSessionStore, SessionStore
+from services.turn_log import TurnLog
+
+
+def turn(session_id, n, timestamp=None):
+    return {
+        'id': f"{session_id}_{n}",
+        'session_id': session_id,
+        'user_message': f"question {n}",
+        'assistant_response': f"answer {n}",
+        'metadata': {'timestamp': timestamp or f"2026-01-01T00:00:{n:02d}", 'context': '{}'}
+    }
+
+
+@pytest.fixture(params=["memory", "chroma", "redis"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemorySessionStore()
+    if request.param == "chroma":
+        return ChromaSessionStore(FakeCollection("session_data"), TurnLog(str(tmp_path / "turns.sqlite3")))
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisSessionStore(fakeredis.FakeRedis(), prefix="test")
+
+
+def test_base_class_cannot_be_instantiated():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+def test_turns_are_numbered_per_session_and_appends_are_idempotent(store):
+    turns = [turn("holmes", n) for n in range(1, 4)] + [turn("watson", 1)]
+    store.append_turns(turns)
+    store.append_turns([turn("holmes", 2)])
+
+    assert [t['seq'] for t in turns] == [1, 2, 3, 1]
+    assert store.last_seq("holmes") == 3
+    assert store.last_seq("nobody") == 0
+    assert store.count_turns() == 4
+
+
+def test_concurrent_appends_get_distinct_seqs(store):
+    # Every writer also re-sends turn 0, which must be stored once
+    def write(writer):
+        for n in range(10):
+            store.append_turns([turn("holmes", 0), turn("holmes", 100 * writer + n + 1, "2026-01-01T00:00:00")])
+
+    threads = [threading.Thread(target=write, args=(writer,)) for writer in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    seqs = [row['seq'] for row in store.turns_between("holmes", 0, 1000)]
+    assert seqs == list(range(1, 42))
+    assert store.last_seq("holmes") == 41
+    assert store.count_turns() == 41
+
+
+def test_recent_history_and_ranges(store):
+    store.append_turns([turn("holmes", n) for n in range(1, 6)])
+
+    assert [row['user_message'] for row in store.recent_turns("holmes", 2)] == ["question 4", "question 5"]
+    page = store.turn_history("holmes", limit=2)
+    assert [row['seq'] for row in page] == [5, 4]
+    older = store.turn_history("holmes", limit=2, before_seq=page[-1]['seq'], fields=['user_message'])
+    assert older == [{'seq': 3, 'user_message': "question 3"}, {'seq': 2, 'user_message': "question 2"}]
+    assert [row['seq'] for row in store.turns_between("holmes", 1, 4)] == [2, 3, 4]
+    assert [row['seq'] for row in store.turns_between("holmes", 1, 4, limit=1)] == [2]
+
+
+def test_session_records(store):
+    store.put_sessions({"holmes": {'message_count': 2, 'topics': ["poison"]}})
+
+    assert store.get_sessions(["holmes", "watson"]) == {"holmes": {'message_count': 2, 'topics': ["poison"]}}
+    assert store.get_sessions([]) == {}
+
+
+def test_delete_sessions_removes_turns_and_records(store):
+    store.append_turns([turn("holmes", 1), turn("holmes", 2), turn("watson", 1), turn("lestrade", 1)])
+    store.put_sessions({"holmes": {'message_count': 2, 'topics': []},
+                        "watson": {'message_count': 1, 'topics': []}})
+
+    assert store.delete_sessions(["holmes", "lestrade"]) == 3
+    assert store.delete_sessions([]) == 0
+    assert store.recent_turns("holmes") == []
+    assert store.get_sessions(["holmes", "watson"]).keys() == {"watson"}
+    assert store.count_turns() == 1
+
+    # A deleted session starts again from seq 1 and its old turn ids can be stored again
+    store.append_turns([turn("holmes", 1)])
+    assert store.last_seq("holmes") == 1
+
+
+def test_expired_sessions(store):
+    store.append_turns([turn("holmes", 1, "2026-01-01T00:00:00"), turn("holmes", 2, "2026-03-01T00:00:00"),
+                        turn("watson", 1, "2026-01-02T00:00:00")])
+
+    assert store.expired_sessions("2026-02-01T00:00:00") == ["watson"]
+
+
+def test_backfill_runs_once(registry):
+    memory = registry.get_collection("chat_memory")
+    memory.add(ids=["holmes_1"], metadatas=[{'session_id': "holmes", 'user_message': "question",
+                                             'assistant_response': "answer", 'timestamp': "2026-01-01T00:00:00"}])
+
+    first = MemoryService(registry=registry, session_store=InMemorySessionStore())
+    assert [row['turn_id'] for row in first.get_recent_conversations("holmes")] == ["holmes_1"]
+
+    second = MemoryService(registry=registry, session_store=InMemorySessionStore())
+    assert second.store.count_turns() == 0
+    for service in (first, second):
+        if service.write_queue is not None:
+            service.write_queue.shutdown()
@@ -0,0 +1,87 @@
+import pytest
+
+from services import snapshots
+from services.chat_service import ChatService
+from services.chroma_registry import ReadOnlyCollection
+from services.memory_service import MemoryService
+from services.session_store import InMemorySessionStore
+from utils.config import Config
+
+
+def build(root, version, base_version=None):
+    path = snapshots.prepare_snapshot(str(root), version, base_version)
+    if base_version is None:
+        (root / version / "case_data.marker").write_text(version)
+    snapshots.write_snapshot_info(path, {'version': version})
+    return path
+
+
+def test_resolve_follows_current_pointer(tmp_path):
+    build(tmp_path, "v1")
+    build(tmp_path, "v2", base_version="v1")
+
+    with pytest.raises(FileNotFoundError):
+        snapshots.resolve_snapshot(str(tmp_path))
+    snapshots.activate_snapshot(str(tmp_path), "v2")
+
+    assert snapshots.resolve_snapshot(str(tmp_path)) == str(tmp_path / "v2")
+    assert snapshots.resolve_snapshot(str(tmp_path), "v1") == str(tmp_path / "v1")
+    # Seeded from v1, but marked complete on its own
+    assert (tmp_path / "v2" / "case_data.marker").read_text() == "v1"
+    assert snapshots.read_snapshot_info(str(tmp_path / "v2")) == {'version': "v2"}
+
+
+def test_incomplete_snapshot_is_not_resolved_or_activated(tmp_path):
+    snapshots.prepare_snapshot(str(tmp_path), "v1")
+
+    with pytest.raises(FileNotFoundError):
+        snapshots.resolve_snapshot(str(tmp_path), "v1")
+    with pytest.raises(FileNotFoundError):
+        snapshots.activate_snapshot(str(tmp_path), "v1")
+    assert snapshots.current_version(str(tmp_path)) is None
+
+
+def test_existing_snapshot_is_not_overwritten(tmp_path):
+    build(tmp_path, "v1")
+
+    with pytest.raises(FileExistsError):
+        snapshots.prepare_snapshot(str(tmp_path), "v1")
+
+
+def test_read_only_collection_refuses_writes(chroma_registry, tmp_path):
+    path = str(tmp_path / "v1")
+    chroma_registry.get_collection("case_data", path=path).add(ids=["c1"], metadatas=[{'filename': "a.txt"}])
+
+    collection = chroma_registry.get_collection("case_data", path=path, read_only=True)
+
+    assert isinstance(collection, ReadOnlyCollection)
+    assert collection.count() == 1
+    assert collection.get(ids=["c1"])['metadatas'] == [{'filename': "a.txt"}]
+    for write in (collection.add, collection.upsert, collection.update, collection.delete):
+        with pytest.raises(RuntimeError):
+            write(ids=["c1"])
+    assert collection.count() == 1
+    assert chroma_registry.get_collection("case_data", path=path, read_only=True) is collection
+
+
+def test_read_only_collection_must_exist(chroma_registry, tmp_path):
+    with pytest.raises(ValueError):
+        chroma_registry.get_collection("case_data", path=str(tmp_path / "empty"), read_only=True)
+
+
+def test_chat_service_serves_snapshot_read_only(registry, embedder, data_dir, monkeypatch):
+    path = build(data_dir / "snapshots", "v1")
+    registry.get_collection("case_data", path=path)
+    snapshots.activate_snapshot(str(data_dir / "snapshots"), "v1")
+    for name, value in {'SNAPSHOT_ROOT': str(data_dir / "snapshots"), 'CASE_INDEX_SNAPSHOT': "current",
+                        'CASE_INDEX_BACKEND': 'chroma', 'LLM_PROVIDER': 'fake'}.items():
+        monkeypatch.setattr(Config, name, value)
+    memory = MemoryService(registry=registry, session_store=InMemorySessionStore())
+
+    service = ChatService(registry=registry, memory_service=memory)
+
+    assert service.case_index_path == path
+    assert service.case_manifest_path == f"{path}/{snapshots.MANIFEST_FILE}"
+    assert service.keyword_index_path == f"{path}/bm25"
+    with pytest.raises(RuntimeError):
+        service.get_case_collection().add(ids=["c1"], metadatas=[{}])
@@ -0,0 +1,94 @@
+import pytest
+
+from services.fake_llm import FakeLLM
+from services.memory_service import MemoryService
+from services.session_store import InMemorySessionStore
+from services.summarizer import ConversationSummarizer
+from utils.config import Config
+
+
+class RecordingLLM(FakeLLM):
+    """FakeLLM that keeps the prompts it was asked to complete."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.prompts = []
+
+    def generate_content(self, prompt, stream=False):
+        self.prompts.append(prompt)
+        return super().generate_content(prompt, stream=stream)
+
+
+@pytest.fixture
+def memory(registry, monkeypatch):
+    monkeypatch.setattr(Config, "WRITE_BEHIND_ENABLED", False)
+    return MemoryService(registry=registry, session_store=InMemorySessionStore())
+
+
+def chat(memory, session_id, count, start=1):
+    for n in range(start, start + count):
+        memory.store_conversation(session_id, f"question {n}", f"answer {n}")
+
+
+def test_folds_turns_past_the_threshold(memory):
+    model = RecordingLLM(reply="Holmes suspects the stepfather.")
+    summarizer = ConversationSummarizer(memory, model, keep_recent=3, min_turns=4, background=False)
+
+    chat(memory, "holmes", 6)
+    assert not summarizer.summarize("holmes")
+    assert model.prompts == []
+
+    chat(memory, "holmes", 3, start=7)
+    assert summarizer.summarize("holmes")
+
+    summary, summary_seq = memory.get_conversation_summary("holmes")
+    assert summary == "Holmes suspects the stepfather."
+    assert summary_seq == 6
+    prompt, = model.prompts
+    assert "question 6" in prompt and "question 7" not in prompt
+
+    # The prompt keeps only the turns the summary does not cover
+    recent = memory.store.turns_between("holmes", summary_seq, memory.store.last_seq("holmes"))
+    assert [turn['user_message'] for turn in recent] == ["question 7", "question 8", "question 9"]
+    assert [turn['user_message'] for turn in memory.get_recent_conversations("holmes", 3)] == \
+        ["question 7", "question 8", "question 9"]
+
+
+def test_next_fold_builds_on_the_stored_summary(memory):
+    model = RecordingLLM(reply="Summary.")
+    summarizer = ConversationSummarizer(memory, model, keep_recent=2, min_turns=2, max_batch_turns=2,
+                                        background=False)
+
+    chat(memory, "holmes", 6)
+    assert summarizer.summarize("holmes")
+    assert memory.get_conversation_summary("holmes") == ("Summary.", 4)
+    assert len(model.prompts) == 2  # four pending turns, folded two at a time
+    assert "(none yet)" in model.prompts[0] and "Summary." in model.prompts[1]
+
+    chat(memory, "holmes", 1, start=7)
+    assert not summarizer.summarize("holmes")
+    chat(memory, "holmes", 1, start=8)
+    assert summarizer.summarize("holmes")
+    assert memory.get_conversation_summary("holmes") == ("Summary.", 6)
+
+
+def test_summary_is_capped(memory):
+    summarizer = ConversationSummarizer(memory, FakeLLM(reply="word " * 500), keep_recent=1, min_turns=1,
+                                        max_tokens=20, background=False)
+
+    chat(memory, "holmes", 3)
+    assert summarizer.summarize("holmes")
+    summary, _ = memory.get_conversation_summary("holmes")
+    assert len(summary.split()) <= 20
+
+
+def test_scheduled_sessions_are_summarized_in_the_background(memory):
+    summarizer = ConversationSummarizer(memory, FakeLLM(reply="Background summary."), keep_recent=1,
+                                        min_turns=2)
+    try:
+        chat(memory, "holmes", 4)
+        summarizer.schedule("holmes")
+        summarizer.flush()
+        assert memory.get_conversation_summary("holmes") == ("Background summary.", 3)
+    finally:
+        summarizer.queue.shutdown()
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+from conftest import FakeCollection
+from services.memory_service import MemoryService
+from services.session_store import ChromaSessionStore
+from services.turn_log import TurnLog
+from utils.config import Config
+
+
+def turn(session_id, n, timestamp=None):
+    return {
+        'id': f"{session_id}_{n}",
+        'session_id': session_id,
+        'user_message': f"question {n}",
+        'assistant_response': f"answer {n}",
+        'metadata': {'timestamp': timestamp or f"2026-01-01T00:00:{n:02d}", 'context': '{}'}
+    }
+
+
+@pytest.fixture
+def log(tmp_path):
+    return TurnLog(str(tmp_path / "logs" / "turns.sqlite3"))
+
+
+def test_recent_turns_follow_append_order_not_timestamps(log):
+    # Clock skew must not reorder a session's turns
+    log.append([turn("holmes", 1, "2026-01-01T00:00:09"), turn("holmes", 2, "2026-01-01T00:00:01"),
+                turn("holmes", 3, "2026-01-01T00:00:05")])
+
+    assert [row['turn_id'] for row in log.recent("holmes", 2)] == ["holmes_2", "holmes_3"]
+    assert [row['seq'] for row in log.recent("holmes", 10)] == [1, 2, 3]
+    assert log.recent("watson") == []
+
+
+def test_history_pages_do_not_overlap(log):
+    log.append([turn("holmes", n) for n in range(1, 8)])
+
+    pages, before_seq = [], None
+    while True:
+        page = log.history("holmes", limit=3, before_seq=before_seq, fields=["turn_id"])
+        if not page:
+            break
+        pages.append([row['seq'] for row in page])
+        before_seq = page[-1]['seq']
+
+    assert pages == [[7, 6, 5], [4, 3, 2], [1]]
+
+
+def test_history_rejects_unknown_fields(log):
+    with pytest.raises(ValueError):
+        log.history("holmes", fields=["user_message", "embedding"])
+
+
+def test_turns_survive_reopening_and_are_visible_across_threads(log):
+    log.append([turn("holmes", 1), turn("holmes", 2)])
+
+    reopened = TurnLog(log.path)
+    seen = []
+    reader = threading.Thread(target=lambda: seen.extend(log.recent("holmes")))
+    reader.start()
+    reader.join()
+
+    assert reopened.last_seq("holmes") == 2
+    assert [row['seq'] for row in seen] == [1, 2]
+    assert reopened.count() == 2 and reopened.count("watson") == 0
+
+
+def test_failed_append_rolls_back_the_whole_batch(log):
+    broken = turn("holmes", 2)
+    del broken['metadata']['timestamp']
+
+    with pytest.raises(KeyError):
+        log.append([turn("holmes", 1), broken])
+
+    assert log.count() == 0
+    log.append([turn("holmes", 1)])
+    assert log.last_seq("holmes") == 1
+
+
+def test_compact_waits_for_enough_free_pages(log):
+    log.append([turn("holmes", n) for n in range(1, 200)])
+
+    assert not log.compact()
+    log.delete_sessions(["holmes"])
+    assert not log.compact(min_free_ratio=1.1)
+    assert log.compact(min_free_ratio=0.5)
+
+
+def test_memory_service_reads_recent_turns_from_the_log_and_similar_ones_from_chroma(
+        registry, embedder, data_dir, monkeypatch):
+    monkeypatch.setattr(Config, "WRITE_BEHIND_ENABLED", False)
+    store = ChromaSessionStore(FakeCollection("session_data"), TurnLog(str(data_dir / "turns.sqlite3")))
+    memory = MemoryService(registry=registry, session_store=store)
+    for n in range(1, 6):
+        memory.store_conversation("holmes", f"question {n}", f"answer {n}")
+    memory.store_conversation("watson", "what did the dog do in the night", "nothing at all")
+
+    recent = memory.get_recent_conversations("holmes", limit=2)
+    similar = memory.get_similar_conversations("holmes", "the dog in the night", limit=1)
+
+    assert [row['user_message'] for row in recent] == ["question 4", "question 5"]
+    assert [row['session_id'] for row in similar] == ["watson"]
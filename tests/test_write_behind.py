@@ -0,0 +1,133 @@
+import threading
+
+import pytest
+
+from services.memory_service import MemoryService
+from services.session_store import InMemorySessionStore
+from services.write_behind import WriteBehindQueue
+from utils.config import Config
+
+
+def test_flush_waits_for_the_batch_the_worker_is_writing():
+    writing, release, written = threading.Event(), threading.Event(), []
+
+    def slow_flush(batch):
+        writing.set()
+        release.wait(5)
+        written.extend(batch)
+
+    queue = WriteBehindQueue(slow_flush, flush_interval=0.01)
+    try:
+        assert queue.submit("turn")
+        assert writing.wait(5)
+        assert not queue.flush(timeout=0.1)
+
+        flusher = threading.Thread(target=queue.flush)
+        flusher.start()
+        flusher.join(0.1)
+        assert flusher.is_alive()
+
+        release.set()
+        flusher.join(5)
+        assert not flusher.is_alive()
+        assert written == ["turn"]
+    finally:
+        release.set()
+        queue.shutdown()
+
+
+def test_failed_batches_do_not_block_flush():
+    def failing_flush(batch):
+        raise RuntimeError("store down")
+
+    queue = WriteBehindQueue(failing_flush, flush_interval=0.01)
+    try:
+        queue.submit("turn")
+        assert queue.flush(timeout=5)
+        assert queue.stats()['failed'] == 1
+    finally:
+        queue.shutdown()
+
+
+def test_items_are_flushed_in_batches():
+    release, batches = threading.Event(), []
+
+    def flush(batch):
+        release.wait(5)
+        batches.append(list(batch))
+
+    queue = WriteBehindQueue(flush, batch_size=3, flush_interval=0.01)
+    try:
+        for item in range(7):
+            assert queue.submit(item)
+        release.set()
+        assert queue.flush(timeout=5)
+        assert [item for batch in batches for item in batch] == list(range(7))
+        assert all(len(batch) <= 3 for batch in batches)
+        assert queue.stats()['flushed'] == 7
+    finally:
+        release.set()
+        queue.shutdown()
+
+
+def test_full_queue_rejects_and_shutdown_stops_accepting():
+    release = threading.Event()
+    queue = WriteBehindQueue(lambda batch: release.wait(5), max_size=1, batch_size=1, flush_interval=0.01)
+    try:
+        assert queue.submit("first")
+        # The worker holds "first"; the next item fills the queue
+        while queue.depth():
+            pass
+        assert queue.submit("second")
+        assert not queue.submit("third")
+        assert queue.stats()['rejected'] == 1
+    finally:
+        release.set()
+        queue.shutdown()
+    assert queue.stats()['flushed'] == 2
+    assert not queue.submit("late")
+
+
+def test_turn_is_written_synchronously_when_the_queue_is_full(memory, monkeypatch):
+    monkeypatch.setattr(memory.write_queue, "submit", lambda turn: False)
+
+    memory.store_conversation("holmes", "Who is the client?", "Miss Mary Sutherland.")
+
+    assert [metadata['session_id'] for metadata in memory.memory_collection.records.values()] == ["holmes"]
+
+
+@pytest.fixture
+def memory(registry, monkeypatch):
+    monkeypatch.setattr(Config, "WRITE_BEHIND_ENABLED", True)
+    monkeypatch.setattr(Config, "WRITE_BEHIND_FLUSH_INTERVAL", 0.01)
+    service = MemoryService(registry=registry, session_store=InMemorySessionStore())
+    yield service
+    service.write_queue.shutdown()
+
+
+def test_deleted_session_is_not_resurrected_by_a_turn_being_indexed(memory):
+    collection = memory.memory_collection
+    indexing, release = threading.Event(), threading.Event()
+    add = collection.add
+
+    def slow_add(**kwargs):
+        indexing.set()
+        release.wait(5)
+        add(**kwargs)
+
+    collection.add = slow_add
+    memory.store_conversation("holmes", "Who is the client?", "Miss Mary Sutherland.")
+    memory.store_conversation("watson", "Where?", "Baker Street.")
+    assert indexing.wait(5)
+
+    deleter = threading.Thread(target=memory.delete_sessions, args=(["holmes"],))
+    deleter.start()
+    deleter.join(0.1)
+    assert deleter.is_alive()
+
+    release.set()
+    deleter.join(5)
+    assert not deleter.is_alive()
+    assert [metadata['session_id'] for metadata in collection.records.values()] == ["watson"]
+    assert memory.get_recent_conversations("holmes") == []
+    assert memory.get_session_summary("holmes") is None